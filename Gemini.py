@@ -1,32 +1,122 @@
-from google.cloud import aiplatform
-from vertexai.generative_models import GenerativeModel, Part
 from pathlib import Path
+from session_store import SessionStore, create_session_backend
+from metrics import timed, record_stage, UPSTREAM_BYTES, HISTORY_TOKENS, HISTORY_COMPACTIONS
+from chat_history import compact_history, extractive_summary, history_tokens, message_text
+from GoogleClients import google_project_id
+from collections import OrderedDict
+import hashlib
 import os
 import json
+import threading
+import time
 
-# Set Google Cloud credentials from script directory
 script_dir = Path(__file__).parent
-key_path = script_dir / "key.json"
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(key_path)
-
-# Load project ID from key.json
-with open(key_path, 'r') as f:
-    key_data = json.load(f)
-    project_id = key_data["project_id"]
-
-# Initialize Vertex AI
-aiplatform.init(
-    project=project_id,
-    location="us-central1"
+prompts_path = script_dir / "system_prompts.json"
+VERTEX_LOCATION = os.environ.get("VERTEX_LOCATION", "us-central1")
+
+# vertexai is imported and Vertex AI initialized on first use (init_vertex),
+# so importing this module needs neither credentials nor the google stack.
+GenerativeModel = None
+_vertex_lock = threading.Lock()
+
+def init_vertex():
+    """
+    Import vertexai and initialize Vertex AI once per process.
+
+    Returns:
+        The GenerativeModel class.
+    """
+    global GenerativeModel
+    with _vertex_lock:
+        if GenerativeModel is None:
+            from google.cloud import aiplatform
+            from vertexai.generative_models import GenerativeModel as model_class
+            aiplatform.init(project=google_project_id(), location=VERTEX_LOCATION)
+            GenerativeModel = model_class
+    return GenerativeModel
+
+_system_prompts = None
+
+def get_system_prompts():
+    """
+    System prompts from system_prompts.json, loaded on first use.
+    """
+    global _system_prompts
+    if _system_prompts is None:
+        with open(prompts_path, 'r', encoding='utf-8') as f:
+            _system_prompts = json.load(f)
+    return _system_prompts
+
+DEFAULT_SESSION_ID = 'default'
+
+def estimate_session_bytes(chat):
+    """
+    Rough memory footprint of a chat session: the UTF-8 size of its history text.
+    """
+    total = 0
+    for content in chat.history:
+        for part in content.parts:
+            try:
+                total += len(part.text.encode('utf-8'))
+            except (AttributeError, ValueError):
+                total += 1024  # non-text part (e.g. an image reference)
+    return total
+
+def log_eviction(key, chat, reason):
+    print(f"Evicted chat session {key} ({reason})")
+
+# Live chat sessions keyed by (session_id, mode, language_code[, topic]).
+# Bounded by idle TTL, session count and estimated history size.
+chat_sessions = SessionStore(
+    max_sessions=int(os.environ.get("MAX_CHAT_SESSIONS", 5000)),
+    idle_ttl=int(os.environ.get("CHAT_SESSION_TTL", 1800)),
+    max_bytes=int(os.environ.get("CHAT_SESSIONS_MAX_MB", 256)) * 1024 * 1024,
+    sizeof=estimate_session_bytes,
+    on_evict=log_eviction
 )
 
-# Load system prompts from JSON
-prompts_path = script_dir / "system_prompts.json"
-with open(prompts_path, 'r', encoding='utf-8') as f:
-    SYSTEM_PROMPTS = json.load(f)
+# Optional shared backend (SESSION_BACKEND=sqlite) holding serialized histories,
+# so any uvicorn worker can continue any conversation. With the default
+# 'memory' backend sessions live only in chat_sessions above.
+session_backend = create_session_backend(
+    os.environ.get("SESSION_BACKEND", "memory"),
+    path=os.environ.get("SESSION_DB_PATH", script_dir / "chat_sessions.db"),
+    idle_ttl=int(os.environ.get("CHAT_SESSION_TTL", 1800))
+)
 
-# Global chat sessions stored by (mode, language_code, topic)
-chat_sessions = {}
+def serialize_history(history):
+    """
+    Convert a ChatSession history to plain role/parts data. Non-text parts are dropped.
+    """
+    serialized = []
+    for content in history:
+        parts = []
+        for part in content.parts:
+            try:
+                parts.append(part.text)
+            except (AttributeError, ValueError):
+                continue
+        serialized.append({"role": content.role, "parts": parts})
+    return serialized
+
+def deserialize_history(history):
+    """
+    Rebuild Content objects for start_chat(history=...) from serialize_history output.
+    """
+    from vertexai.generative_models import Content, Part
+    return [
+        Content(role=item["role"], parts=[Part.from_text(text) for text in item["parts"]])
+        for item in history
+    ]
+
+def get_session_key(mode='chat', language_code='bn-BD', topic=None, session_id=None):
+    """
+    Key of a chat session: one per client session, mode and language (and topic for lessons).
+    """
+    session_id = session_id or DEFAULT_SESSION_ID
+    if mode == 'lesson_delivery':
+        return (session_id, mode, language_code, topic)
+    return (session_id, mode, language_code)
 
 def get_system_prompt(mode='chat', language_code='bn-BD', topic=None, context=None):
     """
@@ -36,7 +126,7 @@ def get_system_prompt(mode='chat', language_code='bn-BD', topic=None, context=No
     lang_key = 'en' if language_code.startswith('en') else 'bn'
 
     # Get the appropriate prompt
-    prompt = SYSTEM_PROMPTS[mode][lang_key]
+    prompt = get_system_prompts()[mode][lang_key]
     
     # For lesson_delivery, add topic-specific instruction
     if mode == 'lesson_delivery':
@@ -61,61 +151,256 @@ def get_system_prompt(mode='chat', language_code='bn-BD', topic=None, context=No
     
     return prompt
 
-def get_or_create_chat_session(mode='chat', language_code='bn-BD', topic=None, context=None):
+def get_model_name(mode):
+    return "gemini-2.0-flash-exp" if mode == 'object_detection' else "gemini-2.5-flash-lite"
+
+# Prepared models keyed by (model name, mode, language, topic, context hash).
+# The system instruction is rendered once per key, so starting a session is
+# just start_chat() instead of rebuilding a multi-KB prompt on every request.
+MAX_CACHED_MODELS = int(os.environ.get("MAX_CACHED_MODELS", 256))
+_models = OrderedDict()
+_models_lock = threading.Lock()
+
+def get_model(mode='chat', language_code='bn-BD', topic=None, context=None):
+    """
+    Return a shared GenerativeModel with the rendered system prompt for these settings.
+    """
+    context_hash = hashlib.sha1(context.encode('utf-8')).hexdigest() if context else None
+    model_key = (get_model_name(mode), mode, language_code, topic, context_hash)
+
+    with _models_lock:
+        model = _models.get(model_key)
+        if model is not None:
+            _models.move_to_end(model_key)
+            return model
+
+    # Load system prompt with context if available
+    system_instruction = get_system_prompt(mode, language_code, topic, context)
+    model_class = GenerativeModel or init_vertex()
+    model = model_class(
+        model_key[0],
+        system_instruction=system_instruction
+    )
+
+    with _models_lock:
+        model = _models.setdefault(model_key, model)
+        _models.move_to_end(model_key)
+        while len(_models) > MAX_CACHED_MODELS:
+            _models.popitem(last=False)
+    return model
+
+def start_chat_session(mode='chat', language_code='bn-BD', topic=None, context=None, history=None):
+    """
+    Start a chat on the prepared model for these settings.
+    """
+    return get_model(mode, language_code, topic, context).start_chat(history=history)
+
+def get_or_create_chat_session(mode='chat', language_code='bn-BD', topic=None, context=None, session_id=None):
     """
     Get existing chat session or create a new one.
     """
-    # Create session key based on mode
-    if mode == 'lesson_delivery':
-        session_key = (mode, language_code, topic)
-    else:
-        session_key = (mode, language_code)
+    # For object detection, always create a new session (and don't keep it)
+    if mode == 'object_detection':
+        return start_chat_session(mode, language_code, topic, context)
+
+    session_key = get_session_key(mode, language_code, topic, session_id)
+
+    if session_backend is not None:
+        # Shared backend: restore the conversation, whichever worker started it
+        stored = session_backend.load(session_key)
+        if stored is not None:
+            stored_context, history = stored
+            return start_chat_session(mode, language_code, topic, stored_context, deserialize_history(history))
+        chat = start_chat_session(mode, language_code, topic, context)
+        session_backend.create(session_key, context)
+        return chat
 
-    # For object detection, always create a new session
-    if mode == 'object_detection' or session_key not in chat_sessions:
-        # Load system prompt with context if available
-        system_instruction = get_system_prompt(mode, language_code, topic, context)
+    chat = chat_sessions.get(session_key)
+    if chat is None:
+        chat = start_chat_session(mode, language_code, topic, context)
+        chat_sessions.put(session_key, chat)
+    return chat
 
-        # Create model
-        model_name = "gemini-2.0-flash-exp" if mode == 'object_detection' else "gemini-2.5-flash-lite"
-        model = GenerativeModel(
-            model_name,
-            system_instruction=system_instruction
-        )
+# Older turns are folded into a rolling summary once the history passes its
+# token budget (chat_history.py). HISTORY_SUMMARIZER=gemini has Gemini write
+# the summary instead of the local extractive one.
+HISTORY_SUMMARIZER = os.environ.get("HISTORY_SUMMARIZER", "extractive")
+
+def summarize_with_gemini(previous, turns, max_tokens):
+    """
+    Rolling history summary written by Gemini; falls back to the extractive summary on errors.
+    """
+    transcript = "\n".join(f"{message['role']}: {message_text(message)}" for turn in turns for message in turn)
+    prompt = (
+        "Update the summary of this tutoring conversation with the new turns below. Keep the facts taught, "
+        "the learner's answers and mistakes and any open questions. Write in the conversation's language, "
+        f"as short lines starting with '- ', at most {max_tokens // 2} words in total.\n\n"
+        f"Summary so far:\n{previous or '-'}\n\nNew turns:\n{transcript}"
+    )
+    try:
+        model_class = GenerativeModel or init_vertex()
+        with timed('gemini_summary'):
+            response = model_class(get_model_name('chat')).generate_content(prompt)
+        return response.text.strip()
+    except Exception as e:
+        print(f"Gemini history summary failed, using the extractive one: {e}")
+        return extractive_summary(previous, turns, max_tokens)
 
-        # Start new chat session
-        chat_sessions[session_key] = model.start_chat()
+def compact_chat_session(chat, mode='chat'):
+    """
+    Keep a chat's history within HISTORY_TOKEN_BUDGET, folding old turns into the summary.
 
-    return chat_sessions[session_key]
+    Returns:
+        list: The serialized (possibly compacted) history.
+    """
+    history = serialize_history(chat.history)
+    summarize = summarize_with_gemini if HISTORY_SUMMARIZER == 'gemini' else extractive_summary
+    compacted = compact_history(history, summarize=summarize)
+    if compacted is not None:
+        HISTORY_COMPACTIONS.inc(mode=mode)
+        # ChatSession.history is the live list sent with every message
+        chat.history[:] = deserialize_history(compacted)
+        history = compacted
+    HISTORY_TOKENS.observe(history_tokens(history), mode=mode)
+    return history
 
-def send_message(user_msg, mode='chat', language_code='bn-BD', image_bytes=None, topic=None, context=None):
+def save_chat_session(chat, mode='chat', language_code='bn-BD', topic=None, session_id=None):
+    """
+    Record a finished turn: compact the history, then persist it to the shared
+    backend or re-measure the in-memory session against the memory budget.
+    """
+    if mode == 'object_detection':
+        return
+    history = compact_chat_session(chat, mode)
+    session_key = get_session_key(mode, language_code, topic, session_id)
+    if session_backend is not None:
+        session_backend.save_history(session_key, history)
+    else:
+        chat_sessions.touch(session_key)
+
+def with_grounding(user_msg, grounding=None):
+    if not grounding:
+        return user_msg
+    return f"{grounding}\n\n{user_msg}"
+
+def drop_grounding(chat, user_msg):
+    """
+    Keep only the user's own words in the history once a turn is answered.
+    Lesson passages are retrieved afresh for every turn, so keeping them
+    would only grow the history.
+    """
+    from vertexai.generative_models import Content, Part
+    for i in range(len(chat.history) - 1, -1, -1):
+        if chat.history[i].role == 'user':
+            chat.history[i] = Content(role='user', parts=[Part.from_text(user_msg)])
+            return
+
+def send_message(user_msg, mode='chat', language_code='bn-BD', image_bytes=None, topic=None, context=None, session_id=None, grounding=None, image_mime_type="image/jpeg"):
     """
     Send a message to Gemini and get a response.
+    grounding is extra text (e.g. local object detections or retrieved lesson
+    passages) sent ahead of the user's message.
     """
     # Get or create chat session
-    chat = get_or_create_chat_session(mode, language_code, topic, context)
+    with timed('gemini_session', language_code):
+        chat = get_or_create_chat_session(mode, language_code, topic, context, session_id)
 
     # For object detection with image
+    with timed('gemini_generate', language_code):
+        if mode == 'object_detection' and image_bytes:
+            UPSTREAM_BYTES.inc(len(image_bytes), stage='gemini', direction='out')
+            from vertexai.generative_models import Part
+            image_part = Part.from_data(data=image_bytes, mime_type=image_mime_type)
+            response = chat.send_message([image_part, with_grounding(user_msg, grounding)])
+        else:
+            # Send text only
+            response = chat.send_message(with_grounding(user_msg, grounding))
+
+    if grounding and mode != 'object_detection':
+        drop_grounding(chat, user_msg)
+    save_chat_session(chat, mode, language_code, topic, session_id)
+    return response.text
+
+def send_message_stream(user_msg, mode='chat', language_code='bn-BD', image_bytes=None, topic=None, context=None, session_id=None, grounding=None, image_mime_type="image/jpeg"):
+    """
+    Send a message to Gemini and yield the response text as it is generated.
+    The chat history is updated once the stream has been fully consumed.
+    """
+    # Get or create chat session
+    with timed('gemini_session', language_code):
+        chat = get_or_create_chat_session(mode, language_code, topic, context, session_id)
+
+    start = time.perf_counter()
     if mode == 'object_detection' and image_bytes:
-        image_part = Part.from_data(data=image_bytes, mime_type="image/jpeg")
-        response = chat.send_message([image_part, user_msg])
+        UPSTREAM_BYTES.inc(len(image_bytes), stage='gemini', direction='out')
+        from vertexai.generative_models import Part
+        image_part = Part.from_data(data=image_bytes, mime_type=image_mime_type)
+        responses = chat.send_message([image_part, with_grounding(user_msg, grounding)], stream=True)
     else:
-        # Send text only
-        response = chat.send_message(user_msg)
+        responses = chat.send_message(with_grounding(user_msg, grounding), stream=True)
 
-    return response.text
+    first_token = True
+    for chunk in responses:
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. the final finish-reason chunk)
+            continue
+        if text:
+            if first_token:
+                record_stage('gemini_first_token', time.perf_counter() - start, language_code)
+                first_token = False
+            yield text
+    record_stage('gemini_generate', time.perf_counter() - start, language_code)
+
+    if grounding and mode != 'object_detection':
+        drop_grounding(chat, user_msg)
+    save_chat_session(chat, mode, language_code, topic, session_id)
+
+def generate_opener(initial_message, mode='lesson_delivery', language_code='bn-BD', topic=None, context=None):
+    """
+    Run the first turn of a conversation on a throwaway session.
+
+    Returns:
+        tuple: (reply text, serialized history to seed new sessions with)
+    """
+    chat = start_chat_session(mode, language_code, topic, context)
+    with timed('gemini_generate', language_code):
+        response = chat.send_message(initial_message)
+    return response.text, serialize_history(chat.history)
 
-def reset_chat_session(mode='chat', language_code='bn-BD', topic=None):
+def seed_chat_session(history, mode='lesson_delivery', language_code='bn-BD', topic=None, context=None, session_id=None):
+    """
+    Replace the session with a new one that already contains history (e.g. a
+    cached lesson opener), so the next message continues from it.
+    """
+    session_key = get_session_key(mode, language_code, topic, session_id)
+    if session_backend is not None:
+        session_backend.create(session_key, context)
+        session_backend.save_history(session_key, history)
+        return
+    chat_sessions.put(session_key, start_chat_session(mode, language_code, topic, context, deserialize_history(history)))
+
+def warm_up():
+    """
+    Initialize Vertex AI and prepare the default chat model ahead of the first request.
+    """
+    try:
+        get_model('chat', 'bn-BD')
+        print("gemini model warmed up")
+        return True
+    except Exception as e:
+        print(f"Warm-up failed for gemini: {e}")
+        return False
+
+def reset_chat_session(mode='chat', language_code='bn-BD', topic=None, session_id=None):
     """
     Reset/clear the chat session.
     """
-    if mode == 'lesson_delivery':
-        session_key = (mode, language_code, topic)
-    else:
-        session_key = (mode, language_code)
-    
-    if session_key in chat_sessions:
-        del chat_sessions[session_key]
+    session_key = get_session_key(mode, language_code, topic, session_id)
+    chat_sessions.pop(session_key)
+    if session_backend is not None:
+        session_backend.delete(session_key)
 
 if __name__ == "__main__":
     response = send_message("Hello, how are you?", mode='chat', language_code='en-US')
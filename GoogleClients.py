@@ -0,0 +1,128 @@
+from pathlib import Path
+import json
+import os
+import threading
+
+# Use key.json from the script directory for Google Cloud credentials if it
+# exists; otherwise leave the environment (GOOGLE_APPLICATION_CREDENTIALS or
+# application default credentials) alone, so the app imports without it.
+script_dir = Path(__file__).parent
+key_path = script_dir / "key.json"
+if key_path.exists():
+    os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", str(key_path))
+
+
+def google_project_id():
+    """
+    Project id from key.json, falling back to GOOGLE_CLOUD_PROJECT.
+    """
+    if key_path.exists():
+        with open(key_path, 'r') as f:
+            return json.load(f)["project_id"]
+    return os.environ.get("GOOGLE_CLOUD_PROJECT")
+
+
+def channel_errors():
+    """
+    Errors that usually mean the underlying gRPC channel is broken rather than
+    the request being bad. On these the client is thrown away and rebuilt.
+
+    google.api_core is only imported here, once a client is actually used,
+    to keep it out of the app's import time.
+    """
+    from google.api_core import exceptions as google_exceptions
+    return (google_exceptions.ServiceUnavailable, google_exceptions.Unauthenticated)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of Google Cloud clients.
+
+    Each client is built once on first use and shared by all threads (the
+    gRPC-based clients are thread-safe). If a call fails with a channel error
+    the client is dropped and rebuilt for a single retry.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._warmers = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory, warm_up=None):
+        """
+        Register a client factory. Nothing is imported or built until the
+        client is first used.
+
+        Args:
+            name (str): Registry key, e.g. 'speech' or 'tts'.
+            factory (callable): Builds a new client.
+            warm_up (callable, optional): Takes a client and makes a cheap call
+                                          to open the channel and fetch auth tokens.
+        """
+        self._factories[name] = factory
+        if warm_up is not None:
+            self._warmers[name] = warm_up
+
+    def get(self, name):
+        """
+        Return the shared client, building it if necessary.
+        """
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                client = self._factories[name]()
+                self._clients[name] = client
+            return client
+
+    def invalidate(self, name, client=None):
+        """
+        Drop a client so the next get() rebuilds it.
+        If client is given, only drop it if it is still the current one.
+        """
+        with self._lock:
+            current = self._clients.get(name)
+            if current is None or (client is not None and current is not client):
+                return
+            del self._clients[name]
+        transport = getattr(current, "transport", None)
+        if transport is not None:
+            try:
+                transport.close()
+            except Exception:
+                pass
+
+    def call(self, name, func):
+        """
+        Call func(client), rebuilding the client once on a channel error.
+        """
+        client = self.get(name)
+        try:
+            return func(client)
+        except channel_errors() as e:
+            print(f"{name} client failed ({e.__class__.__name__}), rebuilding channel")
+            self.invalidate(name, client)
+            return func(self.get(name))
+
+    def warm_up(self, name):
+        """
+        Build the client and make its warm-up call. Errors are logged, not raised,
+        so a missing API does not stop the server from starting.
+        """
+        try:
+            client = self.get(name)
+            warmer = self._warmers.get(name)
+            if warmer is not None:
+                warmer(client)
+            print(f"{name} client warmed up")
+            return True
+        except Exception as e:
+            print(f"Warm-up failed for {name} client: {e}")
+            self.invalidate(name)
+            return False
+
+
+clients = ClientRegistry()
@@ -1,10 +1,54 @@
-import pyaudio
 import wave
-from google.cloud import speech
-import os
 from pathlib import Path
+from GoogleClients import clients, channel_errors
+from long_audio import transcribe_long, SEGMENT_WORKERS
+from metrics import timed, UPSTREAM_BYTES
+
+# google.cloud.speech (and pyaudio, for recording) are imported inside the
+# functions that use them, so importing this module stays cheap.
+
+
+def _speech_client():
+    from google.cloud import speech
+    return speech.SpeechClient()
+
+
+def _audio_encoding(encoding, default='ENCODING_UNSPECIFIED'):
+    """
+    RecognitionConfig encoding from an enum value or its name (e.g. 'WEBM_OPUS').
+    """
+    from google.cloud import speech
+    if encoding is None:
+        encoding = default
+    if isinstance(encoding, str):
+        return getattr(speech.RecognitionConfig.AudioEncoding, encoding)
+    return encoding
+
+
+def _warm_up_speech(client):
+    from google.cloud import speech
+    # 100 ms of LINEAR16 silence: opens the channel and fetches an auth token
+    config = speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        sample_rate_hertz=16000,
+        language_code='bn-BD',
+    )
+    client.recognize(config=config, audio=speech.RecognitionAudio(content=b"\x00\x00" * 1600))
+
+
+clients.register('speech', _speech_client, warm_up=_warm_up_speech)
+
+
+def warm_up():
+    """
+    Build the shared Speech-to-Text client and open its channel.
+    """
+    return clients.warm_up('speech')
+
 
 def record_audio(output_file="recording.wav", duration=5, rate=16000):
+    import pyaudio
+
     # Audio recording parameters
     CHUNK = 1024
     FORMAT = pyaudio.paInt16
@@ -52,41 +96,33 @@ def record_audio(output_file="recording.wav", duration=5, rate=16000):
     return output_file
 
 
-def runSTT(audio_file, output_file=None, rate=16000, language_code='bn-BD'):
+# Recognition encodings of compressed audio files; anything else is read as WAV/LINEAR16
+FILE_ENCODINGS = {'.webm': 'WEBM_OPUS', '.ogg': 'OGG_OPUS', '.opus': 'OGG_OPUS'}
 
-    # Set Google Cloud credentials from script directory
-    script_dir = Path(__file__).parent
-    key_path = script_dir / "key.json"
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(key_path)
-    
+
+def runSTT(audio_file, output_file=None, rate=16000, language_code='bn-BD', max_workers=SEGMENT_WORKERS):
+    """
+    Transcribe an audio file of any length.
+
+    WAV files (and WebM/Ogg Opus, if ffmpeg is installed) are split at pauses
+    into segments of under a minute that are transcribed concurrently, at
+    most max_workers at a time. Other files (e.g. headerless LINEAR16 at
+    rate) are sent in one recognize() call, which accepts about a minute.
+    """
     # Read audio file
     with open(audio_file, 'rb') as f:
         audio_content = f.read()
-    
-    # Initialize Google Speech-to-Text client
-    client = speech.SpeechClient()
-    
-    # Configure audio and recognition settings for Bangla
-    audio = speech.RecognitionAudio(content=audio_content)
-    
-    config = speech.RecognitionConfig(
-        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-        sample_rate_hertz=rate,
-        language_code=language_code,  # Bangla (Bangladesh)
-        enable_automatic_punctuation=True,
-    )
+    encoding = FILE_ENCODINGS.get(Path(audio_file).suffix.lower(), 'LINEAR16')
     
     print("Transcribing...")
     
-    # Perform speech recognition
-    response = client.recognize(config=config, audio=audio)
-    
-    # Extract transcription
-    transcription = ""
-    for result in response.results:
-        transcription += result.alternatives[0].transcript + " "
-    
-    transcription = transcription.strip()
+    try:
+        transcription, stats = transcribe_long(audio_content, runSTT_from_bytes, encoding, language_code,
+                                               max_workers=max_workers)
+        print(f"Transcribed {stats['duration_ms'] / 1000:.1f}s of audio in {stats['segments']} segment(s)")
+    except ValueError as e:
+        print(f"Sending {audio_file} in one request: {e}")
+        transcription = runSTT_from_bytes(audio_content, rate=rate, encoding=encoding, language_code=language_code)
     
     if transcription:
         print(f"Transcription: {transcription}")
@@ -112,28 +148,22 @@ def runSTT_from_bytes(audio_bytes, rate=None, encoding=None, language_code='bn-B
         audio_bytes (bytes): The audio data as bytes.
         rate (int, optional): Sample rate of the audio. If None, will auto-detect.
                               Default is 16000 for WAV, None for WebM (auto-detect).
-        encoding: Audio encoding. If None, will auto-detect. Options:
-                  - speech.RecognitionConfig.AudioEncoding.LINEAR16 (WAV)
-                  - speech.RecognitionConfig.AudioEncoding.WEBM_OPUS (WebM)
-                  - speech.RecognitionConfig.AudioEncoding.ENCODING_UNSPECIFIED (auto-detect)
+        encoding: Audio encoding, as a speech.RecognitionConfig.AudioEncoding
+                  value or its name. If None, will auto-detect. Options:
+                  - 'LINEAR16' (WAV)
+                  - 'WEBM_OPUS' (WebM)
+                  - 'ENCODING_UNSPECIFIED' (auto-detect)
     
     Returns:
         str: The transcribed text.
     """
-    # Set Google Cloud credentials from script directory
-    script_dir = Path(__file__).parent
-    key_path = script_dir / "key.json"
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(key_path)
-    
-    # Initialize Google Speech-to-Text client
-    client = speech.SpeechClient()
-    
+    from google.cloud import speech
+
     # Configure audio and recognition settings for Bangla
     audio = speech.RecognitionAudio(content=audio_bytes)
     
     # Use auto-detect if encoding not specified
-    if encoding is None:
-        encoding = speech.RecognitionConfig.AudioEncoding.ENCODING_UNSPECIFIED
+    encoding = _audio_encoding(encoding)
     
     # Build config - only include sample_rate if specified
     # For WebM OPUS, the sample rate is in the header and shouldn't be specified
@@ -150,8 +180,10 @@ def runSTT_from_bytes(audio_bytes, rate=None, encoding=None, language_code='bn-B
     
     config = speech.RecognitionConfig(**config_dict)
     
-    # Perform speech recognition
-    response = client.recognize(config=config, audio=audio)
+    # Perform speech recognition on the shared client
+    UPSTREAM_BYTES.inc(len(audio_bytes), stage='stt', direction='out')
+    with timed('stt_recognize', language_code):
+        response = clients.call('speech', lambda client: client.recognize(config=config, audio=audio))
     
     # Extract transcription
     transcription = ""
@@ -163,6 +195,67 @@ def runSTT_from_bytes(audio_bytes, rate=None, encoding=None, language_code='bn-B
     return transcription
 
 
+def runSTT_streaming(audio_chunks, language_code='bn-BD', encoding=None, rate=None, on_interim=None, on_endpoint=None):
+    """
+    Transcribes audio while it is still being recorded, using streaming recognition.
+    
+    Args:
+        audio_chunks (iterable of bytes): Audio chunks as they arrive; iteration ends
+                                          when the client stops sending.
+        language_code (str): Language code. Default is 'bn-BD' for Bangla.
+        encoding: Audio encoding, as for runSTT_from_bytes. Defaults to WEBM_OPUS (browser MediaRecorder).
+        rate (int, optional): Sample rate; leave None for WebM/Opus.
+        on_interim (callable, optional): Called with the partial transcript whenever it changes.
+        on_endpoint (callable, optional): Called once Google detects the end of the utterance,
+                                          so the caller can stop feeding audio.
+    
+    Returns:
+        str: The final transcribed text.
+    """
+    from google.cloud import speech
+
+    encoding = _audio_encoding(encoding, default='WEBM_OPUS')
+    
+    config_dict = {
+        "encoding": encoding,
+        "language_code": language_code,
+        "enable_automatic_punctuation": True,
+    }
+    if rate is not None:
+        config_dict["sample_rate_hertz"] = rate
+    
+    # single_utterance makes Google endpoint the speech itself: it stops
+    # listening as soon as the user pauses, instead of waiting for the upload to end
+    streaming_config = speech.StreamingRecognitionConfig(
+        config=speech.RecognitionConfig(**config_dict),
+        interim_results=True,
+        single_utterance=True,
+    )
+    requests = (speech.StreamingRecognizeRequest(audio_content=chunk) for chunk in audio_chunks if chunk)
+    
+    # A streaming call can't be replayed, so on a channel error the client is
+    # rebuilt for the next call rather than retried here
+    client = clients.get('speech')
+    final_parts = []
+    try:
+        responses = client.streaming_recognize(config=streaming_config, requests=requests)
+        for response in responses:
+            if response.speech_event_type == speech.StreamingRecognizeResponse.SpeechEventType.END_OF_SINGLE_UTTERANCE:
+                if on_endpoint:
+                    on_endpoint()
+            for result in response.results:
+                transcript = result.alternatives[0].transcript
+                if result.is_final:
+                    final_parts.append(transcript.strip())
+                elif on_interim:
+                    on_interim(" ".join(final_parts + [transcript.strip()]))
+    except channel_errors():
+        clients.invalidate('speech', client)
+        raise
+    
+    return " ".join(part for part in final_parts if part).strip()
+
+
 # Example usage
 if __name__ == "__main__":
     # Google Cloud credentials are automatically loaded from key.json in the script directory
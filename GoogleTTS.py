@@ -1,51 +1,126 @@
-from google.cloud import texttospeech
-import os
-from pathlib import Path
+from GoogleClients import clients
+from tts_cache import tts_cache, make_key
+from metrics import timed, CACHE_REQUESTS, UPSTREAM_BYTES
 
+# google.cloud.texttospeech is imported on first synthesis, not at import time
 
-def runTTS(text, output_file=None, language_code='bn-BD', return_bytes=False):
+
+def _tts_client():
+    from google.cloud import texttospeech
+    return texttospeech.TextToSpeechClient()
+
+
+def _warm_up_tts(client):
+    # Listing voices is the cheapest authenticated call on this API
+    client.list_voices(language_code='bn-BD')
+
+
+# Supported output encodings and their MIME types
+AUDIO_MIME_TYPES = {
+    'LINEAR16': 'audio/wav',
+    'MP3': 'audio/mpeg',
+    'OGG_OPUS': 'audio/ogg',
+}
+
+# Output formats a client can ask for, mapped to Google TTS encodings.
+# wav is uncompressed and kept as the default for older clients.
+AUDIO_FORMATS = {'wav': 'LINEAR16', 'mp3': 'MP3', 'ogg': 'OGG_OPUS'}
+AUDIO_EXTENSIONS = {encoding: audio_format for audio_format, encoding in AUDIO_FORMATS.items()}
+
+
+def cache_key(text, language_code='bn-BD', voice_name=None, audio_encoding='LINEAR16'):
     """
-    Converts text to speech using Google Cloud Text-to-Speech API.
-    
-    Args:
-        text (str): The text to convert to speech.
-        output_file (str, optional): Path to save the audio file. If None and return_bytes=False, 
-                                     audio will be saved to a default location.
-        language_code (str): Language code. Default is 'bn-BD' for Bangla.
-        return_bytes (bool): If True, returns audio bytes instead of saving to file.
-    
-    Returns:
-        bytes or str: If return_bytes=True, returns audio bytes. Otherwise returns path to saved file.
+    TTS cache key of a clip: its content hash plus the file extension of its
+    encoding (<sha256>.mp3). The key is also the clip's /audio id, so a link
+    with the wrong extension misses instead of serving bytes of another type.
     """
-    # Set Google Cloud credentials from script directory
-    script_dir = Path(__file__).parent
-    key_path = script_dir / "key.json"
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(key_path)
-    
-    # Initialize the client
-    client = texttospeech.TextToSpeechClient()
-    
+    return f"{make_key(text, language_code, voice_name, audio_encoding)}.{AUDIO_EXTENSIONS[audio_encoding]}"
+
+clients.register('tts', _tts_client, warm_up=_warm_up_tts)
+
+
+def warm_up():
+    """
+    Build the shared Text-to-Speech client and open its channel.
+    """
+    return clients.warm_up('tts')
+
+
+def _synthesize(text, language_code, voice_name, audio_encoding):
+    from google.cloud import texttospeech
+
     # Set the text input
     synthesis_input = texttospeech.SynthesisInput(text=text)
     
-    # Configure the voice (using default voice for the language)
+    # Configure the voice (default voice for the language unless one is named)
     voice = texttospeech.VoiceSelectionParams(
         language_code=language_code,
+        name=voice_name or '',
     )
     
-    # Select the audio file type
+    # Select the audio file type (LINEAR16 is WAV; MP3 and OGG_OPUS are far smaller)
     audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.LINEAR16  # WAV format
+        audio_encoding=getattr(texttospeech.AudioEncoding, audio_encoding)
     )
     
-    # Perform the text-to-speech request
+    # Perform the text-to-speech request on the shared client
     print(f"Converting text to speech: '{text}'")
-    response = client.synthesize_speech(
-        input=synthesis_input, voice=voice, audio_config=audio_config
-    )
+    with timed('tts_synthesize', language_code):
+        response = clients.call('tts', lambda client: client.synthesize_speech(
+            input=synthesis_input, voice=voice, audio_config=audio_config
+        ))
+    UPSTREAM_BYTES.inc(len(text.encode('utf-8')), stage='tts', direction='out')
+    UPSTREAM_BYTES.inc(len(response.audio_content), stage='tts', direction='in')
+    return response.audio_content
+
+
+def synthesize_cached(text, language_code='bn-BD', voice_name=None, audio_encoding='LINEAR16', use_cache=True,
+                      synthesize=None):
+    """
+    Audio for text from the TTS cache, or synthesized and cached.
+
+    synthesize(text, language_code, voice_name, audio_encoding) makes the
+    upstream call; it defaults to Google Text-to-Speech. Concurrent identical
+    requests are coalesced by the caller before they reach a worker thread
+    (app.synthesize_speech).
+    """
+    synthesize = synthesize or _synthesize
+    key = cache_key(text, language_code, voice_name, audio_encoding)
+    audio_content = tts_cache.get(key) if use_cache else None
+    if audio_content is not None:
+        CACHE_REQUESTS.inc(cache='tts', result='hit')
+        print(f"TTS cache hit: '{text}'")
+        return audio_content
+
+    if use_cache:
+        CACHE_REQUESTS.inc(cache='tts', result='miss')
+    audio_content = synthesize(text, language_code, voice_name, audio_encoding)
+    if use_cache:
+        tts_cache.put(key, audio_content)
+    return audio_content
+
+
+def runTTS(text, output_file=None, language_code='bn-BD', return_bytes=False, voice_name=None, use_cache=True, audio_encoding='LINEAR16'):
+    """
+    Converts text to speech using Google Cloud Text-to-Speech API.
     
-    # Get the audio content
-    audio_content = response.audio_content
+    Args:
+        text (str): The text to convert to speech.
+        output_file (str, optional): Path to save the audio file. If None and return_bytes=False, 
+                                     audio will be saved to a default location.
+        language_code (str): Language code. Default is 'bn-BD' for Bangla.
+        return_bytes (bool): If True, returns audio bytes instead of saving to file.
+        voice_name (str, optional): Specific voice, e.g. 'bn-IN-Wavenet-A'. Default voice if None.
+        use_cache (bool): Look the clip up in the TTS cache before calling Google.
+        audio_encoding (str): One of AUDIO_MIME_TYPES: 'LINEAR16' (WAV), 'MP3' or 'OGG_OPUS'.
+    
+    Returns:
+        bytes or str: If return_bytes=True, returns audio bytes. Otherwise returns path to saved file.
+    """
+    if audio_encoding not in AUDIO_MIME_TYPES:
+        raise ValueError(f"Unsupported audio encoding: {audio_encoding}")
+
+    audio_content = synthesize_cached(text, language_code, voice_name, audio_encoding, use_cache)
     
     if return_bytes:
         # Return audio bytes directly (useful for FastAPI streaming)
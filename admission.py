@@ -0,0 +1,203 @@
+"""
+Admission control for the blocking upstream calls (STT, Gemini, TTS).
+
+Each upstream gets a concurrency limit and a bounded wait queue with two
+lanes: 'interactive' (cheap calls like /tts, lesson lists, starts and quizzes) is
+always served before 'voice' (full STT -> Gemini -> TTS turns). Every request
+has a deadline; a call that can't be queued, or can't start or finish before
+the deadline, fails fast with Overloaded instead of piling up.
+"""
+
+from contextvars import ContextVar
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import re
+import time
+
+from metrics import ADMISSION_REJECTIONS
+
+# Lanes in priority order
+LANES = ('interactive', 'voice')
+INTERACTIVE_PATH = re.compile(r'^/(tts|lessons|lesson/(start|quiz)|audio/|lesson/[^/]+/(quiz|audio/))')
+
+# Longest a request may take before its upstream calls are abandoned;
+# a client can ask for less with an X-Request-Timeout-Ms header
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", 30))
+
+# Lane and deadline (time.monotonic()) of the request being handled
+_lane = ContextVar("admission_lane", default='voice')
+_deadline = ContextVar("admission_deadline", default=None)
+
+
+class Overloaded(Exception):
+    """
+    An upstream call was refused: its queue is full (429) or the request's
+    deadline passed before it could finish (503). Clients should retry after
+    retry_after seconds.
+    """
+
+    def __init__(self, stage, reason, retry_after):
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = 429 if reason == 'queue_full' else 503
+        super().__init__(f"{stage} is overloaded ({reason.replace('_', ' ')}), retry in {retry_after}s")
+
+
+def lane_for_path(path):
+    return 'interactive' if INTERACTIVE_PATH.match(path) else 'voice'
+
+
+def current_deadline():
+    return _deadline.get()
+
+
+class UpstreamLimiter:
+    """
+    Concurrency limit with a bounded, prioritized wait queue for one upstream.
+    Used from the event loop only.
+    """
+
+    def __init__(self, name, limit, max_queue):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = {lane: 0 for lane in LANES}
+        self.rejected = 0
+        # Waiters as [lane rank, arrival order, future, lane]; abandoned ones are skipped
+        self._waiters = []
+        self._order = itertools.count()
+        # Moving average of the call time, for Retry-After
+        self._service_seconds = 1.0
+
+    def retry_after(self):
+        waiting = sum(self.queued.values())
+        return max(1, math.ceil((waiting + 1) * self._service_seconds / self.limit))
+
+    def _reject(self, lane, reason):
+        self.rejected += 1
+        ADMISSION_REJECTIONS.inc(stage=self.name, lane=lane, reason=reason)
+        return Overloaded(self.name, reason, self.retry_after())
+
+    async def acquire(self, lane='voice', deadline=None):
+        """
+        Wait for a free slot, in lane order. Raises Overloaded if the lane's
+        queue is full or the deadline passes first.
+        """
+        if self.active < self.limit and not any(self.queued.values()):
+            self.active += 1
+            return
+        if self.queued[lane] >= self.max_queue:
+            raise self._reject(lane, 'queue_full')
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise self._reject(lane, 'deadline')
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [LANES.index(lane), next(self._order), future, lane])
+        self.queued[lane] += 1
+        try:
+            done, _ = await asyncio.wait({future}, timeout=remaining)
+        except asyncio.CancelledError:
+            self._abandon(future, lane)
+            raise
+        if not done:
+            self._abandon(future, lane)
+            raise self._reject(lane, 'deadline')
+
+    def _abandon(self, future, lane):
+        if future.done():
+            # The slot was handed over just as we gave up: pass it on
+            self.release()
+        else:
+            future.cancel()
+            self.queued[lane] -= 1
+
+    def release(self, service_seconds=None):
+        """
+        Free a slot, handing it straight to the most urgent waiter if there is one.
+        """
+        if service_seconds is not None:
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * service_seconds
+        while self._waiters:
+            _, _, future, lane = heapq.heappop(self._waiters)
+            if future.cancelled():
+                continue
+            self.queued[lane] -= 1
+            future.set_result(None)
+            return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": dict(self.queued),
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "avg_call_ms": round(self._service_seconds * 1000, 1),
+        }
+
+
+def _limiter(stage):
+    # By default as many calls run as the stage has worker threads (STT_WORKERS etc.)
+    workers = os.environ.get(f"{stage.upper()}_WORKERS", 32)
+    return UpstreamLimiter(
+        stage,
+        limit=int(os.environ.get(f"{stage.upper()}_CONCURRENCY", workers)),
+        max_queue=int(os.environ.get(f"{stage.upper()}_QUEUE", 64)),
+    )
+
+
+# One limiter per Google upstream; the other stages are local work
+limiters = {stage: _limiter(stage) for stage in ('stt', 'gemini', 'tts')}
+
+
+async def acquire_upstream(stage):
+    """
+    Take a slot for an upstream call in the current request's lane. Returns
+    the limiter to release(), or None for stages without a limit.
+    """
+    limiter = limiters.get(stage)
+    if limiter is not None:
+        await limiter.acquire(_lane.get(), _deadline.get())
+    return limiter
+
+
+def admission_stats():
+    return {stage: limiter.stats() for stage, limiter in limiters.items()}
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that assigns each request its lane (from the path) and
+    deadline, for the upstream limiters to use.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        seconds = REQUEST_DEADLINE_SECONDS
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-timeout-ms":
+                try:
+                    seconds = min(seconds, max(int(value) / 1000, 0.0))
+                except ValueError:
+                    pass
+        lane_token = _lane.set(lane_for_path(scope.get("path", "")))
+        # WebSocket connections are long-lived: their calls have no overall deadline
+        deadline_token = _deadline.set(time.monotonic() + seconds if scope["type"] == "http" else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _lane.reset(lane_token)
+            _deadline.reset(deadline_token)
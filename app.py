@@ -1,14 +1,28 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, WebSocket, WebSocketDisconnect, Header, Depends, Request
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from io import BytesIO
-from google.cloud import speech
-from GoogleSTT import runSTT_from_bytes
-from Gemini import send_message, reset_chat_session
-from GoogleTTS import runTTS
-import uvicorn
+from GoogleSTT import runSTT_from_bytes, runSTT_streaming, warm_up as warm_up_stt
+from Gemini import send_message, send_message_stream, reset_chat_session, chat_sessions, generate_opener, seed_chat_session, get_model_name, warm_up as warm_up_gemini
+from GoogleTTS import runTTS, warm_up as warm_up_tts, cache_key, AUDIO_FORMATS, AUDIO_MIME_TYPES
+from stages import run_stage, iterate_stage, shutdown_executors
+from admission import AdmissionMiddleware, Overloaded, admission_stats
+from tts_cache import tts_cache
+from speech_text import SpeechSanitizer, sanitize_for_speech, speakable
+from speech_stream import split_sentences, synthesize_in_order, sse_event, StreamTimer
+from lesson_audio import ASSET_NAME_PATTERN, AUDIO_DIR_NAME
+from lesson_repository import LessonRepository
+from image_prep import normalize_image, image_stats
+from metrics import MetricsMiddleware, CACHE_REQUESTS, AUDIO_CLIPS, AUDIO_SECONDS, registry, timed
+from audio_frontend import preprocess_audio
+from long_audio import split_recording, stitch_transcripts, MAX_SEGMENT_SECONDS, SEGMENT_WORKERS
+from object_detector import detector, detection_batcher, format_grounding, answer_from_detections
+from lesson_openers import LessonOpenerCache, make_opener_key, opener_message
+from single_flight import AsyncSingleFlight
+import asyncio
 import base64
+import queue
 import re
 import json
 import os
@@ -20,23 +34,119 @@ app = FastAPI(title="Bangla Voice Chat API")
 # Define lessons directory
 LESSONS_DIR = Path(__file__).parent / "lessons"
 
-def strip_markdown(text):
-    """Remove markdown formatting from text for TTS."""
-    if not text: return text
-    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-    text = re.sub(r'\*([^*]+)\*', r'\1', text)
-    text = re.sub(r'__([^_]+)__', r'\1', text)
-    text = re.sub(r'_([^_]+)_', r'\1', text)
-    text = re.sub(r'```[\s\S]*?```', '', text)
-    text = re.sub(r'`([^`]+)`', r'\1', text)
-    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
-    text = re.sub(r'^#{1,6}\s+(.+)$', r'\1', text, flags=re.MULTILINE)
-    text = re.sub(r'^[\s]*[-*+]\s+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^[\s]*\d+\.\s+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^[-*]{3,}$', '', text, flags=re.MULTILINE)
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-    text = text.strip()
-    return text
+# Parsed lessons, reloaded only when their files change
+lessons = LessonRepository(LESSONS_DIR, check_interval=float(os.environ.get("LESSON_CHECK_INTERVAL", 2.0)))
+
+def cached_json(request, content, etag, max_age=60):
+    """JSON response with an ETag; answers 304 if the client already has this version."""
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if request.headers.get("if-none-match") == etag:
+        CACHE_REQUESTS.inc(cache='http_etag', result='hit')
+        return Response(status_code=304, headers=headers)
+    CACHE_REQUESTS.inc(cache='http_etag', result='miss')
+    return JSONResponse(content=content, headers=headers)
+
+def get_session_id(x_session_id: Optional[str] = Header(None)):
+    """Client session id from the X-Session-Id header; keeps each learner's history separate."""
+    return x_session_id
+
+AUDIO_ID_PATTERN = re.compile(r'^([0-9a-f]{64})\.(wav|mp3|ogg)$')
+
+def get_audio_encoding(audio_format):
+    if audio_format not in AUDIO_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported audio format: {audio_format} (use {', '.join(AUDIO_FORMATS)})")
+    return AUDIO_FORMATS[audio_format]
+
+# Identical clips requested at the same time (e.g. a whole class starting a
+# quiz) share one synthesis. They wait here on the event loop, so only the
+# first one holds a TTS worker thread and admission slot.
+tts_flights = AsyncSingleFlight('tts')
+
+async def synthesize_speech(text, language_code, voice_name=None, encoding='LINEAR16'):
+    """Audio for text from the TTS pool, shared by concurrent identical requests."""
+    key = cache_key(text, language_code, voice_name, encoding)
+    # Clips already in memory are served without a TTS admission slot or worker
+    audio_bytes = tts_cache.get_memory(key)
+    if audio_bytes is not None:
+        CACHE_REQUESTS.inc(cache='tts', result='hit')
+        return audio_bytes
+    return await tts_flights.do(key, run_stage, 'tts', runTTS, text, return_bytes=True, language_code=language_code,
+                                voice_name=voice_name, audio_encoding=encoding)
+
+async def reply_audio(text, language_code, audio_format='wav', audio_delivery='base64', voice_name=None):
+    """
+    Synthesize a reply and package it for a JSON response.
+
+    audio_delivery='base64' inlines the audio as before. 'url' returns an
+    /audio/<id> link instead, which the client fetches as plain binary: no
+    base64 inflation and no extra copies of the clip held in the JSON body.
+    """
+    encoding = get_audio_encoding(audio_format)
+    text = speakable(text, language_code)
+    audio_bytes = await synthesize_speech(text, language_code, voice_name, encoding)
+    fields = {"audio_mime_type": AUDIO_MIME_TYPES[encoding]}
+    if audio_delivery == 'url':
+        # Clips are content-addressed in the TTS cache, so the cache key doubles as the audio id.
+        # The link works for as long as the clip stays in the cache (see TTS_CACHE_DISK_MB).
+        fields["audio_url"] = f"/audio/{cache_key(text, language_code, voice_name, encoding)}"
+    else:
+        with timed('base64'):
+            fields["audio_base64"] = base64.b64encode(audio_bytes).decode('utf-8')
+    return fields
+
+async def speech_events(text, language_code, timer, audio_format='wav'):
+    """
+    Yield one SSE 'audio' event per sentence, synthesized concurrently and sent in order.
+
+    Each sentence is admitted to TTS on its own, so one can be shed after the
+    response and earlier sentences have gone out. The Overloaded error then
+    carries the index of the first sentence without audio (see overloaded_event).
+    """
+    encoding = get_audio_encoding(audio_format)
+
+    async def synthesize(segment):
+        return await synthesize_speech(speakable(segment, language_code), language_code, encoding=encoding)
+
+    next_index = 0
+    try:
+        async for index, segment, audio_bytes in synthesize_in_order(split_sentences(text), synthesize):
+            timer.mark_audio()
+            with timed('base64'):
+                audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
+            yield sse_event({
+                "index": index,
+                "text": segment,
+                "audio_base64": audio_base64,
+                "audio_mime_type": AUDIO_MIME_TYPES[encoding]
+            }, event="audio")
+            next_index = index + 1
+    except Overloaded as e:
+        e.index = next_index
+        raise
+
+def overloaded_event(e):
+    """
+    SSE 'error' event for a stream shed by admission control. The status is
+    already 200, so the client retries after 'retry_after' seconds; 'index'
+    (the first sentence without audio) is set if shed during speech_events.
+    """
+    fields = {"detail": str(e), "retry_after": e.retry_after, "status": e.status_code}
+    if getattr(e, 'index', None) is not None:
+        fields["index"] = e.index
+    return sse_event(fields, event="error")
+
+# Request lanes and deadlines for the upstream limits (admission.py)
+app.add_middleware(AdmissionMiddleware)
+
+# Per-request stage timings (Server-Timing header) and /metrics counters
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load: 429 when an upstream queue is full, 503 when the deadline passed."""
+    print(f"Shed {request.url.path}: {exc}")
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)},
+                        headers={"Retry-After": str(exc.retry_after)})
 
 app.add_middleware(
     CORSMiddleware,
@@ -46,101 +156,291 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def transcribe_clip(audio_bytes, language_code, encoding='WEBM_OPUS', rate=None):
+    """Trim the silence around an uploaded clip in the audio pool, then transcribe it.
+    Clips without speech return "" without calling Speech-to-Text."""
+    audio_bytes, encoding, rate, stats = await run_stage('audio', preprocess_audio, audio_bytes, encoding, rate)
+    if stats["duration_ms"] is not None:
+        AUDIO_SECONDS.inc(stats["duration_ms"] / 1000, stage='received')
+        AUDIO_SECONDS.inc(stats["sent_ms"] / 1000, stage='sent')
+    if not stats["has_speech"]:
+        AUDIO_CLIPS.inc(result='no_speech')
+        print(f"No speech in {stats['duration_ms']}ms clip, skipped STT ({stats['ms']}ms)")
+        return ""
+    AUDIO_CLIPS.inc(result='trimmed' if stats["trimmed"] else 'untrimmed')
+    if stats["trimmed"]:
+        print(f"Audio {stats['duration_ms']}ms -> {stats['sent_ms']}ms, "
+              f"{stats['original_bytes']} -> {stats['bytes']} bytes in {stats['ms']}ms")
+    if stats["sent_ms"] and stats["sent_ms"] > MAX_SEGMENT_SECONDS * 1000:
+        return await transcribe_long_clip(audio_bytes, language_code, encoding)
+    return await run_stage('stt', runSTT_from_bytes, audio_bytes, rate=rate, encoding=encoding, language_code=language_code)
+
+async def transcribe_long_clip(audio_bytes, language_code, encoding):
+    """Split a clip too long for one recognize() call at its pauses and transcribe
+    the segments concurrently (at most SEGMENT_WORKERS at a time), in order."""
+    chunks, pauses, rate, _ = await run_stage('audio', split_recording, audio_bytes, encoding)
+    limit = asyncio.Semaphore(SEGMENT_WORKERS)
+
+    async def transcribe(chunk):
+        async with limit:
+            return await run_stage('stt', runSTT_from_bytes, chunk, rate=rate, encoding='LINEAR16', language_code=language_code)
+
+    parts = await asyncio.gather(*(transcribe(chunk) for chunk in chunks))
+    return stitch_transcripts(parts, pauses, language_code)
+
+# Local YOLO detector for /objects/detect (OBJECT_DETECTOR=0 sends frames to Gemini alone)
+OBJECT_DETECTOR_ENABLED = os.environ.get("OBJECT_DETECTOR", "1") == "1"
+
+async def detect_objects(image_bytes):
+    """Detections for an uploaded frame, or [] if the local detector is off or fails."""
+    if not OBJECT_DETECTOR_ENABLED:
+        return []
+    try:
+        return await detection_batcher.detect(image_bytes)
+    except Exception as e:
+        print(f"Object detector failed: {e}")
+        return []
+
+async def prepare_image(image_bytes):
+    """Normalize an uploaded frame in the image pool, then run detection on the result.
+    Returns (image bytes, MIME type, detections)."""
+    try:
+        image_bytes, mime_type, stats = await run_stage('image', normalize_image, image_bytes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    image_stats.record(stats)
+    print(f"Image {stats['source_type']} {stats['width']}x{stats['height']}: "
+          f"{stats['original_bytes']} -> {stats['bytes']} bytes in {stats['ms']}ms")
+    return image_bytes, mime_type, await detect_objects(image_bytes)
+
+# First replies of lessons, keyed by (topic, language, lesson content hash, model).
+# The opener audio is content-addressed in the TTS cache, so it is shared too.
+lesson_openers = LessonOpenerCache(max_entries=int(os.environ.get("LESSON_OPENER_CACHE_SIZE", 256)))
+
+async def get_lesson_opener(topic_id, topic_name, language_code, lesson_context):
+    """Cached opener for a lesson: {"text", "history"}; generated once per lesson version."""
+    lang_key = 'en' if language_code.startswith('en') else 'bn'
+    key = make_opener_key(topic_id, language_code, lesson_context, get_model_name('lesson_delivery'))
+
+    async def generate():
+        text, history = await run_stage(
+            'gemini',
+            generate_opener,
+            opener_message(topic_name, lang_key),
+            mode='lesson_delivery',
+            language_code=language_code,
+            topic=topic_id,
+            context=lesson_context
+        )
+        return {"text": text, "history": history}
+
+    return await lesson_openers.get(key, generate)
+
+async def lesson_grounding(topic, language_code, text):
+    """Passages of a large lesson that match a learner's message (None when the whole lesson is in the prompt)."""
+    lesson = await run_stage('lessons', lessons.get, topic)
+    lang_key = 'en' if language_code.startswith('en') else 'bn'
+    if lesson is None or not lesson.uses_retrieval(lang_key):
+        return None
+    return await run_stage('lessons', lesson.grounding, lang_key, text)
+
+# LESSON_OPENER_WARM_UP=1 generates every lesson's openers (and their audio) at startup
+LESSON_OPENER_WARM_UP = os.environ.get("LESSON_OPENER_WARM_UP", "0") == "1"
+LESSON_OPENER_WARM_UP_LANGUAGES = os.environ.get("LESSON_OPENER_WARM_UP_LANGUAGES", "bn-BD,en-US").split(',')
+LESSON_OPENER_WARM_UP_FORMAT = os.environ.get("LESSON_OPENER_WARM_UP_FORMAT", "mp3")
+
+async def warm_up_lesson_openers():
+    summaries, _ = await run_stage('lessons', lessons.catalog)
+    for summary in summaries:
+        lesson = await run_stage('lessons', lessons.get, summary["id"])
+        if lesson is None:
+            continue
+        for language_code in LESSON_OPENER_WARM_UP_LANGUAGES:
+            lang_key = 'en' if language_code.startswith('en') else 'bn'
+            try:
+                lesson_context = await run_stage('lessons', lesson.prompt_context, lang_key)
+                opener = await get_lesson_opener(lesson.id, lesson.title(lang_key), language_code, lesson_context)
+                await reply_audio(sanitize_for_speech(opener["text"]), language_code, LESSON_OPENER_WARM_UP_FORMAT, 'url')
+            except Exception as e:
+                print(f"Lesson opener warm-up failed for {lesson.id} ({language_code}): {e}")
+    print(f"Lesson openers warmed up: {len(lesson_openers)} cached")
+
+# Backends are built lazily on first use. WARM_UP_CLIENTS=1 builds them (and
+# opens their channels) at startup; with WARM_UP_BACKGROUND=1 that happens
+# after the server starts accepting connections, and /readyz reports 503 until done.
+
+# Warm-up results for /readyz: component -> True (ready) / False (failed)
+warm_up_state = {"done": False, "components": {}}
+
+async def warm_up_backends():
+    warm_ups = {
+        'stt': run_stage('stt', warm_up_stt),
+        'tts': run_stage('tts', warm_up_tts),
+        'gemini': run_stage('gemini', warm_up_gemini),
+    }
+    if OBJECT_DETECTOR_ENABLED:
+        warm_ups['detector'] = run_stage('vision', detector.load)
+    results = await asyncio.gather(*warm_ups.values(), return_exceptions=True)
+    for name, result in zip(warm_ups, results):
+        if isinstance(result, Exception):
+            print(f"Warm-up failed for {name}: {result}")
+        warm_up_state["components"][name] = result is not False and not isinstance(result, Exception)
+    warm_up_state["done"] = True
+
+async def background_warm_up(warm_up_clients):
+    if warm_up_clients:
+        await warm_up_backends()
+    if LESSON_OPENER_WARM_UP:
+        await warm_up_lesson_openers()
+
+@app.on_event("startup")
+async def startup():
+    warm_up_clients = os.environ.get("WARM_UP_CLIENTS", "1") == "1"
+    warm_up_state["done"] = not warm_up_clients
+    if os.environ.get("WARM_UP_BACKGROUND", "1") == "1":
+        # The server can take requests while clients, models and openers are prepared
+        app.state.warm_up = asyncio.create_task(background_warm_up(warm_up_clients))
+        return
+    if warm_up_clients:
+        await warm_up_backends()
+    if LESSON_OPENER_WARM_UP:
+        app.state.warm_up = asyncio.create_task(warm_up_lesson_openers())
+
+@app.on_event("shutdown")
+async def shutdown():
+    shutdown_executors(wait=False)
+
 @app.get("/")
 async def root():
     return {"message": "Bangla Voice Chat API is running"}
 
-@app.get("/lessons")
-async def get_lessons():
-    """Scan the lessons directory and return available lessons."""
-    lessons_list = []
-    
-    if not LESSONS_DIR.exists():
-        return []
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving. Never touches a backend."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 503 until the startup warm-up has finished (immediately ready without warm-up)."""
+    if not warm_up_state["done"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "components": warm_up_state["components"]})
+    failed = [name for name, ok in warm_up_state["components"].items() if not ok]
+    return {"status": "degraded" if failed else "ready", "components": warm_up_state["components"]}
 
-    for folder in LESSONS_DIR.iterdir():
-        if folder.is_dir():
-            meta_path = folder / "metadata.json"
-            if meta_path.exists():
-                try:
-                    with open(meta_path, 'r', encoding='utf-8') as f:
-                        meta = json.load(f)
-                        lessons_list.append({
-                            "id": folder.name,
-                            "title_en": meta.get("title_en", folder.name),
-                            "title_bn": meta.get("title_bn", folder.name)
-                        })
-                except Exception as e:
-                    print(f"Error reading metadata for {folder.name}: {e}")
-    
-    return lessons_list
+@app.get("/lessons")
+async def get_lessons(request: Request):
+    """Return available lessons from the lesson catalog."""
+    lessons_list, etag = await run_stage('lessons', lessons.catalog)
+    return cached_json(request, lessons_list, etag)
 
 @app.post("/chat/audio")
-async def chat_with_audio(audio: UploadFile = File(...), language_code: Optional[str] = Form('bn-BD')):
+async def chat_with_audio(audio: UploadFile = File(...), language_code: Optional[str] = Form('bn-BD'),
+                          audio_format: Optional[str] = Form('wav'), audio_delivery: Optional[str] = Form('base64'),
+                          session_id: Optional[str] = Depends(get_session_id)):
     try:
         audio_bytes = await audio.read()
         if not audio_bytes: raise HTTPException(status_code=400, detail="No audio data")
 
         # Detect format
-        audio_format = 'wav'
+        input_format = 'wav'
         if audio.filename and audio.filename.split('.')[-1].lower() == 'webm':
-            audio_format = 'webm'
+            input_format = 'webm'
         
-        encoding = speech.RecognitionConfig.AudioEncoding.WEBM_OPUS if audio_format == 'webm' else speech.RecognitionConfig.AudioEncoding.LINEAR16
-        sample_rate = None if audio_format == 'webm' else 16000
+        encoding = 'WEBM_OPUS' if input_format == 'webm' else 'LINEAR16'
+        sample_rate = None if input_format == 'webm' else 16000
 
-        user_text = runSTT_from_bytes(audio_bytes, rate=sample_rate, encoding=encoding, language_code=language_code)
+        user_text = await transcribe_clip(audio_bytes, language_code, encoding, sample_rate)
         if not user_text: raise HTTPException(status_code=400, detail="No speech detected")
 
-        assistant_text = send_message(user_text, mode='chat', language_code=language_code)
-        assistant_text_clean = strip_markdown(assistant_text)
-        response_audio_bytes = runTTS(assistant_text_clean, return_bytes=True, language_code=language_code)
-        audio_base64 = base64.b64encode(response_audio_bytes).decode('utf-8')
+        assistant_text = await run_stage('gemini', send_message, user_text, mode='chat', language_code=language_code, session_id=session_id)
+        assistant_text_clean = sanitize_for_speech(assistant_text)
+        audio_fields = await reply_audio(assistant_text_clean, language_code, audio_format, audio_delivery)
 
         return JSONResponse(content={
             "user_text": user_text,
             "assistant_text": assistant_text_clean,
-            "audio_base64": audio_base64
+            **audio_fields
         })
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/objects/detect")
-async def detect_objects_with_audio(audio: UploadFile = File(...), image: UploadFile = File(...), language_code: Optional[str] = Form('bn-BD')):
+async def detect_objects_with_audio(audio: UploadFile = File(...), image: UploadFile = File(...), language_code: Optional[str] = Form('bn-BD'),
+                                    audio_format: Optional[str] = Form('wav'), audio_delivery: Optional[str] = Form('base64'),
+                                    session_id: Optional[str] = Depends(get_session_id)):
     try:
         image_bytes = await image.read()
         audio_bytes = await audio.read()
-        
-        user_text = runSTT_from_bytes(audio_bytes, rate=None, encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS, language_code=language_code)
+        lang_key = 'en' if language_code.startswith('en') else 'bn'
+
+        # Normalize the image and detect objects while the question is being transcribed
+        image_task = asyncio.ensure_future(prepare_image(image_bytes))
+        try:
+            user_text = await transcribe_clip(audio_bytes, language_code)
+        except BaseException:
+            # Report the STT error (e.g. 429/503), not whatever the image turns out to be
+            image_task.cancel()
+            await asyncio.gather(image_task, return_exceptions=True)
+            raise
+        image_bytes, image_mime_type, detections = await image_task
         if not user_text: raise HTTPException(status_code=400, detail="No speech detected")
 
-        assistant_text = send_message(user_text, mode='object_detection', language_code=language_code, image_bytes=image_bytes)
-        assistant_text_clean = strip_markdown(assistant_text)
-        response_audio_bytes = runTTS(assistant_text_clean, return_bytes=True, language_code=language_code)
-        audio_base64 = base64.b64encode(response_audio_bytes).decode('utf-8')
+        # Simple "what is this?" questions are answered from the detections alone
+        assistant_text = answer_from_detections(user_text, detections, lang_key)
+        if assistant_text is None:
+            assistant_text = await run_stage('gemini', send_message, user_text, mode='object_detection', language_code=language_code, image_bytes=image_bytes,
+                                             image_mime_type=image_mime_type, session_id=session_id, grounding=format_grounding(detections, lang_key))
+        assistant_text_clean = sanitize_for_speech(assistant_text)
+        audio_fields = await reply_audio(assistant_text_clean, language_code, audio_format, audio_delivery)
 
         return JSONResponse(content={
             "user_text": user_text,
             "assistant_text": assistant_text_clean,
-            "audio_base64": audio_base64
+            "detections": detections,
+            **audio_fields
         })
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat/text")
-async def chat_with_text(text: str):
+async def chat_with_text(text: str, session_id: Optional[str] = Depends(get_session_id)):
     try:
-        assistant_text = send_message(text, mode='chat')
+        assistant_text = await run_stage('gemini', send_message, text, mode='chat', session_id=session_id)
         return {"response": assistant_text}
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/text/stream")
+async def chat_with_text_stream(text: str, language_code: Optional[str] = 'bn-BD', session_id: Optional[str] = Depends(get_session_id)):
+    """Stream the assistant's reply as Server-Sent Events: 'token' events as they are generated, then 'done'."""
+    async def events():
+        try:
+            parts = []
+            async for token in iterate_stage('gemini', send_message_stream, text, mode='chat', language_code=language_code, session_id=session_id):
+                parts.append(token)
+                yield sse_event({"text": token}, event="token")
+            yield sse_event({"response": "".join(parts)}, event="done")
+        except Overloaded as e:
+            yield overloaded_event(e)
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            yield sse_event({"detail": str(e)}, event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @app.post("/session/reset")
-async def reset_session(mode: Optional[str] = Form('chat'), language_code: Optional[str] = Form('bn-BD'), topic: Optional[str] = Form(None)):
+async def reset_session(mode: Optional[str] = Form('chat'), language_code: Optional[str] = Form('bn-BD'), topic: Optional[str] = Form(None),
+                        session_id: Optional[str] = Depends(get_session_id)):
     try:
-        reset_chat_session(mode=mode, language_code=language_code, topic=topic)
+        reset_chat_session(mode=mode, language_code=language_code, topic=topic, session_id=session_id)
         return {"message": "Session reset"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -148,156 +448,459 @@ async def reset_session(mode: Optional[str] = Form('chat'), language_code: Optio
 class LessonStartRequest(BaseModel):
     topic: str
     language_code: Optional[str] = 'bn-BD'
+    audio_format: Optional[str] = 'wav'
+    audio_delivery: Optional[str] = 'base64'
 
 class LessonTextRequest(BaseModel):
     text: str
     topic: str
     language_code: Optional[str] = 'bn-BD'
+    audio_format: Optional[str] = 'wav'
+    audio_delivery: Optional[str] = 'base64'
 
 # --- NEW CLASS FOR TTS REQUEST ---
 class TTSRequest(BaseModel):
     text: str
     language_code: Optional[str] = 'bn-BD'
+    voice_name: Optional[str] = None
+    audio_format: Optional[str] = 'wav'
+    audio_delivery: Optional[str] = 'base64'  # 'base64', 'url' or 'binary'
 
 # --- NEW ENDPOINT FOR TTS ---
 @app.post("/tts")
 async def text_to_speech(request: TTSRequest):
     try:
-        audio_bytes = runTTS(request.text, return_bytes=True, language_code=request.language_code)
-        audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
-        return JSONResponse(content={
-            "audio_base64": audio_base64
-        })
+        if request.audio_delivery == 'binary':
+            # Raw audio body, e.g. for <audio src> or fetch().blob()
+            encoding = get_audio_encoding(request.audio_format)
+            text = speakable(request.text, request.language_code)
+            audio_bytes = await synthesize_speech(text, request.language_code, request.voice_name, encoding)
+            return Response(content=audio_bytes, media_type=AUDIO_MIME_TYPES[encoding])
+
+        audio_fields = await reply_audio(request.text, request.language_code, request.audio_format,
+                                         request.audio_delivery, voice_name=request.voice_name)
+        return JSONResponse(content=audio_fields)
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         print(f"Error in TTS: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/tts/stream")
+async def text_to_speech_stream(request: TTSRequest):
+    """Stream the speech for long text sentence by sentence as Server-Sent Events."""
+    get_audio_encoding(request.audio_format)  # an unknown format is a 400, not an error event
+
+    async def events():
+        timer = StreamTimer()
+        try:
+            async for event in speech_events(request.text, request.language_code, timer, request.audio_format):
+                yield event
+            timings = timer.summary()
+            print(f"TTS stream: first audio {timings['time_to_first_audio_ms']}ms, total {timings['total_ms']}ms")
+            yield sse_event(timings, event="done")
+        except Overloaded as e:
+            yield overloaded_event(e)
+        except Exception as e:
+            print(f"Error in TTS stream: {str(e)}")
+            yield sse_event({"detail": str(e)}, event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/audio/{audio_id}")
+async def get_audio(audio_id: str):
+    """
+    Fetch a synthesized reply by the id returned in 'audio_url'. The id is the
+    clip's TTS cache key, extension included, so a link answers 404 once the
+    clip has been evicted or if its extension is changed.
+    """
+    match = AUDIO_ID_PATTERN.match(audio_id)
+    if not match:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    audio_bytes = tts_cache.get_memory(audio_id)
+    if audio_bytes is None:
+        audio_bytes = await run_stage('cache', tts_cache.get, audio_id)
+    if audio_bytes is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    encoding = AUDIO_FORMATS[match.group(2)]
+    return Response(content=audio_bytes, media_type=AUDIO_MIME_TYPES[encoding],
+                    headers={"Cache-Control": "public, max-age=86400, immutable"})
+
+@app.get("/sessions/stats")
+async def session_stats():
+    return chat_sessions.stats()
+
+@app.get("/images/stats")
+async def image_prep_stats():
+    return image_stats.stats()
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """Upstream limits: active calls, queued calls per lane and rejections."""
+    return admission_stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-endpoint and per-stage latency histograms, bytes and cache counters."""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/tts/cache/stats")
+async def tts_cache_stats():
+    return tts_cache.stats()
+
 @app.post("/lesson/start")
-async def start_lesson(request: LessonStartRequest):
+async def start_lesson(request: LessonStartRequest, session_id: Optional[str] = Depends(get_session_id)):
     try:
         topic_id = request.topic
         language_code = request.language_code
         lang_key = 'en' if language_code.startswith('en') else 'bn'
         
-        # 1. Read lesson content
-        lesson_folder = LESSONS_DIR / topic_id
-        content_path = lesson_folder / f"content_{lang_key}.txt"
-        if not content_path.exists():
-            content_path = lesson_folder / "content_en.txt" # Fallback
-            
-        lesson_context = ""
-        if content_path.exists():
-            with open(content_path, 'r', encoding='utf-8') as f:
-                lesson_context = f.read()
-
-        # 2. Get Topic Name
-        meta_path = lesson_folder / "metadata.json"
-        topic_name = topic_id
-        if meta_path.exists():
-            with open(meta_path, 'r', encoding='utf-8') as f:
-                meta = json.load(f)
-                topic_name = meta.get(f"title_{lang_key}", topic_id)
-
-        # 3. Create initial message
-        if lang_key == 'bn':
-            initial_message = f"আমি {topic_name} সম্পর্কে শিখতে চাই। দয়া করে পাঠ শুরু করুন।"
-        else:
-            initial_message = f"I want to learn about {topic_name}. Please start the lesson."
-        
-        # 4. Reset and Start Session with Context
-        reset_chat_session(mode='lesson_delivery', language_code=language_code, topic=topic_id)
-        
-        assistant_text = send_message(
-            initial_message,
+        # 1. Read lesson content and topic name from the catalog
+        lesson = await run_stage('lessons', lessons.get, topic_id)
+        # Large lessons only send their beginning; turns then get retrieved passages
+        lesson_context = await run_stage('lessons', lesson.prompt_context, lang_key) if lesson else ""
+        topic_name = lesson.title(lang_key) if lesson else topic_id
+
+        # 2. Get the opener shared by everyone starting this lesson version
+        opener = await get_lesson_opener(topic_id, topic_name, language_code, lesson_context)
+
+        # 3. Start a fresh session from the opener's history, so the next turn continues it
+        await run_stage(
+            'gemini',
+            seed_chat_session,
+            opener["history"],
             mode='lesson_delivery',
             language_code=language_code,
             topic=topic_id,
-            context=lesson_context
+            context=lesson_context,
+            session_id=session_id
         )
+        assistant_text = opener["text"]
         
-        assistant_text_clean = strip_markdown(assistant_text)
-        response_audio_bytes = runTTS(assistant_text_clean, return_bytes=True, language_code=language_code)
-        audio_base64 = base64.b64encode(response_audio_bytes).decode('utf-8')
+        assistant_text_clean = sanitize_for_speech(assistant_text)
+        audio_fields = await reply_audio(assistant_text_clean, language_code, request.audio_format, request.audio_delivery)
         
         return JSONResponse(content={
             "assistant_text": assistant_text_clean,
-            "audio_base64": audio_base64
+            **audio_fields
         })
         
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/lesson/audio")
-async def lesson_with_audio(audio: UploadFile = File(...), topic: Optional[str] = Form(...), language_code: Optional[str] = Form('bn-BD')):
+async def lesson_with_audio(audio: UploadFile = File(...), topic: Optional[str] = Form(...), language_code: Optional[str] = Form('bn-BD'),
+                            audio_format: Optional[str] = Form('wav'), audio_delivery: Optional[str] = Form('base64'),
+                            session_id: Optional[str] = Depends(get_session_id)):
     try:
         audio_bytes = await audio.read()
-        user_text = runSTT_from_bytes(audio_bytes, rate=None, encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS, language_code=language_code)
+        user_text = await transcribe_clip(audio_bytes, language_code)
         
         if not user_text: raise HTTPException(status_code=400, detail="No speech detected")
         
         # Pass topic so Gemini finds the correct session with context
-        assistant_text = send_message(
+        assistant_text = await run_stage(
+            'gemini',
+            send_message,
             user_text,
             mode='lesson_delivery',
             language_code=language_code,
-            topic=topic
+            topic=topic,
+            session_id=session_id,
+            grounding=await lesson_grounding(topic, language_code, user_text)
         )
         
-        assistant_text_clean = strip_markdown(assistant_text)
-        response_audio_bytes = runTTS(assistant_text_clean, return_bytes=True, language_code=language_code)
-        audio_base64 = base64.b64encode(response_audio_bytes).decode('utf-8')
+        assistant_text_clean = sanitize_for_speech(assistant_text)
+        audio_fields = await reply_audio(assistant_text_clean, language_code, audio_format, audio_delivery)
         
         return JSONResponse(content={
             "user_text": user_text,
             "assistant_text": assistant_text_clean,
-            "audio_base64": audio_base64
+            **audio_fields
         })
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/lesson/text")
-async def lesson_with_text(request: LessonTextRequest):
+async def lesson_with_text(request: LessonTextRequest, session_id: Optional[str] = Depends(get_session_id)):
     try:
-        assistant_text = send_message(
+        assistant_text = await run_stage(
+            'gemini',
+            send_message,
             request.text,
             mode='lesson_delivery',
             language_code=request.language_code,
-            topic=request.topic
+            topic=request.topic,
+            session_id=session_id,
+            grounding=await lesson_grounding(request.topic, request.language_code, request.text)
         )
         
-        assistant_text_clean = strip_markdown(assistant_text)
-        response_audio_bytes = runTTS(assistant_text_clean, return_bytes=True, language_code=request.language_code)
-        audio_base64 = base64.b64encode(response_audio_bytes).decode('utf-8')
+        assistant_text_clean = sanitize_for_speech(assistant_text)
+        audio_fields = await reply_audio(assistant_text_clean, request.language_code, request.audio_format, request.audio_delivery)
         
         return JSONResponse(content={
             "response": assistant_text_clean,
-            "audio_base64": audio_base64
+            **audio_fields
         })
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/lesson/text/stream")
+async def lesson_with_text_stream(request: LessonTextRequest, session_id: Optional[str] = Depends(get_session_id)):
+    """
+    Like /lesson/text, but streamed as Server-Sent Events: 'token' events as
+    Gemini generates the answer, a 'text' event with the full cleaned answer,
+    one 'audio' event per sentence in order, then 'done' with time-to-first-audio
+    and total time.
+    """
+    get_audio_encoding(request.audio_format)  # an unknown format is a 400, not an error event
+
+    async def events():
+        timer = StreamTimer()
+        try:
+            # Clean the answer as it streams instead of re-scanning it at the end
+            sanitizer = SpeechSanitizer()
+            clean_parts = []
+            async for token in iterate_stage(
+                'gemini',
+                send_message_stream,
+                request.text,
+                mode='lesson_delivery',
+                language_code=request.language_code,
+                topic=request.topic,
+                session_id=session_id,
+                grounding=await lesson_grounding(request.topic, request.language_code, request.text)
+            ):
+                clean_parts.append(sanitizer.feed(token))
+                yield sse_event({"text": token}, event="token")
+            clean_parts.append(sanitizer.flush())
+
+            assistant_text_clean = "".join(clean_parts)
+            yield sse_event({"response": assistant_text_clean}, event="text")
+
+            async for event in speech_events(assistant_text_clean, request.language_code, timer, request.audio_format):
+                yield event
+
+            timings = timer.summary()
+            print(f"Lesson stream: first audio {timings['time_to_first_audio_ms']}ms, total {timings['total_ms']}ms")
+            yield sse_event(timings, event="done")
+        except Overloaded as e:
+            yield overloaded_event(e)
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            yield sse_event({"detail": str(e)}, event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @app.post("/lesson/quiz")
 async def get_lesson_quiz(request: LessonStartRequest):
+    quiz_data, _ = await run_stage('lessons', lessons.quiz, request.topic)
+    if quiz_data is None:
+        raise HTTPException(status_code=404, detail="Quiz not found for this topic")
+    return quiz_data
+
+@app.get("/lesson/{topic}/quiz")
+async def get_lesson_quiz_cached(topic: str, request: Request):
+    """Cacheable variant of POST /lesson/quiz: repeat loads get 304 Not Modified."""
+    quiz_data, etag = await run_stage('lessons', lessons.quiz, topic)
+    if quiz_data is None:
+        raise HTTPException(status_code=404, detail="Quiz not found for this topic")
+    return cached_json(request, quiz_data, etag)
+
+@app.get("/lesson/{topic}/audio/{asset}")
+async def get_lesson_audio(topic: str, asset: str):
+    """Serve a pre-rendered lesson/quiz audio asset."""
+    if not ASSET_NAME_PATTERN.match(asset) or "/" in topic or topic.startswith("."):
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    asset_path = LESSONS_DIR / topic / AUDIO_DIR_NAME / asset
+    if not asset_path.exists():
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    # Asset names are content hashes, so a given URL never changes
+    media_type = AUDIO_MIME_TYPES[AUDIO_FORMATS[asset.rsplit('.', 1)[1]]]
+    return FileResponse(asset_path, media_type=media_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+# A streaming utterance holds an STT worker and admission slot until it ends, so
+# it is ended after this long without audio, or once it has run this long
+VOICE_IDLE_TIMEOUT_SECONDS = float(os.environ.get("VOICE_IDLE_TIMEOUT_SECONDS", 5))
+VOICE_MAX_UTTERANCE_SECONDS = float(os.environ.get("VOICE_MAX_UTTERANCE_SECONDS", 60))
+
+async def receive_utterance_audio(websocket, chunks):
+    """
+    Forward binary mic chunks to the STT worker until the client sends {"type": "end"},
+    goes quiet for VOICE_IDLE_TIMEOUT_SECONDS or has spoken for VOICE_MAX_UTTERANCE_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    ends_at = loop.time() + VOICE_MAX_UTTERANCE_SECONDS
     try:
-        # Construct path to the quiz.json file
-        lesson_folder = LESSONS_DIR / request.topic
-        quiz_path = lesson_folder / "quiz.json"
-        
-        # Check if file exists
-        if not quiz_path.exists():
-            raise HTTPException(status_code=404, detail="Quiz not found for this topic")
-            
-        # Read and return the JSON directly
-        with open(quiz_path, 'r', encoding='utf-8') as f:
-            quiz_data = json.load(f)
-        return quiz_data
-        
+        while True:
+            timeout = min(VOICE_IDLE_TIMEOUT_SECONDS, ends_at - loop.time())
+            try:
+                message = await asyncio.wait_for(websocket.receive(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                reason = 'max_length' if loop.time() >= ends_at else 'idle'
+                print(f"Ended voice utterance ({reason})")
+                await websocket.send_json({"type": "endpoint", "reason": reason})
+                return
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                chunks.put(message["bytes"])
+            elif message.get("text") and json.loads(message["text"]).get("type") == "end":
+                return
+    finally:
+        chunks.put(None)
+
+# What a /ws/voice "start" message may ask for
+VOICE_MODES = ('chat', 'lesson_delivery')
+VOICE_LANGUAGE_CODE = re.compile(r'^(bn|en)(-[A-Z]{2})?$')
+
+def parse_voice_start(text):
+    """
+    Settings of a /ws/voice "start" message, with defaults filled in; None for
+    other messages. Raises ValueError with a message for the client if invalid.
+    """
+    try:
+        settings = json.loads(text)
+    except ValueError:
+        raise ValueError("Messages must be JSON")
+    if not isinstance(settings, dict) or settings.get("type") != "start":
+        return None
+
+    settings = {"mode": 'chat', "language_code": 'bn-BD', "audio_format": 'wav', "audio_delivery": 'base64', **settings}
+    if settings["mode"] not in VOICE_MODES:
+        raise ValueError(f"Unsupported mode: {settings['mode']} (use {', '.join(VOICE_MODES)})")
+    if not isinstance(settings["language_code"], str) or not VOICE_LANGUAGE_CODE.match(settings["language_code"]):
+        raise ValueError(f"Unsupported language_code: {settings['language_code']} (use e.g. bn-BD or en-US)")
+    if settings["audio_format"] not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio format: {settings['audio_format']} (use {', '.join(AUDIO_FORMATS)})")
+    return settings
+
+@app.websocket("/ws/voice")
+async def voice_websocket(websocket: WebSocket):
+    """
+    Streaming voice turns over a WebSocket.
+
+    Per turn the client sends a JSON {"type": "start", "mode": "chat"|"lesson_delivery",
+    "language_code", "topic", "session_id", "audio_format", "audio_delivery"} message, then binary
+    WebM/Opus chunks from MediaRecorder while the user speaks, and optionally
+    {"type": "end"}. The server replies with "interim" transcripts, "endpoint" once
+    Google hears the user stop or the utterance hits its idle/length limit (the
+    client can stop recording), "final" with the transcript, then "reply" with the
+    assistant text and audio. Gemini is called as soon as the utterance ends, not
+    after a separate upload and recognition pass.
+    """
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+
+    def send_from_worker(payload):
+        asyncio.run_coroutine_threadsafe(websocket.send_json(payload), loop)
+
+    try:
+        while True:
+            start = await websocket.receive()
+            if start["type"] == "websocket.disconnect":
+                return
+            if not start.get("text"):
+                continue  # stray audio from the previous turn
+            try:
+                settings = parse_voice_start(start["text"])
+            except ValueError as e:
+                # A bad start message fails only this turn; the socket stays open
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            if settings is None:
+                continue
+
+            mode = settings["mode"]
+            language_code = settings["language_code"]
+            topic = settings.get("topic")
+
+            chunks = queue.Queue()
+
+            def audio_chunks():
+                while True:
+                    try:
+                        # The receiver ends the utterance; this only guards the worker if it never does
+                        chunk = chunks.get(timeout=VOICE_MAX_UTTERANCE_SECONDS + VOICE_IDLE_TIMEOUT_SECONDS)
+                    except queue.Empty:
+                        return
+                    if chunk is None:
+                        return
+                    yield chunk
+
+            def on_endpoint():
+                chunks.put(None)
+                send_from_worker({"type": "endpoint"})
+
+            receiver = asyncio.ensure_future(receive_utterance_audio(websocket, chunks))
+            try:
+                user_text = await run_stage(
+                    'stt',
+                    runSTT_streaming,
+                    audio_chunks(),
+                    language_code=language_code,
+                    on_interim=lambda text: send_from_worker({"type": "interim", "text": text}),
+                    on_endpoint=on_endpoint
+                )
+            finally:
+                receiver.cancel()
+
+            await websocket.send_json({"type": "final", "text": user_text})
+            if not user_text:
+                await websocket.send_json({"type": "error", "detail": "No speech detected"})
+                continue
+
+            assistant_text = await run_stage(
+                'gemini',
+                send_message,
+                user_text,
+                mode=mode,
+                language_code=language_code,
+                topic=topic,
+                session_id=settings.get("session_id"),
+                grounding=await lesson_grounding(topic, language_code, user_text) if mode == 'lesson_delivery' else None
+            )
+            assistant_text_clean = sanitize_for_speech(assistant_text)
+            audio_fields = await reply_audio(assistant_text_clean, language_code,
+                                             settings["audio_format"], settings["audio_delivery"])
+            await websocket.send_json({
+                "type": "reply",
+                "user_text": user_text,
+                "assistant_text": assistant_text_clean,
+                **audio_fields
+            })
+    except WebSocketDisconnect:
+        pass
+    except Overloaded as e:
+        print(f"Shed voice websocket: {e}")
+        try:
+            await websocket.send_json({"type": "error", "detail": str(e), "retry_after": e.retry_after})
+            await websocket.close(code=1013)  # Try Again Later
+        except Exception:
+            pass
     except Exception as e:
-        print(f"Error reading quiz: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error reading quiz: {str(e)}")
+        print(f"Error in voice websocket: {str(e)}")
+        try:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import uvicorn
+
+    # More than one worker needs a shared session backend (SESSION_BACKEND=sqlite)
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, workers=workers)
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+Audio front-end for uploaded voice clips: decode to PCM, find the speech
+with an energy detector, trim leading/trailing silence and spot clips with
+no speech at all, so they never reach Speech-to-Text.
+
+WAV (LINEAR16) is decoded with the standard library. WebM/Opus from the
+browser's MediaRecorder is decoded with ffmpeg, and cut without re-encoding;
+without ffmpeg such clips are passed through untouched.
+"""
+
+from array import array
+import io
+import math
+import operator
+import os
+import shutil
+import subprocess
+import sys
+import time
+import wave
+
+FFMPEG = os.environ.get("FFMPEG_PATH", "ffmpeg")
+VAD_ENABLED = os.environ.get("VAD_ENABLED", "1") == "1"
+# Analysis frame length
+VAD_FRAME_MS = int(os.environ.get("VAD_FRAME_MS", 30))
+# Frames this far above the clip's noise floor count as speech...
+VAD_MARGIN_DB = float(os.environ.get("VAD_MARGIN_DB", 12))
+# ...but never quieter than this (dBFS), however clean the recording
+VAD_THRESHOLD_DB = float(os.environ.get("VAD_THRESHOLD_DB", -45))
+# Louder than this is speech even in a clip that is speech from start to end
+VAD_MAX_THRESHOLD_DB = -30.0
+# Speech kept before and after the detected speech, so word edges aren't clipped
+VAD_PAD_MS = int(os.environ.get("VAD_PAD_MS", 250))
+# Less speech than this in a clip means there is nothing to transcribe
+VAD_MIN_SPEECH_MS = int(os.environ.get("VAD_MIN_SPEECH_MS", 200))
+# WebM clips are only cut when that removes at least this much audio
+VAD_MIN_TRIM_MS = int(os.environ.get("VAD_MIN_TRIM_MS", 500))
+
+# Sample rate WebM/Opus is decoded to for analysis
+ANALYSIS_RATE = 16000
+
+_ffmpeg_available = None
+
+
+def ffmpeg_available():
+    global _ffmpeg_available
+    if _ffmpeg_available is None:
+        _ffmpeg_available = shutil.which(FFMPEG) is not None
+        if not _ffmpeg_available:
+            print(f"{FFMPEG} not found: WebM clips are sent to Speech-to-Text without silence trimming")
+    return _ffmpeg_available
+
+
+def _run_ffmpeg(args, data):
+    result = subprocess.run([FFMPEG, "-hide_banner", "-loglevel", "error", *args],
+                            input=data, capture_output=True, timeout=30)
+    if result.returncode != 0 or not result.stdout:
+        raise ValueError(f"ffmpeg failed: {result.stderr.decode('utf-8', 'replace').strip()[-300:]}")
+    return result.stdout
+
+
+def _samples(pcm):
+    samples = array('h')
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples
+
+
+def decode_wav(data):
+    """
+    Decode a 16-bit PCM WAV file.
+
+    Returns:
+        tuple: (mono samples as array('h'), sample rate)
+
+    Raises:
+        ValueError: If the data is not 16-bit PCM WAV.
+    """
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise ValueError(f"Not a PCM WAV file: {e}")
+    if width != 2:
+        raise ValueError(f"Unsupported WAV sample width: {width * 8} bits")
+
+    samples = _samples(frames)
+    if channels > 1:
+        # Average the channels: the detector only needs the energy
+        samples = array('h', (sum(samples[i:i + channels]) // channels
+                              for i in range(0, len(samples) - channels + 1, channels)))
+    return samples, rate
+
+
+def decode_webm(data):
+    """
+    Decode WebM/Opus (or anything else ffmpeg reads) to 16 kHz mono samples.
+    """
+    pcm = _run_ffmpeg(["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(ANALYSIS_RATE), "pipe:1"], data)
+    return _samples(pcm), ANALYSIS_RATE
+
+
+def encode_wav(samples, rate):
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        data = array('h', samples)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        wav.writeframes(data.tobytes())
+    return out.getvalue()
+
+
+def cut_webm(data, start_s, end_s):
+    """
+    Cut a WebM/Opus clip to [start_s, end_s] by copying packets (no re-encoding).
+    """
+    return _run_ffmpeg(["-i", "pipe:0", "-ss", f"{start_s:.3f}", "-to", f"{end_s:.3f}",
+                        "-c:a", "copy", "-f", "webm", "pipe:1"], data)
+
+
+def frame_levels(samples, rate, frame_ms=VAD_FRAME_MS):
+    """
+    RMS level of each frame, in dBFS (-100 for digital silence).
+    """
+    size = max(1, rate * frame_ms // 1000)
+    levels = []
+    for start in range(0, len(samples) - size + 1, size):
+        frame = samples[start:start + size]
+        power = sum(map(operator.mul, frame, frame)) / size
+        levels.append(10 * math.log10(power / (32768.0 ** 2)) if power > 0 else -100.0)
+    return levels
+
+
+def speech_threshold(levels, margin_db=VAD_MARGIN_DB, min_db=VAD_THRESHOLD_DB):
+    """
+    Level above which a frame counts as speech, relative to the clip's noise
+    floor (its 10th-percentile frame level).
+    """
+    noise_floor = sorted(levels)[len(levels) // 10]
+    return min(max(noise_floor + margin_db, min_db), VAD_MAX_THRESHOLD_DB)
+
+
+def speech_segments(samples, rate, frame_ms=VAD_FRAME_MS, min_gap_ms=300, pad_ms=VAD_PAD_MS,
+                    min_segment_ms=90):
+    """
+    Find the stretches of speech in a clip.
+
+    Speech frames closer than min_gap_ms are merged into one segment; segments
+    shorter than min_segment_ms (clicks, bumps) are dropped, and the rest are
+    padded by pad_ms on each side.
+
+    Returns:
+        list[tuple]: (start sample, end sample) of each segment, in order.
+    """
+    levels = frame_levels(samples, rate, frame_ms)
+    if not levels:
+        return []
+    threshold = speech_threshold(levels)
+
+    size = max(1, rate * frame_ms // 1000)
+    max_gap = max(1, min_gap_ms // frame_ms)
+    segments = []
+    start = end = None
+    for index, level in enumerate(levels):
+        if level < threshold:
+            continue
+        if start is not None and index - end <= max_gap:
+            end = index
+            continue
+        if start is not None:
+            segments.append((start, end))
+        start = end = index
+    if start is not None:
+        segments.append((start, end))
+
+    pad = rate * pad_ms // 1000
+    min_frames = max(1, min_segment_ms // frame_ms)
+    return [
+        (max(0, first * size - pad), min(len(samples), (last + 1) * size + pad))
+        for first, last in segments
+        if last - first + 1 >= min_frames
+    ]
+
+
+def preprocess_audio(data, encoding='WEBM_OPUS', rate=None):
+    """
+    Trim the silence around the speech in an uploaded clip before STT.
+
+    Args:
+        data (bytes): The uploaded clip.
+        encoding (str): 'WEBM_OPUS' or 'LINEAR16' (WAV).
+        rate (int, optional): Sample rate to send to STT.
+
+    Returns:
+        tuple: (audio bytes, encoding, rate, stats dict). stats["has_speech"]
+               is False when the clip holds no speech and need not be transcribed.
+               Clips that can't be decoded are returned unchanged, with
+               stats["trimmed"] False and has_speech True.
+    """
+    start = time.perf_counter()
+    stats = {"source": encoding, "original_bytes": len(data), "bytes": len(data), "duration_ms": None,
+             "speech_ms": None, "sent_ms": None, "has_speech": True, "trimmed": False}
+
+    def done(result_data, result_encoding, result_rate):
+        stats["bytes"] = len(result_data)
+        stats["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result_data, result_encoding, result_rate, stats
+
+    if not VAD_ENABLED:
+        return done(data, encoding, rate)
+    try:
+        if encoding == 'LINEAR16':
+            samples, sample_rate = decode_wav(data)
+        elif ffmpeg_available():
+            samples, sample_rate = decode_webm(data)
+        else:
+            return done(data, encoding, rate)
+    except (ValueError, OSError, subprocess.TimeoutExpired) as e:
+        print(f"Audio front-end could not decode {encoding} clip, sending it as is: {e}")
+        return done(data, encoding, rate)
+
+    duration_ms = len(samples) * 1000 // sample_rate
+    segments = speech_segments(samples, sample_rate, pad_ms=0)
+    speech_ms = sum(end - begin for begin, end in segments) * 1000 // sample_rate
+    stats.update(duration_ms=duration_ms, speech_ms=speech_ms, sent_ms=duration_ms)
+
+    if speech_ms < VAD_MIN_SPEECH_MS:
+        stats.update(has_speech=False, sent_ms=0)
+        return done(b"", encoding, rate)
+
+    pad = sample_rate * VAD_PAD_MS // 1000
+    first, last = max(0, segments[0][0] - pad), min(len(samples), segments[-1][1] + pad)
+    kept_ms = (last - first) * 1000 // sample_rate
+    if encoding == 'LINEAR16':
+        stats.update(trimmed=True, sent_ms=kept_ms)
+        return done(encode_wav(samples[first:last], sample_rate), 'LINEAR16', sample_rate)
+
+    if duration_ms - kept_ms < VAD_MIN_TRIM_MS:
+        return done(data, encoding, rate)
+    try:
+        cut = cut_webm(data, first / sample_rate, last / sample_rate)
+    except (ValueError, OSError, subprocess.TimeoutExpired) as e:
+        print(f"Audio front-end could not cut WebM clip, sending it as is: {e}")
+        return done(data, encoding, rate)
+    stats.update(trimmed=True, sent_ms=kept_ms)
+    return done(cut, encoding, rate)
@@ -0,0 +1,94 @@
+"""
+Transcribe a directory of recordings with runSTT, writing one .txt per file.
+
+    python batch_stt.py recordings/ --out transcripts/ --files 4 --segments 4
+    python batch_stt.py recordings/ --language en-US --pattern "*.webm"
+
+Long recordings are split at pauses and their segments transcribed
+concurrently (--segments); several files run at once (--files), so at most
+files x segments recognize() calls are in flight. Files that already have
+a transcript are skipped unless --overwrite is given.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from audio_frontend import decode_wav
+from GoogleSTT import runSTT
+
+AUDIO_PATTERNS = ("*.wav", "*.webm", "*.ogg", "*.opus")
+
+
+def audio_seconds(path):
+    """
+    Duration of a WAV file, or None for other formats.
+    """
+    try:
+        samples, rate = decode_wav(path.read_bytes())
+    except ValueError:
+        return None
+    return len(samples) / rate
+
+
+def find_recordings(directory, patterns):
+    files = set()
+    for pattern in patterns:
+        files.update(Path(directory).rglob(pattern))
+    return sorted(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe a directory of recordings.")
+    parser.add_argument("directory")
+    parser.add_argument("--out", help="directory for the .txt transcripts (default: next to each recording)")
+    parser.add_argument("--language", default='bn-BD')
+    parser.add_argument("--pattern", action="append", help=f"glob for recordings (default: {', '.join(AUDIO_PATTERNS)})")
+    parser.add_argument("--files", type=int, default=4, help="recordings transcribed at once")
+    parser.add_argument("--segments", type=int, default=4, help="segments of one recording transcribed at once")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    root = Path(args.directory)
+    jobs = []
+    for path in find_recordings(root, args.pattern or AUDIO_PATTERNS):
+        output = (Path(args.out) / path.relative_to(root)).with_suffix(".txt") if args.out else path.with_suffix(".txt")
+        if output.exists() and not args.overwrite:
+            continue
+        output.parent.mkdir(parents=True, exist_ok=True)
+        jobs.append((path, output))
+    if not jobs:
+        print("Nothing to transcribe")
+        return
+
+    def transcribe(job):
+        path, output = job
+        start = time.perf_counter()
+        text = runSTT(str(path), output_file=str(output), language_code=args.language, max_workers=args.segments)
+        return path, text, audio_seconds(path), time.perf_counter() - start
+
+    start = time.perf_counter()
+    done = failed = 0
+    total_audio = 0.0
+    with ThreadPoolExecutor(max_workers=args.files) as pool:
+        futures = [pool.submit(transcribe, job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                path, text, seconds, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Failed: {e}")
+                continue
+            done += 1
+            total_audio += seconds or 0.0
+            length = f"{seconds:.1f}s audio" if seconds is not None else "audio"
+            print(f"[{done + failed}/{len(jobs)}] {path}: {length} in {elapsed:.1f}s, {len(text)} chars")
+
+    wall = time.perf_counter() - start
+    print(f"\n{done} transcribed, {failed} failed in {wall:.1f}s: {done / wall:.2f} files/s")
+    if total_audio:
+        print(f"{total_audio / 60:.1f} min of WAV audio, {total_audio / wall:.1f}x real time")
+
+
+if __name__ == "__main__":
+    main()
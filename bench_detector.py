@@ -0,0 +1,74 @@
+"""
+Benchmark the local object detector on bus.jpg.
+
+    python bench_detector.py --runs 20 --concurrency 1 4 8
+
+Reports model load time, single-image latency and the throughput of
+concurrent requests going through the DetectionBatcher.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+from object_detector import ObjectDetector, DetectionBatcher, format_grounding, answer_from_detections
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+
+async def run_concurrent(batcher, image_bytes, concurrency, runs):
+    latencies = []
+
+    async def one():
+        start = time.perf_counter()
+        await batcher.detect(image_bytes)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return concurrency * runs / elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local YOLO detector.")
+    parser.add_argument("--image", default=str(Path(__file__).parent / "bus.jpg"))
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    image_bytes = Path(args.image).read_bytes()
+    detector = ObjectDetector(model_path=args.model)
+
+    start = time.perf_counter()
+    detector.load()
+    print(f"load: {time.perf_counter() - start:.2f}s")
+
+    detections = detector.detect(image_bytes)
+    print(f"detections: {[(d['label'], d['confidence']) for d in detections]}")
+    print(f"grounding: {format_grounding(detections, 'en')}")
+    print(f"fast path: {answer_from_detections('What is this?', detections, 'en')!r} / "
+          f"{answer_from_detections('এটা কী?', detections, 'bn')!r}")
+
+    latencies = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        detector.detect(image_bytes)
+        latencies.append(time.perf_counter() - start)
+    print(f"single image: p50 {statistics.median(latencies) * 1000:.1f}ms, p95 {percentile(latencies, 95) * 1000:.1f}ms")
+
+    for concurrency in args.concurrency:
+        batcher = DetectionBatcher(detector, max_batch=max(args.concurrency))
+        throughput, latencies = asyncio.run(run_concurrent(batcher, image_bytes, concurrency, args.runs))
+        print(f"concurrency {concurrency}: {throughput:.1f} images/s, "
+              f"p50 {statistics.median(latencies) * 1000:.1f}ms, p95 {percentile(latencies, 95) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Per-turn Gemini request size of a long lesson session, with and without
+history compaction (chat_history.py):
+
+    python bench_history.py --turns 150
+    python bench_history.py --topic solar_system --language en-US --budget 2000
+
+Replies are sentences of the lesson itself, a few per turn, so no model is
+called. A request is the system prompt (with the lesson text), the history
+and the new message; the estimated tokens and UTF-8 bytes of each are
+reported at a few points of the session.
+"""
+import argparse
+import itertools
+import re
+import statistics
+import time
+from pathlib import Path
+
+from chat_history import compact_history, count_tokens, history_tokens
+from Gemini import get_system_prompt
+
+LESSONS_DIR = Path(__file__).parent / "lessons"
+QUESTIONS = {
+    'bn': ["এটা আরেকটু বুঝিয়ে বলবেন?", "কেন এমন হয়েছিল?", "এর পরে কী হলো?", "একটা উদাহরণ দিন।", "আমি ঠিক বুঝেছি কি?"],
+    'en': ["Can you explain that a bit more?", "Why did that happen?", "What happened next?",
+           "Can you give an example?", "Did I get that right?"],
+}
+
+
+def history_bytes(history):
+    return sum(len(part.encode('utf-8')) for message in history for part in message["parts"])
+
+
+def simulate(system_prompt, sentences, questions, turns, budget):
+    """
+    Run a session and return per-turn (request tokens, request bytes, compaction seconds).
+    """
+    history = []
+    replies = itertools.cycle(sentences)
+    system_tokens = count_tokens(system_prompt)
+    system_bytes = len(system_prompt.encode('utf-8'))
+    rows = []
+    for turn in range(turns):
+        question = f"{questions[turn % len(questions)]} ({turn + 1})"
+        request_tokens = system_tokens + history_tokens(history) + count_tokens(question)
+        request_bytes = system_bytes + history_bytes(history) + len(question.encode('utf-8'))
+        reply = " ".join(next(replies) for _ in range(3 + turn % 3))
+        history += [{"role": 'user', "parts": [question]}, {"role": 'model', "parts": [reply]}]
+
+        start = time.perf_counter()
+        compacted = compact_history(history, budget=budget) if budget else None
+        elapsed = time.perf_counter() - start
+        if compacted is not None:
+            history = compacted
+        rows.append((request_tokens, request_bytes, elapsed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-turn request size with and without history compaction.")
+    parser.add_argument("--topic", default="liberation_War")
+    parser.add_argument("--language", default="bn-BD")
+    parser.add_argument("--turns", type=int, default=150)
+    parser.add_argument("--budget", type=int, default=3000, help="history token budget (HISTORY_TOKEN_BUDGET)")
+    args = parser.parse_args()
+
+    lang_key = 'en' if args.language.startswith('en') else 'bn'
+    lesson = (LESSONS_DIR / args.topic / f"content_{lang_key}.txt").read_text(encoding='utf-8')
+    sentences = [s for s in re.split(r"(?<=[.!?।])\s+", lesson) if s.strip()]
+    system_prompt = get_system_prompt('lesson_delivery', args.language, args.topic, lesson)
+
+    full = simulate(system_prompt, sentences, QUESTIONS[lang_key], args.turns, budget=0)
+    compacted = simulate(system_prompt, sentences, QUESTIONS[lang_key], args.turns, budget=args.budget)
+
+    print(f"{args.topic} ({args.language}): system prompt {count_tokens(system_prompt)} tokens, "
+          f"history budget {args.budget} tokens\n")
+    print(f"{'turn':>5s} {'full tokens':>12s} {'full KB':>9s} {'compact tokens':>15s} {'compact KB':>11s}")
+    checkpoints = sorted({1, 10, 25, 50, 75, 100, args.turns} & set(range(1, args.turns + 1)))
+    for turn in checkpoints:
+        f, c = full[turn - 1], compacted[turn - 1]
+        print(f"{turn:5d} {f[0]:12d} {f[1] / 1024:9.1f} {c[0]:15d} {c[1] / 1024:11.1f}")
+
+    second_half = [tokens for tokens, _, _ in compacted[args.turns // 2:]]
+    times = [elapsed * 1000 for _, _, elapsed in compacted]
+    print(f"\nfull history: {sum(t for t, _, _ in full)} tokens sent over {args.turns} turns")
+    print(f"compacted:    {sum(t for t, _, _ in compacted)} tokens sent, "
+          f"max {max(t for t, _, _ in compacted)} per turn "
+          f"(second half {min(second_half)}-{max(second_half)})")
+    print(f"compaction check: {statistics.mean(times):.3f} ms mean, {max(times):.3f} ms max per turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Retrieval latency and prompt size for a textbook-sized lesson, on a
+synthetic ~1 MB Bangla lesson built from the words of the real ones:
+
+    python bench_retrieval.py --mb 1 --queries 500 --top-k 4
+
+Each paragraph is about a made-up name that appears nowhere else; a query
+asks about one name, and a hit means its paragraph was among the top-k
+passages. Reports build, incremental rebuild and load (mmap) times, query
+latency percentiles, the hit rate, and the prompt a turn sends with the
+whole lesson in the system prompt versus with retrieval.
+"""
+import argparse
+import random
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from chat_history import count_tokens
+from Gemini import get_system_prompt
+from lesson_index import LessonIndex, format_passages, load_or_build, outline_context
+
+LESSONS_DIR = Path(__file__).parent / "lessons"
+SYLLABLES = ["কা", "রি", "মো", "তু", "লে", "সা", "নী", "প্র", "দ্য", "বো", "গা", "হি", "ষ্ট", "জু", "ফে"]
+
+
+def lesson_words():
+    words = []
+    for path in sorted(LESSONS_DIR.glob("*/content_bn.txt")):
+        words += re.findall(r"[\u0980-\u09FF]+", path.read_text(encoding='utf-8'))
+    return words
+
+
+def synthetic_lesson(target_bytes, rng):
+    """
+    Return (lesson text, [(name, paragraph number)]).
+    """
+    words = lesson_words()
+    paragraphs, names = [], []
+    size = 0
+    while size < target_bytes:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(4))
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            sentence = rng.sample(words, rng.randint(8, 16))
+            sentence.insert(rng.randrange(len(sentence)), name if rng.random() < 0.6 else rng.choice(words))
+            sentences.append(" ".join(sentence) + "।")
+        sentences[0] = f"{name} {sentences[0]}"
+        paragraph = " ".join(sentences)
+        names.append((name, len(paragraphs)))
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode('utf-8')) + 2
+    return "\n\n".join(paragraphs), names
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lesson retrieval latency and prompt size.")
+    parser.add_argument("--mb", type=float, default=1.0, help="size of the synthetic lesson")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    text, names = synthetic_lesson(int(args.mb * 1024 * 1024), rng)
+    folder = Path(tempfile.mkdtemp(prefix="lesson-index-"))
+    print(f"synthetic lesson: {len(text.encode('utf-8')) / 1024:.0f} KB, {len(text)} chars, {len(names)} paragraphs")
+
+    index, stats = load_or_build(folder, 'bn', text)
+    print(f"cold build: {stats['ms']:.0f} ms, {stats['passages']} passages, {stats['terms']} terms, "
+          f"{stats['bytes'] / 1024:.0f} KB index")
+
+    paragraphs = text.split("\n\n")
+    paragraphs[len(paragraphs) // 2] += " " + " ".join(rng.sample(lesson_words(), 12)) + "।"
+    edited = "\n\n".join(paragraphs)
+    index, stats = load_or_build(folder, 'bn', edited)
+    print(f"rebuild after editing one paragraph: {stats['ms']:.0f} ms ({stats['reused']} of {stats['passages']} passages reused)")
+
+    start = time.perf_counter()
+    index = LessonIndex(index.path)
+    print(f"load (mmap): {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    # Which passage holds each paragraph's name first
+    first_passage = {}
+    for passage_id in range(len(index)):
+        for name in re.findall(r"^[\u0980-\u09FF]+", index.passage(passage_id)):
+            first_passage.setdefault(name, passage_id)
+
+    latencies, hits = [], 0
+    grounding_tokens = []
+    for name, _ in rng.sample(names, min(args.queries, len(names))):
+        query = f"{name} সম্পর্কে আরও বলুন, এটা কেন গুরুত্বপূর্ণ?"
+        start = time.perf_counter()
+        results = index.search(query, args.top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += first_passage.get(name) in {passage_id for passage_id, _ in results}
+        grounding_tokens.append(count_tokens(format_passages(index, results, 'bn') or "") + count_tokens(query))
+    print(f"query latency over {len(latencies)} queries: p50 {statistics.median(latencies):.2f} ms, "
+          f"p95 {percentile(latencies, 95):.2f} ms, p99 {percentile(latencies, 99):.2f} ms")
+    print(f"hit rate (paragraph's passage in top {args.top_k}): {hits / len(latencies):.1%}")
+
+    full_prompt = get_system_prompt('lesson_delivery', 'bn-BD', 'synthetic', edited)
+    outline_prompt = get_system_prompt('lesson_delivery', 'bn-BD', 'synthetic', outline_context(index, 'bn'))
+    print(f"\nper-turn prompt, whole lesson: {count_tokens(full_prompt)} tokens "
+          f"({len(full_prompt.encode('utf-8')) / 1024:.0f} KB system prompt)")
+    print(f"per-turn prompt, retrieval:    {count_tokens(outline_prompt) + statistics.mean(grounding_tokens):.0f} tokens "
+          f"({count_tokens(outline_prompt)} system prompt + {statistics.mean(grounding_tokens):.0f} passages and message)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark of the speech sanitizer against the old regex strip_markdown.
+
+    python bench_sanitizer.py --repeat 20 --chunk 8
+
+"whole" cleans a complete answer once. "stream" cleans an answer that
+arrives in chunks: the regex version has to re-run over everything received
+so far to produce incremental output, while SpeechSanitizer only looks at
+each new chunk (and any span still open).
+"""
+import argparse
+import timeit
+
+from speech_text import SpeechSanitizer, sanitize_for_speech
+from test_speech_text import GOLDEN_CORPUS, legacy_strip_markdown
+
+SAMPLE_ANSWER = (
+    "## মুক্তিযুদ্ধের পটভূমি\n\n"
+    "**১৯৭১ সালের** মুক্তিযুদ্ধ বাংলাদেশের ইতিহাসে সবচেয়ে *গুরুত্বপূর্ণ* ঘটনা। "
+    "এই যুদ্ধ প্রায় ৯ মাস ধরে চলেছিল।\n\n"
+    "- **২৫ মার্চ:** অপারেশন সার্চলাইট শুরু হয়।\n"
+    "- **২৬ মার্চ:** স্বাধীনতার ঘোষণা দেওয়া হয়।\n"
+    "- **১৬ ডিসেম্বর:** বিজয় অর্জিত হয়।\n\n"
+    "1. প্রথমত, [বিস্তারিত](https://example.com) পড়ুন।\n"
+    "2. দ্বিতীয়ত, `মানচিত্র` দেখুন।\n\n"
+    "---\n\n"
+    "আপনার কি কোনো প্রশ্ন আছে?\n"
+)
+
+
+def stream_legacy(text, size):
+    emitted = ""
+    for end in range(size, len(text) + size, size):
+        emitted = legacy_strip_markdown(text[:end])
+    return emitted
+
+
+def stream_sanitizer(text, size):
+    sanitizer = SpeechSanitizer()
+    out = [sanitizer.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return "".join(out) + sanitizer.flush()
+
+
+def report(name, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:32s} {seconds * 1e6:10.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the speech sanitizer.")
+    parser.add_argument("--repeat", type=int, default=10, help="copies of the sample answer")
+    parser.add_argument("--chunk", type=int, default=8, help="characters per streamed chunk")
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    text = SAMPLE_ANSWER * args.repeat
+    assert sanitize_for_speech(text) == legacy_strip_markdown(text)
+    print(f"answer: {len(text)} chars, {text.count(chr(10))} lines")
+
+    corpus = "\n\n".join(GOLDEN_CORPUS)
+    report("corpus legacy", lambda: legacy_strip_markdown(corpus), args.number)
+    report("corpus sanitizer", lambda: sanitize_for_speech(corpus), args.number)
+    report("whole legacy", lambda: legacy_strip_markdown(text), args.number)
+    report("whole sanitizer", lambda: sanitize_for_speech(text), args.number)
+    report(f"stream legacy ({args.chunk}-char chunks)", lambda: stream_legacy(text, args.chunk), 1)
+    report(f"stream sanitizer ({args.chunk}-char chunks)", lambda: stream_sanitizer(text, args.chunk), 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Import-time benchmark: how long a fresh worker process takes to import the
+API modules, and which imports dominate.
+
+    python bench_startup.py                 # import app, 5 fresh interpreters
+    python bench_startup.py --module Gemini --runs 10 --top 15
+
+Each run is a new interpreter (like a uvicorn worker cold start), so nothing
+is shared between runs. No credentials are needed: backends are initialized
+lazily, on first request or by the startup warm-up.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+
+# Loaded on first use (or by the startup warm-up), never by importing the app
+DEFERRED_MODULES = ("vertexai", "google.cloud.aiplatform", "google.cloud.speech",
+                    "google.cloud.texttospeech", "google.api_core", "ultralytics", "torch", "PIL", "pyaudio")
+
+
+def import_seconds(module):
+    """
+    Wall time of `import module` in a fresh interpreter, plus the -X importtime report.
+    """
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(report):
+    """
+    (depth, cumulative microseconds, module) for every line of an -X importtime report.
+    """
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, int(cumulative_us), name.strip()))
+    return rows
+
+
+def slowest_imports(rows, module, top):
+    """
+    The module's direct imports with the largest cumulative time.
+    """
+    index = next((i for i, (_, _, name) in enumerate(rows) if name == module), None)
+    if index is None:
+        return []
+    # The report lists a module after everything it imported
+    depth = rows[index][0]
+    children = []
+    for child_depth, cumulative, name in reversed(rows[:index]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 1:
+            children.append((cumulative, name))
+    return sorted(children, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the API modules.")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    timings = []
+    report = ""
+    for _ in range(args.runs):
+        seconds, report = import_seconds(args.module)
+        timings.append(seconds)
+
+    print(f"import {args.module}: median {statistics.median(timings) * 1000:.0f} ms, "
+          f"min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms over {args.runs} runs")
+    rows = parse_importtime(report)
+    print("slowest direct imports (last run, cumulative):")
+    for cumulative_us, name in slowest_imports(rows, args.module, args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    imported = {name for _, _, name in rows}
+    heavy = [name for name in DEFERRED_MODULES if name in imported]
+    print("deferred backends imported at startup: " + (", ".join(heavy) if heavy else "none"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark of the audio front-end: how much audio and upload it trims before
+Speech-to-Text, and what the trimming costs.
+
+    python bench_vad.py                          # synthetic clips
+    python bench_vad.py recording1.wav clip.webm # your own recordings
+    python bench_vad.py --stt                    # also time Google STT, original vs trimmed (needs credentials)
+
+Synthetic clips mimic MediaRecorder uploads: speech with leading and
+trailing silence of different lengths, and clips with no speech at all.
+"""
+import argparse
+import math
+import random
+import statistics
+import time
+from pathlib import Path
+
+from audio_frontend import encode_wav, preprocess_audio
+
+RATE = 16000
+
+
+def synthetic_clips(seed=0):
+    """
+    (name, WAV bytes) pairs: (lead silence s, speech s, tail silence s) combinations.
+    """
+    rng = random.Random(seed)
+
+    def noise(seconds):
+        return [int(rng.gauss(0, 40)) for _ in range(int(seconds * RATE))]
+
+    def speech(seconds):
+        # Syllable-like bursts: a tone whose loudness rises and falls 4 times a second
+        return [int(5000 * abs(math.sin(math.pi * 4 * i / RATE)) * math.sin(2 * math.pi * 180 * i / RATE)) + int(rng.gauss(0, 40))
+                for i in range(int(seconds * RATE))]
+
+    clips = []
+    for lead, talk, tail in ((0.3, 2.0, 0.3), (1.5, 2.0, 1.5), (2.0, 3.0, 4.0), (0.5, 6.0, 3.0)):
+        clips.append((f"speech {lead}+{talk}+{tail}s", encode_wav(noise(lead) + speech(talk) + noise(tail), RATE)))
+    clips.append(("no speech 3s", encode_wav(noise(3.0), RATE)))
+    clips.append(("no speech 8s", encode_wav(noise(8.0), RATE)))
+    return clips
+
+
+def load_clips(paths):
+    return [(Path(path).name, Path(path).read_bytes()) for path in paths]
+
+
+def time_stt(audio, encoding, rate):
+    from GoogleSTT import runSTT_from_bytes
+
+    start = time.perf_counter()
+    runSTT_from_bytes(audio, rate=rate, encoding=encoding)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark silence trimming before STT.")
+    parser.add_argument("files", nargs="*", help="WAV or WebM recordings (default: synthetic clips)")
+    parser.add_argument("--repeat", type=int, default=5, help="front-end runs per clip")
+    parser.add_argument("--stt", action="store_true", help="time Google STT on original and trimmed clips")
+    args = parser.parse_args()
+
+    clips = load_clips(args.files) if args.files else synthetic_clips()
+    print(f"{'clip':24s} {'ms in':>7s} {'ms out':>7s} {'KB in':>7s} {'KB out':>7s} {'vad ms':>7s}"
+          + (f" {'stt in':>8s} {'stt out':>8s}" if args.stt else ""))
+
+    totals = {"ms_in": 0, "ms_out": 0, "bytes_in": 0, "bytes_out": 0, "stt_in": 0.0, "stt_out": 0.0}
+    for name, data in clips:
+        encoding = 'WEBM_OPUS' if name.endswith('.webm') else 'LINEAR16'
+        runs = []
+        for _ in range(args.repeat):
+            audio, out_encoding, rate, stats = preprocess_audio(data, encoding)
+            runs.append(stats["ms"])
+        sent_bytes = len(audio) if stats["has_speech"] else 0
+        line = (f"{name:24s} {stats['duration_ms'] or 0:7d} {stats['sent_ms'] or 0:7d} "
+                f"{len(data) / 1024:7.1f} {sent_bytes / 1024:7.1f} {statistics.median(runs):7.1f}")
+
+        totals["ms_in"] += stats["duration_ms"] or 0
+        totals["ms_out"] += stats["sent_ms"] or 0
+        totals["bytes_in"] += len(data)
+        totals["bytes_out"] += sent_bytes
+        if args.stt:
+            stt_in = time_stt(data, encoding, None)
+            stt_out = time_stt(audio, out_encoding, rate) if stats["has_speech"] else 0.0
+            totals["stt_in"] += stt_in
+            totals["stt_out"] += stt_out
+            line += f" {stt_in * 1000:8.0f} {stt_out * 1000:8.0f}"
+        print(line)
+
+    saved_ms = totals["ms_in"] - totals["ms_out"]
+    saved_bytes = totals["bytes_in"] - totals["bytes_out"]
+    print(f"\naudio sent to STT: {totals['ms_out'] / 1000:.1f}s of {totals['ms_in'] / 1000:.1f}s "
+          f"({saved_ms / max(totals['ms_in'], 1):.0%} saved), "
+          f"{totals['bytes_out'] / 1024:.0f} KB of {totals['bytes_in'] / 1024:.0f} KB "
+          f"({saved_bytes / max(totals['bytes_in'], 1):.0%} saved)")
+    if args.stt:
+        print(f"STT time: {totals['stt_out']:.2f}s trimmed vs {totals['stt_in']:.2f}s original")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Token-budgeted chat history.
+
+Gemini is sent the whole chat history on every turn, so without a bound each
+turn of a long session is slower and costlier than the last. compact_history
+keeps the newest turns verbatim and folds the older ones into a rolling
+summary at the start of the history, which keeps it under
+HISTORY_TOKEN_BUDGET tokens. Tokens are estimated locally (count_tokens),
+without a count_tokens call to the API.
+
+Histories here are in the serialize_history format: [{"role", "parts"}].
+"""
+
+import math
+import os
+import re
+
+# Most tokens of history sent with a turn (0 disables compaction)
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 3000))
+# A compaction brings the history down to this share of the budget, so it
+# happens once every few turns rather than on every turn
+HISTORY_COMPACT_TARGET = float(os.environ.get("HISTORY_COMPACT_TARGET", 0.6))
+# Most tokens of the rolling summary; its oldest lines are dropped past this
+HISTORY_SUMMARY_TOKENS = int(os.environ.get("HISTORY_SUMMARY_TOKENS", 600))
+
+SUMMARY_MARKER = "[Summary of the conversation so far]"
+SUMMARY_ACK = "OK, I will continue from there."
+
+# Tokens per message for the role and turn markers
+MESSAGE_OVERHEAD_TOKENS = 4
+# Longest excerpt of one message kept in the extractive summary
+SUMMARY_EXCERPT_CHARS = 160
+
+_PIECES = re.compile(r"[A-Za-z]+|[0-9]+|[\u0980-\u09FF]+|\S")
+_SENTENCE_END = re.compile(r"(?<=[.!?\u0964])\s")
+
+
+def count_tokens(text):
+    """
+    Estimate the Gemini token count of text.
+
+    Close to the SentencePiece tokenizer for the text this app sends and errs
+    on the high side: about 4 letters per token for English words, 3 per token
+    for Bangla words, one token per digit and per other character.
+    """
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        first = piece[0]
+        if first.isdigit() and first.isascii():
+            tokens += len(piece)
+        elif first.isascii() and first.isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        elif '\u0980' <= first <= '\u09FF':
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return tokens
+
+
+def message_tokens(message):
+    return MESSAGE_OVERHEAD_TOKENS + sum(count_tokens(part) for part in message["parts"])
+
+
+def history_tokens(history):
+    return sum(message_tokens(message) for message in history)
+
+
+def message_text(message):
+    return " ".join(message["parts"]).strip()
+
+
+def split_summary(history):
+    """
+    Split a history into its rolling summary text ("" if none) and its turns,
+    each a list of messages starting with a user message.
+    """
+    summary = ""
+    if len(history) >= 2 and history[0]["role"] == 'user' and message_text(history[0]).startswith(SUMMARY_MARKER):
+        summary = message_text(history[0])[len(SUMMARY_MARKER):].strip()
+        history = history[2:]
+
+    turns = []
+    for message in history:
+        if message["role"] == 'user' or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return summary, turns
+
+
+def excerpt(text):
+    """
+    First sentence of text, shortened to SUMMARY_EXCERPT_CHARS.
+    """
+    text = " ".join(text.split())
+    first = _SENTENCE_END.split(text, 1)[0]
+    if len(first) > SUMMARY_EXCERPT_CHARS:
+        first = first[:SUMMARY_EXCERPT_CHARS].rsplit(" ", 1)[0] + " …"
+    return first
+
+
+def trim_summary(summary, max_tokens=HISTORY_SUMMARY_TOKENS):
+    """
+    Drop the oldest lines of a summary until it fits max_tokens.
+    """
+    lines = summary.splitlines()
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def extractive_summary(previous, turns, max_tokens=HISTORY_SUMMARY_TOKENS):
+    """
+    Summarize turns locally: one line per turn with the first sentence of
+    the question and of the answer, appended to the previous summary.
+    """
+    lines = [previous] if previous else []
+    for turn in turns:
+        user = " ".join(message_text(m) for m in turn if m["role"] == 'user')
+        model = " ".join(message_text(m) for m in turn if m["role"] != 'user')
+        lines.append(f"- User: {excerpt(user)} / Assistant: {excerpt(model)}")
+    return trim_summary("\n".join(lines), max_tokens)
+
+
+def summary_messages(summary):
+    return [
+        {"role": 'user', "parts": [f"{SUMMARY_MARKER}\n{summary}"]},
+        {"role": 'model', "parts": [SUMMARY_ACK]},
+    ]
+
+
+def compact_history(history, budget=HISTORY_TOKEN_BUDGET, summarize=extractive_summary):
+    """
+    Fold the oldest turns of a history into its rolling summary if it is over budget.
+
+    Args:
+        history (list): Serialized history.
+        budget (int): Token budget for the whole history, summary included.
+        summarize (callable): summarize(previous_summary, turns, max_tokens) -> str.
+
+    Returns:
+        list: The compacted history, or None if it is within budget.
+    """
+    if budget <= 0 or history_tokens(history) <= budget:
+        return None
+
+    previous, turns = split_summary(history)
+    target = budget * HISTORY_COMPACT_TARGET - HISTORY_SUMMARY_TOKENS - 2 * MESSAGE_OVERHEAD_TOKENS
+    # Keep the newest turns that fit next to the summary, and always the last one
+    kept, kept_tokens = 1, history_tokens(turns[-1]) if turns else 0
+    while kept < len(turns):
+        tokens = history_tokens(turns[-kept - 1])
+        if kept_tokens + tokens > target:
+            break
+        kept += 1
+        kept_tokens += tokens
+    folded = turns[:-kept]
+    if not folded:
+        return None
+
+    summary = summarize(previous, folded, HISTORY_SUMMARY_TOKENS)
+    return summary_messages(trim_summary(summary)) + [message for turn in turns[-kept:] for message in turn]
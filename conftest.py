@@ -0,0 +1,31 @@
+"""
+Shared fixtures for the tests that run app.py on the fake backends.
+"""
+
+import pytest
+
+import app as api
+import GoogleTTS
+from fake_backends import FakeBackends
+from tts_cache import TTSCache
+
+
+@pytest.fixture
+def install_fakes(monkeypatch, tmp_path):
+    """
+    Return install(**options), which installs FakeBackends(**options) into
+    app.py for this test and returns them. Clients aren't warmed up and TTS
+    goes to an empty cache under tmp_path.
+    """
+    monkeypatch.setenv("WARM_UP_CLIENTS", "0")
+    cache = TTSCache(tmp_path / "tts_cache")
+    monkeypatch.setattr(api, "tts_cache", cache)
+    monkeypatch.setattr(GoogleTTS, "tts_cache", cache)
+
+    def install(**options):
+        for name in FakeBackends.INSTALLED:
+            # Registers the real function, so it is put back after the test
+            monkeypatch.setattr(api, name, getattr(api, name))
+        return FakeBackends(**options).install(api)
+
+    return install
@@ -0,0 +1,241 @@
+"""
+Local stand-ins for Google Speech-to-Text, Vertex AI (Gemini) and
+Text-to-Speech, so the service can be benchmarked without credentials or
+network access.
+
+The fakes sleep for a latency drawn from a configurable distribution and
+return payloads of realistic size. Run the API on them with:
+
+    python fake_backends.py --port 8001
+
+Latencies are given as 'fixed:MS', 'uniform:MIN_MS:MAX_MS',
+'normal:MEAN_MS:SD_MS' or 'lognormal:MEDIAN_MS:SIGMA', via flags or the
+FAKE_STT_LATENCY, FAKE_GEMINI_LATENCY, FAKE_TTS_LATENCY and
+FAKE_VISION_LATENCY environment variables.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import struct
+import threading
+import time
+from collections import Counter
+
+from GoogleTTS import synthesize_cached
+
+FAKE_TRANSCRIPT = "আমি বাংলাদেশের মুক্তিযুদ্ধ সম্পর্কে জানতে চাই।"
+FAKE_REPLY_SENTENCE = "**মুক্তিযুদ্ধ** ১৯৭১ সালে নয় মাস ধরে চলেছিল এবং *১৬ ডিসেম্বর* বিজয় অর্জিত হয়। "
+FAKE_DETECTIONS = [
+    {"label": "bus", "label_bn": "বাস", "confidence": 0.87, "box": [22.9, 231.3, 805.0, 756.8]},
+    {"label": "person", "label_bn": "মানুষ", "confidence": 0.85, "box": [48.6, 398.6, 245.3, 902.7]},
+]
+
+# Approximate size of one character of speech in each encoding (~15 chars/s)
+AUDIO_BYTES_PER_CHAR = {'LINEAR16': 3200, 'MP3': 200, 'OGG_OPUS': 150}
+
+
+class LatencyDistribution:
+    """
+    Samples a simulated upstream latency, in seconds.
+    """
+
+    KINDS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+    def __init__(self, kind='fixed', a=0.0, b=0.0, rng=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.a = a
+        self.b = b
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def parse(cls, spec, rng=None):
+        """
+        Parse 'kind:a[:b]' (milliseconds; for lognormal b is sigma). A bare number means fixed.
+        """
+        parts = str(spec).split(':')
+        if len(parts) == 1:
+            return cls('fixed', float(parts[0]), rng=rng)
+        kind = parts[0]
+        values = [float(v) for v in parts[1:]] + [0.0]
+        return cls(kind, values[0], values[1], rng=rng)
+
+    def sample(self):
+        if self.kind == 'fixed':
+            ms = self.a
+        elif self.kind == 'uniform':
+            ms = self.rng.uniform(self.a, self.b)
+        elif self.kind == 'normal':
+            ms = self.rng.gauss(self.a, self.b)
+        else:
+            ms = self.a * math.exp(self.rng.gauss(0.0, self.b))
+        return max(ms, 0.0) / 1000
+
+    def __repr__(self):
+        return f"{self.kind}:{self.a:g}:{self.b:g}"
+
+
+def fake_audio(size, audio_encoding):
+    """
+    Silent WAV (or filler bytes for compressed encodings) of about size bytes.
+    """
+    if audio_encoding != 'LINEAR16':
+        return bytes(size)
+    data_size = max(size - 44, 0)
+    header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16,
+                         1, 1, 24000, 48000, 2, 16, b'data', data_size)
+    return header + bytes(data_size)
+
+
+class FakeBackends:
+    """
+    Drop-in replacements for runSTT_from_bytes, runSTT_streaming, send_message(_stream), the
+    lesson opener calls, runTTS and the object detector. install(app_module) swaps them into app.py.
+    """
+
+    def __init__(self, stt_latency='lognormal:300:0.3', gemini_latency='lognormal:900:0.4',
+                 tts_latency='lognormal:400:0.3', vision_latency='lognormal:60:0.2',
+                 reply_chars=400, stream_chunk_chars=40, seed=None):
+        self.rng = random.Random(seed)
+        self.stt_latency = LatencyDistribution.parse(stt_latency, self.rng)
+        self.gemini_latency = LatencyDistribution.parse(gemini_latency, self.rng)
+        self.tts_latency = LatencyDistribution.parse(tts_latency, self.rng)
+        self.vision_latency = LatencyDistribution.parse(vision_latency, self.rng)
+        self.reply_chars = reply_chars
+        self.stream_chunk_chars = stream_chunk_chars
+
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        defaults = cls()
+        return cls(
+            stt_latency=os.environ.get("FAKE_STT_LATENCY", defaults.stt_latency),
+            gemini_latency=os.environ.get("FAKE_GEMINI_LATENCY", defaults.gemini_latency),
+            tts_latency=os.environ.get("FAKE_TTS_LATENCY", defaults.tts_latency),
+            vision_latency=os.environ.get("FAKE_VISION_LATENCY", defaults.vision_latency),
+            reply_chars=int(os.environ.get("FAKE_REPLY_CHARS", defaults.reply_chars)),
+            stream_chunk_chars=int(os.environ.get("FAKE_STREAM_CHUNK_CHARS", defaults.stream_chunk_chars)),
+            seed=os.environ.get("FAKE_SEED"),
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def reply_text(self):
+        repeats = max(1, math.ceil(self.reply_chars / len(FAKE_REPLY_SENTENCE)))
+        return (FAKE_REPLY_SENTENCE * repeats)[:self.reply_chars].rstrip()
+
+    def runSTT_from_bytes(self, audio_bytes, rate=None, encoding=None, language_code='bn-BD'):
+        self._count('stt')
+        time.sleep(self.stt_latency.sample())
+        return FAKE_TRANSCRIPT if audio_bytes else None
+
+    def runSTT_streaming(self, audio_chunks, language_code='bn-BD', encoding=None, rate=None, on_interim=None,
+                         on_endpoint=None):
+        self._count('stt')
+        received = 0
+        for chunk in audio_chunks:
+            received += len(chunk)
+            if on_interim:
+                on_interim(FAKE_TRANSCRIPT[:received])
+        time.sleep(self.stt_latency.sample())
+        return FAKE_TRANSCRIPT if received else ""
+
+    def send_message(self, user_msg, mode='chat', language_code='bn-BD', **kwargs):
+        self._count('gemini')
+        time.sleep(self.gemini_latency.sample())
+        return self.reply_text()
+
+    def send_message_stream(self, user_msg, mode='chat', language_code='bn-BD', **kwargs):
+        self._count('gemini')
+        # The sampled latency is spread over the chunks, with the first one taking the longest
+        total = self.gemini_latency.sample()
+        text = self.reply_text()
+        chunks = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)]
+        time.sleep(total / 2)
+        for chunk in chunks:
+            yield chunk
+            time.sleep(total / 2 / len(chunks))
+
+    def generate_opener(self, initial_message, mode='lesson_delivery', language_code='bn-BD', **kwargs):
+        self._count('gemini')
+        time.sleep(self.gemini_latency.sample())
+        text = self.reply_text()
+        history = [{"role": "user", "parts": [initial_message]}, {"role": "model", "parts": [text]}]
+        return text, history
+
+    def seed_chat_session(self, history, mode='lesson_delivery', language_code='bn-BD', **kwargs):
+        self._count('seed')
+
+    def synthesize(self, text, language_code, voice_name, audio_encoding):
+        self._count('tts')
+        time.sleep(self.tts_latency.sample())
+        return fake_audio(len(text) * AUDIO_BYTES_PER_CHAR.get(audio_encoding, 3200), audio_encoding)
+
+    def runTTS(self, text, output_file=None, language_code='bn-BD', return_bytes=False, voice_name=None,
+               use_cache=True, audio_encoding='LINEAR16'):
+        # Same cache as GoogleTTS.runTTS, so /audio/<id> links resolve
+        audio_content = synthesize_cached(text, language_code, voice_name, audio_encoding, use_cache,
+                                          synthesize=self.synthesize)
+
+        if return_bytes:
+            return audio_content
+        output_file = output_file or "output.wav"
+        with open(output_file, 'wb') as out:
+            out.write(audio_content)
+        return output_file
+
+    async def detect_objects(self, image_bytes):
+        self._count('vision')
+        await asyncio.sleep(self.vision_latency.sample())
+        return [dict(d) for d in FAKE_DETECTIONS]
+
+    # The app module's names that install() replaces
+    INSTALLED = ("runSTT_from_bytes", "runSTT_streaming", "send_message", "send_message_stream", "generate_opener",
+                 "seed_chat_session", "runTTS", "detect_objects")
+
+    def install(self, api):
+        """
+        Point the app module's upstream calls at these fakes.
+        """
+        for name in self.INSTALLED:
+            setattr(api, name, getattr(self, name))
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API on fake Google backends.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--stt-latency")
+    parser.add_argument("--gemini-latency")
+    parser.add_argument("--tts-latency")
+    parser.add_argument("--vision-latency")
+    parser.add_argument("--reply-chars", type=int)
+    args = parser.parse_args()
+
+    for name in ("stt_latency", "gemini_latency", "tts_latency", "vision_latency", "reply_chars"):
+        value = getattr(args, name)
+        if value is not None:
+            os.environ[f"FAKE_{name.upper()}"] = str(value)
+    # Nothing to warm up: no Google clients are ever built
+    os.environ["WARM_UP_CLIENTS"] = "0"
+
+    import uvicorn
+    import app as api
+
+    fakes = FakeBackends.from_env().install(api)
+    print(f"Fake backends: stt {fakes.stt_latency}, gemini {fakes.gemini_latency}, "
+          f"tts {fakes.tts_latency}, vision {fakes.vision_latency}, reply {fakes.reply_chars} chars")
+    uvicorn.run(api.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import { useState, useRef, useEffect } from 'react'
 import './ChatPage.css'
+import { getSessionId } from '../session'
 
 const API_BASE_URL = import.meta.env.DEV ? '/api' : 'http://localhost:8000'
 
@@ -86,9 +87,12 @@ function ChatPage() {
       const audioFile = new File([audioBlob], 'audio.webm', { type: 'audio/webm' })
       formData.append('audio', audioFile)
       formData.append('language_code', getLanguageCode())
+      formData.append('audio_format', 'mp3')
+      formData.append('audio_delivery', 'url')
 
       const response = await fetch(`${API_BASE_URL}/chat/audio`, {
         method: 'POST',
+        headers: { 'X-Session-Id': getSessionId() },
         body: formData,
       })
 
@@ -98,21 +102,14 @@ function ChatPage() {
       }
 
       const data = await response.json()
-      const { user_text, assistant_text, audio_base64 } = data
+      const { user_text, assistant_text, audio_url } = data
 
-      const audioBytes = Uint8Array.from(atob(audio_base64), c => c.charCodeAt(0))
-      const responseAudioBlob = new Blob([audioBytes], { type: 'audio/wav' })
-      const audioUrl = URL.createObjectURL(responseAudioBlob)
-
-      const audio = new Audio(audioUrl)
+      // Compressed reply audio is fetched as binary instead of inlined as base64
+      const audio = new Audio(`${API_BASE_URL}${audio_url}`)
       audio.play().catch(err => {
         console.error('Error playing audio:', err)
       })
 
-      audio.onended = () => {
-        URL.revokeObjectURL(audioUrl)
-      }
-
       responseAudioRef.current = audio
 
       setMessages(prev => [
@@ -138,6 +135,7 @@ function ChatPage() {
     try {
       const response = await fetch(`${API_BASE_URL}/chat/text?text=${encodeURIComponent(text)}`, {
         method: 'POST',
+        headers: { 'X-Session-Id': getSessionId() },
       })
 
       if (!response.ok) {
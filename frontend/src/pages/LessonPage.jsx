@@ -1,6 +1,7 @@
 import { useState, useRef, useEffect } from 'react'
 import { useParams } from 'react-router-dom'
 import './LessonPage.css'
+import { getSessionId } from '../session'
 
 const API_BASE_URL = import.meta.env.DEV ? '/api' : 'http://localhost:8000'
 
@@ -90,15 +91,11 @@ function LessonPage({ topic, language, setLanguage }) {
     setIsPaused(true) 
   }
 
-  const playResponseAudio = (audio_base64) => {
+  const playResponseAudio = (audio_url) => {
     if (responseAudioRef.current) responseAudioRef.current.pause()
     cancelAnimationFrame(scrollAnimationRef.current)
 
-    const audioBytes = Uint8Array.from(atob(audio_base64), c => c.charCodeAt(0))
-    const responseAudioBlob = new Blob([audioBytes], { type: 'audio/wav' })
-    const audioUrl = URL.createObjectURL(responseAudioBlob)
-
-    const audio = new Audio(audioUrl)
+    const audio = new Audio(`${API_BASE_URL}${audio_url}`)
     
     audio.onplay = () => {
       setIsPlaying(true)
@@ -116,7 +113,6 @@ function LessonPage({ topic, language, setLanguage }) {
       setIsPlaying(false)
       setIsPaused(false) 
       cancelAnimationFrame(scrollAnimationRef.current)
-      URL.revokeObjectURL(audioUrl)
     }
 
     audio.play().catch(err => {
@@ -145,8 +141,8 @@ function LessonPage({ topic, language, setLanguage }) {
     try {
       const response = await fetch(`${API_BASE_URL}/lesson/start`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ topic: topic, language_code: getLanguageCode() }),
+        headers: { 'Content-Type': 'application/json', 'X-Session-Id': getSessionId() },
+        body: JSON.stringify({ topic: topic, language_code: getLanguageCode(), audio_format: 'mp3', audio_delivery: 'url' }),
       })
       if (!response.ok) throw new Error('Failed to start lesson')
       
@@ -166,11 +162,13 @@ function LessonPage({ topic, language, setLanguage }) {
     try {
       const response = await fetch(`${API_BASE_URL}/lesson/text`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Session-Id': getSessionId() },
         body: JSON.stringify({
           text: text,
           topic: topic,
-          language_code: getLanguageCode()
+          language_code: getLanguageCode(),
+          audio_format: 'mp3',
+          audio_delivery: 'url'
         })
       })
       if (!response.ok) throw new Error('Failed to send message')
@@ -191,9 +189,12 @@ function LessonPage({ topic, language, setLanguage }) {
       formData.append('audio', new File([audioBlob], 'audio.webm', { type: 'audio/webm' }))
       formData.append('topic', topic)
       formData.append('language_code', getLanguageCode())
+      formData.append('audio_format', 'mp3')
+      formData.append('audio_delivery', 'url')
 
       const response = await fetch(`${API_BASE_URL}/lesson/audio`, {
         method: 'POST',
+        headers: { 'X-Session-Id': getSessionId() },
         body: formData,
       })
       if (!response.ok) throw new Error('Failed to process audio')
@@ -212,8 +213,8 @@ function LessonPage({ topic, language, setLanguage }) {
       setCurrentLessonText(text)
       if (textContainerRef.current) textContainerRef.current.scrollTop = 0
     }
-    if (data.audio_base64) {
-      playResponseAudio(data.audio_base64)
+    if (data.audio_url) {
+      playResponseAudio(data.audio_url)
     }
   }
 
@@ -1,5 +1,6 @@
 import { useState, useRef, useEffect } from 'react'
 import './ObjectsPage.css'
+import { getSessionId } from '../session'
 
 const API_BASE_URL = import.meta.env.DEV ? '/api' : 'http://localhost:8000'
 
@@ -172,9 +173,12 @@ function ObjectsPage() {
       formData.append('audio', audioFile)
       formData.append('image', imageFile)
       formData.append('language_code', getLanguageCode())
+      formData.append('audio_format', 'mp3')
+      formData.append('audio_delivery', 'url')
 
       const response = await fetch(`${API_BASE_URL}/objects/detect`, {
         method: 'POST',
+        headers: { 'X-Session-Id': getSessionId() },
         body: formData,
       })
 
@@ -184,21 +188,13 @@ function ObjectsPage() {
       }
 
       const data = await response.json()
-      const { audio_base64 } = data
+      const { audio_url } = data
 
-      const audioBytes = Uint8Array.from(atob(audio_base64), c => c.charCodeAt(0))
-      const responseAudioBlob = new Blob([audioBytes], { type: 'audio/wav' })
-      const audioUrl = URL.createObjectURL(responseAudioBlob)
-
-      const audio = new Audio(audioUrl)
+      const audio = new Audio(`${API_BASE_URL}${audio_url}`)
       audio.play().catch(err => {
         console.error('Error playing audio:', err)
       })
 
-      audio.onended = () => {
-        URL.revokeObjectURL(audioUrl)
-      }
-
       responseAudioRef.current = audio
 
     } catch (err) {
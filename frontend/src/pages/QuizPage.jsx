@@ -23,11 +23,8 @@ function QuizPage({ language }) {
 
   useEffect(() => {
     setLoading(true)
-    fetch(`${API_BASE_URL}/lesson/quiz`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ topic: topicId })
-    })
+    // GET so the browser can revalidate with ETag and get a 304
+    fetch(`${API_BASE_URL}/lesson/${topicId}/quiz`)
     .then(res => {
       if (!res.ok) throw new Error("Quiz not found")
       return res.json()
@@ -55,7 +52,7 @@ function QuizPage({ language }) {
     }
   }, [])
 
-  const playAudio = async (text) => {
+  const playAudio = async (text, assetUrl = null) => {
     if (!text) return;
 
     const currentRequestId = ++audioRequestId.current;
@@ -65,20 +62,26 @@ function QuizPage({ language }) {
         audioRef.current.currentTime = 0;
     }
 
+    // Pre-rendered quiz audio is served as a static file, no TTS round trip
+    if (assetUrl) {
+        const audio = new Audio(`${API_BASE_URL}${assetUrl}`);
+        audioRef.current = audio;
+        audio.play().catch(e => console.error("Audio play failed", e));
+        return;
+    }
+
     try {
         const langCode = language === 'bn' ? 'bn-BD' : 'en-US';
         const response = await fetch(`${API_BASE_URL}/tts`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ text, language_code: langCode })
+            body: JSON.stringify({ text, language_code: langCode, audio_format: 'mp3', audio_delivery: 'binary' })
         });
 
         if (!response.ok) throw new Error('TTS failed');
         if (currentRequestId !== audioRequestId.current) return;
 
-        const data = await response.json();
-        const audioBytes = Uint8Array.from(atob(data.audio_base64), c => c.charCodeAt(0));
-        const audioBlob = new Blob([audioBytes], { type: 'audio/wav' });
+        const audioBlob = await response.blob();
         const audioUrl = URL.createObjectURL(audioBlob);
 
         if (currentRequestId !== audioRequestId.current) return;
@@ -147,7 +150,8 @@ function QuizPage({ language }) {
         } else {
             const q = questions[currentQ];
             const textToRead = language === 'bn' ? q.question_bn : q.question_en;
-            timeoutId = setTimeout(() => playAudio(textToRead), 500);
+            const assetUrl = q.audio?.[`question_${language}`];
+            timeoutId = setTimeout(() => playAudio(textToRead, assetUrl), 500);
         }
     };
 
@@ -0,0 +1,9 @@
+// One id per browser tab, sent as X-Session-Id so each learner gets their own chat history
+export function getSessionId() {
+  let sessionId = sessionStorage.getItem('session_id')
+  if (!sessionId) {
+    sessionId = crypto.randomUUID()
+    sessionStorage.setItem('session_id', sessionId)
+  }
+  return sessionId
+}
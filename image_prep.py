@@ -0,0 +1,133 @@
+import io
+import os
+import threading
+import time
+
+# Leading bytes of the formats camera uploads come in, and their MIME types
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+MAX_IMAGE_SIDE = int(os.environ.get("MAX_IMAGE_SIDE", 1024))
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", 85))
+
+
+def sniff_image_type(data):
+    """
+    Return the MIME type of an image from its leading bytes, or None if unrecognized.
+    """
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:8] == b'ftyp' and data[8:12] in (b'heic', b'heix', b'mif1', b'msf1'):
+        return 'image/heic'
+    return None
+
+
+def normalize_image(data, max_side=MAX_IMAGE_SIDE, quality=IMAGE_QUALITY):
+    """
+    Prepare an uploaded image for the vision models: apply the EXIF orientation,
+    downscale so the longest side is at most max_side and re-encode as JPEG.
+
+    The original bytes are kept when they are already an upright JPEG within
+    max_side that re-encoding would not shrink, and passed through unchanged
+    (with their own MIME type) when they are in a known format that Pillow
+    can't decode here, e.g. HEIC without a HEIF plugin.
+
+    Returns:
+        tuple: (image bytes, MIME type, stats dict)
+
+    Raises:
+        ValueError: If the data is not an image in a known format.
+    """
+    from PIL import Image, ImageOps
+
+    start = time.perf_counter()
+    source_type = sniff_image_type(data)
+    if source_type is None:
+        raise ValueError("Unsupported image format")
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        orientation = image.getexif().get(0x0112, 1)
+        image = ImageOps.exif_transpose(image)
+    except Exception as e:
+        print(f"Could not decode {source_type} image, sending it as is: {e}")
+        stats = {
+            "source_type": source_type,
+            "original_bytes": len(data),
+            "bytes": len(data),
+            "width": None,
+            "height": None,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        return data, source_type, stats
+
+    resized = max(image.size) > max_side
+    if resized:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # JPEG has no alpha channel: flatten onto white
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=quality, optimize=True)
+    output = out.getvalue()
+
+    if source_type == 'image/jpeg' and not resized and orientation == 1 and len(output) >= len(data):
+        output = data
+
+    stats = {
+        "source_type": source_type,
+        "original_bytes": len(data),
+        "bytes": len(output),
+        "width": image.size[0],
+        "height": image.size[1],
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    return output, 'image/jpeg', stats
+
+
+class ImageStats:
+    """
+    Running totals of image normalization, for /images/stats.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.original_bytes = 0
+        self.bytes = 0
+        self.total_ms = 0.0
+
+    def record(self, stats):
+        with self._lock:
+            self.images += 1
+            self.original_bytes += stats["original_bytes"]
+            self.bytes += stats["bytes"]
+            self.total_ms += stats["ms"]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "images": self.images,
+                "original_bytes": self.original_bytes,
+                "bytes": self.bytes,
+                "bytes_saved": self.original_bytes - self.bytes,
+                "avg_ms": round(self.total_ms / self.images, 1) if self.images else 0.0,
+            }
+
+
+image_stats = ImageStats()
@@ -0,0 +1,220 @@
+"""
+Offline pre-rendering of the static lesson and quiz audio.
+
+Every string in lessons/<id>/metadata.json (titles) and lessons/<id>/quiz.json
+(questions, options, correct answers) is synthesized once, in both languages,
+and written to lessons/<id>/audio/<hash>.<format> together with a
+manifest.json. The API then hands out references to these files instead of
+calling TTS. Strings are cleaned and normalized exactly like live replies
+before synthesis, so a quiz option sounds the same either way.
+
+Assets are content-addressed, so re-running the build only synthesizes strings
+that changed and removes files nobody references any more. They are WAV by
+default; --audio-format mp3 or ogg renders much smaller files:
+
+    python lesson_audio.py [--workers 8] [--force] [--audio-format wav]
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import argparse
+import json
+import re
+import time
+
+from GoogleTTS import AUDIO_FORMATS
+from speech_text import sanitize_for_speech, speakable
+from tts_cache import make_key
+
+LESSONS_DIR = Path(__file__).parent / "lessons"
+AUDIO_DIR_NAME = "audio"
+MANIFEST_NAME = "manifest.json"
+
+LANGUAGE_CODES = {'en': 'en-US', 'bn': 'bn-BD'}
+ASSET_NAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.(wav|mp3|ogg)$')
+
+
+def collect_strings(lesson_folder):
+    """
+    Return {(lang_key, text)} for every static string of a lesson.
+    """
+    strings = set()
+
+    meta_path = lesson_folder / "metadata.json"
+    if meta_path.exists():
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        for lang_key in LANGUAGE_CODES:
+            title = meta.get(f"title_{lang_key}")
+            if title:
+                strings.add((lang_key, title))
+
+    quiz_path = lesson_folder / "quiz.json"
+    if quiz_path.exists():
+        with open(quiz_path, 'r', encoding='utf-8') as f:
+            quiz = json.load(f)
+        for question in quiz:
+            for lang_key in LANGUAGE_CODES:
+                for field in (f"question_{lang_key}", f"correct_answer_{lang_key}"):
+                    if question.get(field):
+                        strings.add((lang_key, question[field]))
+                for option in question.get(f"options_{lang_key}", []):
+                    if option:
+                        strings.add((lang_key, option))
+
+    return strings
+
+
+def speech_text(text, lang_key):
+    """
+    The text sent to TTS for a lesson string, cleaned the same way as a live reply.
+    """
+    return speakable(sanitize_for_speech(text), LANGUAGE_CODES[lang_key])
+
+
+def asset_name(text, lang_key, audio_format='wav'):
+    language_code = LANGUAGE_CODES[lang_key]
+    key = make_key(speech_text(text, lang_key), language_code, None, AUDIO_FORMATS[audio_format])
+    return f"{key}.{audio_format}"
+
+
+def load_manifest(lesson_folder):
+    """
+    Load lessons/<id>/audio/manifest.json, or an empty manifest if not built.
+
+    The manifest maps "<lang_key>:<text>" to the asset file name.
+    """
+    manifest_path = lesson_folder / AUDIO_DIR_NAME / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get("assets", {})
+
+
+def asset_url(topic, name):
+    return f"/lesson/{topic}/audio/{name}"
+
+
+def attach_quiz_audio(quiz_data, topic, manifest):
+    """
+    Add an "audio" dict of asset URLs to each quiz question, mirroring its text
+    fields (question_*, options_*, correct_answer_*). Strings without a
+    pre-rendered asset get None so the client can fall back to /tts.
+    """
+    def lookup(lang_key, text):
+        name = manifest.get(f"{lang_key}:{text}")
+        return asset_url(topic, name) if name else None
+
+    for question in quiz_data:
+        audio = {}
+        for lang_key in LANGUAGE_CODES:
+            for field in (f"question_{lang_key}", f"correct_answer_{lang_key}"):
+                if field in question:
+                    audio[field] = lookup(lang_key, question[field])
+            options_field = f"options_{lang_key}"
+            if options_field in question:
+                audio[options_field] = [lookup(lang_key, option) for option in question[options_field]]
+        question["audio"] = audio
+    return quiz_data
+
+
+def build_lesson(lesson_folder, executor, force=False, audio_format='wav'):
+    """
+    Synthesize the missing assets of one lesson and rewrite its manifest.
+
+    A string whose synthesis fails is reported and left out of the manifest
+    (the client falls back to /tts for it); the other assets are still
+    written and stale files still removed.
+
+    Returns:
+        tuple: (synthesized, reused, removed, failed) counts.
+    """
+    from GoogleTTS import runTTS
+
+    audio_dir = lesson_folder / AUDIO_DIR_NAME
+    audio_dir.mkdir(exist_ok=True)
+
+    wanted = {}
+    for lang_key, text in collect_strings(lesson_folder):
+        wanted[f"{lang_key}:{text}"] = (lang_key, text, asset_name(text, lang_key, audio_format))
+
+    # Strings that read the same once cleaned (e.g. "50%" and "৫০%") share an asset
+    assets = {name: (lang_key, text) for lang_key, text, name in wanted.values()}
+    futures = {}
+    reused = 0
+    for name, (lang_key, text) in assets.items():
+        path = audio_dir / name
+        if path.exists() and not force:
+            reused += 1
+            continue
+        # The build keeps its own files, so the clips don't also go to the TTS cache
+        future = executor.submit(runTTS, speech_text(text, lang_key), return_bytes=True,
+                                 language_code=LANGUAGE_CODES[lang_key], use_cache=False,
+                                 audio_encoding=AUDIO_FORMATS[audio_format])
+        futures[future] = (lang_key, text, path)
+
+    failed = 0
+    missing = set()
+    for future in as_completed(futures):
+        lang_key, text, path = futures[future]
+        try:
+            audio_content = future.result()
+        except Exception as e:
+            print(f"{lesson_folder.name}: synthesis failed for {lang_key}:{text!r}: {e}")
+            failed += 1
+            if not path.exists():  # a forced rebuild keeps the previous file
+                missing.add(path.name)
+            continue
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(audio_content)
+        tmp_path.replace(path)
+
+    # Drop assets of strings that were edited or deleted
+    referenced = set(assets) - missing
+    removed = 0
+    for path in audio_dir.iterdir():
+        if ASSET_NAME_PATTERN.match(path.name) and path.name not in referenced:
+            path.unlink()
+            removed += 1
+
+    manifest = {
+        "assets": {key: name for key, (_, _, name) in sorted(wanted.items()) if name not in missing},
+    }
+    with open(audio_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return len(futures) - failed, reused, removed, failed
+
+
+def build_all(lessons_dir=LESSONS_DIR, workers=8, force=False, audio_format='wav'):
+    """
+    Pre-render audio for every lesson under lessons_dir.
+    """
+    start = time.perf_counter()
+    totals = [0, 0, 0, 0]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for folder in sorted(Path(lessons_dir).iterdir()):
+            if not folder.is_dir():
+                continue
+            counts = build_lesson(folder, executor, force=force, audio_format=audio_format)
+            totals = [total + count for total, count in zip(totals, counts)]
+            synthesized, reused, removed, failed = counts
+            print(f"{folder.name}: {synthesized} synthesized, {reused} up to date, {removed} removed, {failed} failed")
+
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.1f}s: {totals[0]} synthesized, {totals[1]} up to date, {totals[2]} removed, "
+          f"{totals[3]} failed")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render lesson and quiz audio")
+    parser.add_argument("--lessons-dir", default=str(LESSONS_DIR))
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent TTS requests")
+    parser.add_argument("--force", action="store_true", help="Re-synthesize every string")
+    parser.add_argument("--audio-format", default='wav', choices=list(AUDIO_FORMATS))
+    args = parser.parse_args()
+
+    totals = build_all(args.lessons_dir, workers=args.workers, force=args.force, audio_format=args.audio_format)
+    if totals[3]:
+        raise SystemExit(f"{totals[3]} strings failed to synthesize; run the build again to retry them")
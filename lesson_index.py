@@ -0,0 +1,478 @@
+"""
+Local BM25 retrieval over lesson content.
+
+A textbook-sized lesson doesn't fit in the system prompt. Its text is split
+into passages and indexed with BM25. The system prompt then holds only the
+beginning of the lesson, and each turn sends just the LESSON_TOP_K passages
+that best match the learner's message. Lessons shorter than
+LESSON_RETRIEVAL_MIN_CHARS are still sent whole.
+
+The index of lessons/<id>/content_<lang>.txt is written to
+lessons/<id>/index/bm25_<lang>.idx and memory-mapped when loaded. When the text
+changes, only the passages that changed are tokenized again; the others
+reuse their term counts from the previous index file. To build every
+lesson's index ahead of the first request:
+
+    python lesson_index.py [--force] [--all]
+"""
+
+from collections import Counter
+from pathlib import Path
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+import unicodedata
+from array import array
+
+LESSONS_DIR = Path(__file__).parent / "lessons"
+INDEX_DIR_NAME = "index"
+
+# Lessons at least this long are retrieved from instead of sent whole
+LESSON_RETRIEVAL_MIN_CHARS = int(os.environ.get("LESSON_RETRIEVAL_MIN_CHARS", 8000))
+# Passages sent with each lesson turn
+LESSON_TOP_K = int(os.environ.get("LESSON_TOP_K", 4))
+# Characters of the lesson's beginning kept in the system prompt
+LESSON_OUTLINE_CHARS = int(os.environ.get("LESSON_OUTLINE_CHARS", 1500))
+# Target passage length; paragraphs longer than this are split at sentence ends
+PASSAGE_CHARS = int(os.environ.get("LESSON_PASSAGE_CHARS", 700))
+# Paragraphs shorter than this (e.g. headings) are joined to the next one
+MIN_PASSAGE_CHARS = 80
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MAGIC = b"BM25"
+FORMAT_VERSION = 1
+# Bumped whenever tokenize() changes, so indexes built with the old terms are rebuilt
+TOKENIZER_VERSION = 2
+
+# Bangla digits are indexed as ASCII digits, so "১৯৭১" matches "1971"
+_NORMALIZE = str.maketrans({**{ord(d): str(i) for i, d in enumerate("০১২৩৪৫৬৭৮৯")},
+                            0x200C: None, 0x200D: None})
+# Bangla words include their vowel signs, virama and nukta (which \w would split on)
+_TOKEN = re.compile(r"[\u0980-\u09E5\u09F0-\u09FF]+|[a-z0-9]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?\u0964\u0965])\s+")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+# Inflections stripped from Bangla words (longest first), if the stem keeps at least
+# BANGLA_MIN_STEM characters (letters and vowel signs). Shorter stems would merge
+# different words: মাটি (soil) with মা (mother), আমরা (we) with আম (mango).
+BANGLA_MIN_STEM = 3
+BANGLA_SUFFIXES = sorted(
+    (unicodedata.normalize('NFC', suffix) for suffix in (
+        "গুলোকে", "গুলোর", "গুলো", "গুলি", "দেরকে", "দের", "েরকে", "েরা", "ের", "রা",
+        "কে", "তে", "টিকে", "টির", "টি", "টার", "টা", "য়ে", "য়", "র", "ে",
+    )),
+    key=len, reverse=True,
+)
+
+# Function words that would otherwise match passages by chance in short lessons
+STOPWORDS = frozenset(unicodedata.normalize('NFC', word) for word in (
+    "a an and are as at be but by can did do does for from had has have how i if in is it its me my "
+    "no not of on or so that the their them there they this to was we what when where which who why "
+    "will with would you your "
+    "আমি আমার আমাকে আপনি আপনার তুমি তোমার সে তার তিনি তাঁর এটা এটি ওটা এই ওই সেই কি কী কেন কেমন কোন "
+    "কোথায় কখন কীভাবে কিভাবে এবং ও আর বা কিন্তু যে যা হয় হয়ে হলো হল ছিল করে করা করতে না নয় একটু দিন বলুন বলো"
+).split())
+
+
+def stem(token):
+    if token[0] <= 'z':
+        # English plurals
+        if len(token) > 4 and token.endswith('ies'):
+            return token[:-3] + 'y'
+        if len(token) > 4 and token.endswith('s') and not token.endswith('ss'):
+            return token[:-1]
+        return token
+    for suffix in BANGLA_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= BANGLA_MIN_STEM:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """
+    Index terms of a text: NFC-normalized, lowercased Bangla and English words
+    (without stopwords) with common inflections stripped, and numbers.
+    """
+    text = unicodedata.normalize('NFC', text).lower().translate(_NORMALIZE)
+    return [stem(token) for token in _TOKEN.findall(text) if token not in STOPWORDS]
+
+
+def split_passages(text, target_chars=PASSAGE_CHARS):
+    """
+    Split lesson text into passages of about target_chars. Passages never
+    span paragraphs (apart from short ones joined to the next), so editing
+    one paragraph leaves the other passages as they were.
+    """
+    passages = []
+    carry = ""
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if carry:
+            paragraph = f"{carry}\n{paragraph}"
+            carry = ""
+        if len(paragraph) < MIN_PASSAGE_CHARS:
+            carry = paragraph
+            continue
+        current = ""
+        for sentence in _SENTENCE_END.split(paragraph):
+            if current and len(current) + len(sentence) + 1 > target_chars:
+                passages.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        passages.append(current)
+    if carry:
+        passages.append(carry)
+    return passages
+
+
+def source_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def index_path(lesson_folder, lang_key):
+    return Path(lesson_folder) / INDEX_DIR_NAME / f"bm25_{lang_key}.idx"
+
+
+def _write_array(f, typecode, values):
+    data = array(typecode, values)
+    f.write(data.tobytes())
+    f.write(b"\0" * (-f.tell() % 4))
+
+
+class LessonIndex:
+    """
+    A BM25 index file, memory-mapped: only the header is parsed when it is
+    loaded, and searching reads the term table, postings and passages
+    straight from the mapping.
+
+    close() (or a with block) unmaps the file. Indexes that are dropped
+    without it are unmapped when garbage collected.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        try:
+            self._load(path)
+        except Exception:
+            self.close()
+            raise
+
+    def _load(self, path):
+        magic, version, meta_length = struct.unpack_from("<4sII", self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Not a lesson index: {path}")
+        self.meta = json.loads(self._mmap[12:12 + meta_length].decode('utf-8'))
+        if self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Lesson index written on a different platform: {path}")
+
+        view = memoryview(self._mmap)
+        self._views.append(view)
+        sections = self.meta["sections"]
+
+        def section(name, typecode=None):
+            start, end = sections[name]
+            self._views.append(view[start:end])
+            if typecode:
+                self._views.append(self._views[-1].cast(typecode))
+            return self._views[-1]
+
+        self.passage_count = self.meta["passages"]
+        self.term_count = self.meta["terms"]
+        self._terms = section("terms", 'I')          # per term: string offset, length, postings start, df
+        self._strings = section("strings")
+        self._postings = section("postings", 'I')    # per posting: passage, tf
+        self._forward = section("forward", 'I')      # per passage and term: term id, tf
+        self._forward_start = section("forward_start", 'I')
+        self._norms = section("norms", 'f')          # BM25 length normalization per passage
+        self._text_start = section("text_start", 'I')
+        self._text = section("text")
+        self._hashes = section("hashes")
+
+    def __len__(self):
+        return self.passage_count
+
+    def close(self):
+        """
+        Unmap the index file. The index can't be searched afterwards.
+        """
+        # The mapping can only be closed once no view of it is left
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def term(self, term_id):
+        offset, length = self._terms[4 * term_id], self._terms[4 * term_id + 1]
+        return bytes(self._strings[offset:offset + length]).decode('utf-8')
+
+    def _find(self, term):
+        # Binary search of the sorted term table; returns the term id or None
+        key = term.encode('utf-8')
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length = self._terms[4 * middle], self._terms[4 * middle + 1]
+            candidate = self._strings[offset:offset + length].tobytes()
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def passage(self, passage_id):
+        start, end = self._text_start[passage_id], self._text_start[passage_id + 1]
+        return bytes(self._text[start:end]).decode('utf-8')
+
+    def passage_hash(self, passage_id):
+        return bytes(self._hashes[20 * passage_id:20 * (passage_id + 1)])
+
+    def passage_terms(self, passage_id):
+        """
+        {term: tf} of a passage, from the forward index.
+        """
+        start, end = self._forward_start[passage_id], self._forward_start[passage_id + 1]
+        pairs = self._forward[2 * start:2 * end]
+        return {self.term(pairs[i]): pairs[i + 1] for i in range(0, len(pairs), 2)}
+
+    def search(self, query, k=LESSON_TOP_K):
+        """
+        Return the k best passages for a query as [(passage id, score)], best first.
+        """
+        scores = {}
+        n = self.passage_count
+        for term, query_tf in Counter(tokenize(query)).items():
+            term_id = self._find(term)
+            if term_id is None:
+                continue
+            start, df = self._terms[4 * term_id + 2], self._terms[4 * term_id + 3]
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5)) * query_tf
+            postings = self._postings[2 * start:2 * (start + df)]
+            norms = self._norms
+            for i in range(0, 2 * df, 2):
+                passage_id, tf = postings[i], postings[i + 1]
+                score = idf * tf * (BM25_K1 + 1) / (tf + norms[passage_id])
+                scores[passage_id] = scores.get(passage_id, 0.0) + score
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    @classmethod
+    def build(cls, text, path, previous=None):
+        """
+        Index text into path and return (index, stats).
+
+        previous is the lesson's earlier index, if any: passages it already
+        has are not tokenized again. It is closed once they have been read,
+        before path is replaced (Windows can't replace a mapped file).
+        """
+        start = time.perf_counter()
+        passages = split_passages(text)
+        hashes = [hashlib.sha1(p.encode('utf-8')).digest() for p in passages]
+
+        known = {}
+        if previous is not None:
+            for passage_id in range(len(previous)):
+                known.setdefault(previous.passage_hash(passage_id), passage_id)
+
+        counts = []
+        reused = 0
+        for passage, digest in zip(passages, hashes):
+            if digest in known:
+                counts.append(previous.passage_terms(known[digest]))
+                reused += 1
+            else:
+                counts.append(Counter(tokenize(passage)))
+        if previous is not None:
+            previous.close()
+
+        terms = sorted({term for tf in counts for term in tf}, key=lambda t: t.encode('utf-8'))
+        term_ids = {term: i for i, term in enumerate(terms)}
+        postings = [[] for _ in terms]
+        forward, forward_start, lengths = [], [0], []
+        for passage_id, tf in enumerate(counts):
+            for term, count in sorted(tf.items(), key=lambda item: term_ids[item[0]]):
+                postings[term_ids[term]].append((passage_id, count))
+                forward += (term_ids[term], count)
+            forward_start.append(len(forward) // 2)
+            lengths.append(sum(tf.values()))
+
+        average = sum(lengths) / len(lengths) if lengths else 0.0
+        norms = [BM25_K1 * (1 - BM25_B + BM25_B * length / average) if average else BM25_K1 for length in lengths]
+
+        strings = bytearray()
+        term_table, flat_postings = [], []
+        for term, term_postings in zip(terms, postings):
+            encoded = term.encode('utf-8')
+            term_table += (len(strings), len(encoded), len(flat_postings) // 2, len(term_postings))
+            strings += encoded
+            for passage_id, count in term_postings:
+                flat_postings += (passage_id, count)
+
+        texts = [p.encode('utf-8') for p in passages]
+        text_start = [0]
+        for encoded in texts:
+            text_start.append(text_start[-1] + len(encoded))
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        body = [
+            ("terms", 'I', term_table),
+            ("strings", None, bytes(strings)),
+            ("postings", 'I', flat_postings),
+            ("forward", 'I', forward),
+            ("forward_start", 'I', forward_start),
+            ("norms", 'f', norms),
+            ("text_start", 'I', text_start),
+            ("text", None, b"".join(texts)),
+            ("hashes", None, b"".join(hashes)),
+        ]
+        sizes = [len(data) if typecode is None else len(data) * array(typecode).itemsize
+                 for _, typecode, data in body]
+
+        meta = {
+            "source": source_hash(text),
+            "passages": len(passages),
+            "terms": len(terms),
+            "passage_chars": PASSAGE_CHARS,
+            "tokenizer": TOKENIZER_VERSION,
+            "byteorder": sys.byteorder,
+            "sections": {},
+        }
+        # Section offsets depend on the header length, which depends on the offsets: pad the header
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        header_length = 12 + len(meta_bytes) + 64 * len(body)
+        header_length += -header_length % 4
+        offset = header_length
+        for (name, _, _), size in zip(body, sizes):
+            meta["sections"][name] = [offset, offset + size]
+            offset += size + (-size % 4)
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        assert 12 + len(meta_bytes) <= header_length
+
+        temporary = path.with_suffix(".tmp")
+        with open(temporary, 'wb') as f:
+            f.write(struct.pack("<4sII", MAGIC, FORMAT_VERSION, len(meta_bytes)))
+            f.write(meta_bytes)
+            f.write(b"\0" * (header_length - f.tell()))
+            for name, typecode, data in body:
+                if typecode is None:
+                    f.write(data)
+                    f.write(b"\0" * (-f.tell() % 4))
+                else:
+                    _write_array(f, typecode, data)
+        os.replace(temporary, path)
+
+        stats = {
+            "passages": len(passages),
+            "reused": reused,
+            "terms": len(terms),
+            "bytes": path.stat().st_size,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        return cls(path), stats
+
+
+def load_or_build(lesson_folder, lang_key, text, force=False):
+    """
+    Load a lesson's index, first rebuilding it if it is missing or out of
+    date with text. Returns (index, build stats or None if it was current).
+    """
+    path = index_path(lesson_folder, lang_key)
+    previous = None
+    try:
+        previous = LessonIndex(path)
+    except (OSError, ValueError, KeyError) as e:
+        if path.exists():
+            print(f"Rebuilding unreadable lesson index {path}: {e}")
+    if previous is not None and (force or (previous.meta["passage_chars"], previous.meta.get("tokenizer"))
+                                 != (PASSAGE_CHARS, TOKENIZER_VERSION)):
+        # Rebuilt from scratch, or split or tokenized differently: nothing to reuse
+        previous.close()
+        previous = None
+    if previous is not None and previous.meta["source"] == source_hash(text):
+        return previous, None
+    # build() closes the previous index before it replaces the file
+    index, stats = LessonIndex.build(text, path, previous=previous)
+    print(f"Indexed {path}: {stats['passages']} passages ({stats['reused']} reused), "
+          f"{stats['terms']} terms in {stats['ms']}ms")
+    return index, stats
+
+
+def outline_context(index, lang_key, max_chars=LESSON_OUTLINE_CHARS):
+    """
+    System prompt context for a retrieved lesson: its first passages.
+    """
+    parts = []
+    used = 0
+    for passage_id in range(len(index)):
+        passage = index.passage(passage_id)
+        if parts and used + len(passage) > max_chars:
+            break
+        parts.append(passage)
+        used += len(passage)
+    if lang_key == 'bn':
+        note = "(এটি পাঠের শুরু। শিক্ষার্থীর প্রতিটি বার্তার সাথে পাঠের প্রাসঙ্গিক অংশ পাঠানো হবে।)"
+    else:
+        note = "(This is the beginning of the lesson. The relevant parts of the lesson are sent with each of the learner's messages.)"
+    return "\n\n".join(parts) + f"\n\n{note}"
+
+
+def format_passages(index, results, lang_key):
+    """
+    Grounding text for a turn: the retrieved passages in lesson order.
+    """
+    if not results:
+        return None
+    passages = "\n\n".join(index.passage(passage_id) for passage_id, _ in sorted(results))
+    if lang_key == 'bn':
+        return f"পাঠের প্রাসঙ্গিক অংশ:\n{passages}\n\nশিক্ষার্থীর বার্তা:"
+    return f"Relevant parts of the lesson:\n{passages}\n\nLearner's message:"
+
+
+def build_all(lessons_dir=LESSONS_DIR, force=False, min_chars=LESSON_RETRIEVAL_MIN_CHARS):
+    for folder in sorted(p for p in Path(lessons_dir).iterdir() if p.is_dir()):
+        for lang_key in ('en', 'bn'):
+            content_path = folder / f"content_{lang_key}.txt"
+            if not content_path.exists():
+                continue
+            text = content_path.read_text(encoding='utf-8')
+            if len(text) < min_chars:
+                continue
+            _, stats = load_or_build(folder, lang_key, text, force=force)
+            if stats is None:
+                print(f"{index_path(folder, lang_key)} is up to date")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the BM25 indexes of large lessons.")
+    parser.add_argument("--lessons-dir", default=str(LESSONS_DIR))
+    parser.add_argument("--force", action="store_true", help="rebuild from scratch")
+    parser.add_argument("--all", action="store_true", help="also index lessons short enough to be sent whole")
+    args = parser.parse_args()
+    build_all(args.lessons_dir, force=args.force, min_chars=0 if args.all else LESSON_RETRIEVAL_MIN_CHARS)
+
+
+if __name__ == "__main__":
+    main()
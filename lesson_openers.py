@@ -0,0 +1,74 @@
+from collections import OrderedDict
+import asyncio
+import hashlib
+
+from metrics import CACHE_REQUESTS
+
+
+def opener_message(topic_name, lang_key):
+    """
+    The fixed first message a learner "sends" when starting a lesson.
+    """
+    if lang_key == 'bn':
+        return f"আমি {topic_name} সম্পর্কে শিখতে চাই। দয়া করে পাঠ শুরু করুন।"
+    return f"I want to learn about {topic_name}. Please start the lesson."
+
+
+def make_opener_key(topic, language_code, context, model_name):
+    """
+    Openers are shared by everyone starting the same lesson version: the key
+    changes whenever the lesson text (or the model) does.
+    """
+    content_hash = hashlib.sha1((context or "").encode('utf-8')).hexdigest()
+    return (topic, language_code, content_hash, model_name)
+
+
+class LessonOpenerCache:
+    """
+    In-memory cache of lesson openers: the first reply of a lesson and the
+    chat history it produced, shared by every learner starting that lesson.
+
+    Concurrent requests for an opener that isn't cached yet wait for a single
+    generation instead of each calling Gemini. The generation is shielded and
+    cached when it finishes, even if every request waiting for it was cancelled.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._openers = OrderedDict()
+        self._pending = {}
+
+    async def get(self, key, generate):
+        """
+        Return the opener for key, calling `await generate()` on a miss.
+
+        Returns:
+            dict: {"text": raw reply, "history": serialized history}
+        """
+        opener = self._openers.get(key)
+        if opener is not None:
+            self._openers.move_to_end(key)
+            CACHE_REQUESTS.inc(cache='lesson_opener', result='hit')
+            return opener
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            CACHE_REQUESTS.inc(cache='lesson_opener', result='hit')
+            return await asyncio.shield(pending)
+
+        CACHE_REQUESTS.inc(cache='lesson_opener', result='miss')
+        pending = asyncio.ensure_future(generate())
+        self._pending[key] = pending
+        pending.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(pending)
+
+    def _finished(self, key, pending):
+        self._pending.pop(key, None)
+        if pending.cancelled() or pending.exception() is not None:
+            return
+        self._openers[key] = pending.result()
+        while len(self._openers) > self.max_entries:
+            self._openers.popitem(last=False)
+
+    def __len__(self):
+        return len(self._openers)
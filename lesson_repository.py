@@ -0,0 +1,241 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+
+from lesson_audio import load_manifest, attach_quiz_audio, AUDIO_DIR_NAME, MANIFEST_NAME
+from lesson_index import (LESSON_RETRIEVAL_MIN_CHARS, LESSON_TOP_K, format_passages, load_or_build,
+                          outline_context)
+from single_flight import SingleFlight
+
+LESSON_FILES = ("metadata.json", "content_en.txt", "content_bn.txt", "quiz.json",
+                f"{AUDIO_DIR_NAME}/{MANIFEST_NAME}")
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+class Lesson:
+    """
+    One lesson folder, fully parsed.
+    """
+
+    def __init__(self, lesson_id, folder, fingerprint):
+        self.id = lesson_id
+        self.folder = folder
+        self.fingerprint = fingerprint
+
+        meta_path = folder / "metadata.json"
+        self.metadata = {}
+        if meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                self.metadata = json.load(f)
+
+        self.content = {}
+        for lang_key in ('en', 'bn'):
+            content_path = folder / f"content_{lang_key}.txt"
+            if content_path.exists():
+                with open(content_path, 'r', encoding='utf-8') as f:
+                    self.content[lang_key] = f.read()
+
+        # Quiz with pre-rendered audio references already attached
+        self.quiz = None
+        quiz_path = folder / "quiz.json"
+        if quiz_path.exists():
+            with open(quiz_path, 'r', encoding='utf-8') as f:
+                self.quiz = attach_quiz_audio(json.load(f), lesson_id, load_manifest(folder))
+
+        self.quiz_etag = make_etag("quiz", lesson_id, fingerprint)
+
+        # BM25 indexes of large lessons, per language, loaded on first use
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
+    def title(self, lang_key):
+        return self.metadata.get(f"title_{lang_key}", self.id)
+
+    def get_content(self, lang_key):
+        # Fall back to the English text if the lesson has no translation
+        return self.content.get(lang_key, self.content.get('en', ""))
+
+    def uses_retrieval(self, lang_key):
+        """
+        Whether the lesson is too long to send whole, so turns get retrieved passages instead.
+        """
+        return len(self.get_content(lang_key)) >= LESSON_RETRIEVAL_MIN_CHARS
+
+    def index(self, lang_key):
+        """
+        The lesson text's BM25 index (lesson_index.py), built or updated on first use.
+        """
+        lang_key = lang_key if lang_key in self.content else 'en'
+        with self._index_lock:
+            index = self._indexes.get(lang_key)
+            if index is None:
+                index, _ = load_or_build(self.folder, lang_key, self.get_content(lang_key))
+                self._indexes[lang_key] = index
+            return index
+
+    def prompt_context(self, lang_key):
+        """
+        Lesson text for the system prompt: all of it, or only its beginning for a large lesson.
+        """
+        if not self.uses_retrieval(lang_key):
+            return self.get_content(lang_key)
+        return outline_context(self.index(lang_key), lang_key)
+
+    def grounding(self, lang_key, query, k=LESSON_TOP_K):
+        """
+        The passages of a large lesson that best match a learner's message, as
+        text to send ahead of it, or None if the lesson is sent whole.
+        """
+        if not self.uses_retrieval(lang_key):
+            return None
+        index = self.index(lang_key)
+        return format_passages(index, index.search(query, k), lang_key)
+
+    def summary(self):
+        return {"id": self.id, "title_en": self.title('en'), "title_bn": self.title('bn')}
+
+
+class LessonRepository:
+    """
+    In-memory catalog of everything under LESSONS_DIR.
+
+    Lessons are parsed once and only re-read when one of their files changes.
+    Changes are detected by comparing file mtimes/sizes, at most once every
+    check_interval seconds per lesson (and for the folder listing), so a
+    request normally does no file I/O at all.
+    """
+
+    def __init__(self, lessons_dir, check_interval=2.0):
+        self.lessons_dir = Path(lessons_dir)
+        self.check_interval = check_interval
+
+        self._lessons = {}
+        self._checked = {}
+        self._dir_mtime = None
+        self._listing_checked = 0.0
+        self._catalog = None
+        self._lock = threading.RLock()
+        self._loads = SingleFlight('lesson_load')
+
+        self.reloads = 0
+
+    def _fingerprint(self, folder):
+        fingerprint = []
+        for name in LESSON_FILES:
+            try:
+                stat = os.stat(folder / name)
+            except OSError:
+                continue
+            fingerprint.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(fingerprint)
+
+    def _check_lesson(self, lesson_id, now, force=False):
+        # Caller holds the lock. Returns (current lesson, fingerprint of a newer version to load or None).
+        if not force and now - self._checked.get(lesson_id, 0.0) < self.check_interval:
+            return self._lessons.get(lesson_id), None
+
+        folder = self.lessons_dir / lesson_id
+        fingerprint = self._fingerprint(folder) if folder.is_dir() else ()
+        if not any(name == "metadata.json" for name, _, _ in fingerprint):
+            self._checked.pop(lesson_id, None)
+            if self._lessons.pop(lesson_id, None) is not None:
+                self._catalog = None
+            return None, None
+
+        lesson = self._lessons.get(lesson_id)
+        if lesson is None or lesson.fingerprint != fingerprint:
+            # Not marked as checked until loaded: concurrent callers join the same load
+            return lesson, fingerprint
+        self._checked[lesson_id] = now
+        return lesson, None
+
+    def _load_lesson(self, lesson_id, fingerprint):
+        # Parses outside the lock; concurrent loads of the same version share one parse
+        try:
+            return self._loads.do((lesson_id, fingerprint), Lesson, lesson_id, self.lessons_dir / lesson_id, fingerprint)
+        except Exception as e:
+            print(f"Error reading lesson {lesson_id}: {e}")
+            return None
+
+    def _store_lesson(self, lesson_id, loaded, now):
+        # Caller holds the lock
+        self._checked[lesson_id] = now
+        current = self._lessons.get(lesson_id)
+        if loaded is None or (current is not None and current.fingerprint == loaded.fingerprint):
+            return current
+        self._lessons[lesson_id] = loaded
+        self._catalog = None
+        self.reloads += 1
+        return loaded
+
+    def _refresh_lesson(self, lesson_id, now, force=False):
+        # Caller holds the lock
+        lesson, fingerprint = self._check_lesson(lesson_id, now, force)
+        if fingerprint is None:
+            return lesson
+        return self._store_lesson(lesson_id, self._load_lesson(lesson_id, fingerprint), now)
+
+    def _refresh_listing(self, now):
+        # Caller holds the lock. Rescan the folder list only when the directory itself changed.
+        if now - self._listing_checked < self.check_interval:
+            return
+        self._listing_checked = now
+
+        try:
+            dir_mtime = os.stat(self.lessons_dir).st_mtime_ns
+        except OSError:
+            dir_mtime = None
+        if dir_mtime != self._dir_mtime:
+            self._dir_mtime = dir_mtime
+            names = {p.name for p in self.lessons_dir.iterdir() if p.is_dir()} if dir_mtime else set()
+            for gone in set(self._lessons) - names:
+                del self._lessons[gone]
+                self._catalog = None
+            for name in names - set(self._lessons):
+                self._refresh_lesson(name, now, force=True)
+
+        for lesson_id in list(self._lessons):
+            self._refresh_lesson(lesson_id, now)
+
+    def get(self, lesson_id):
+        """
+        Return the Lesson for an id, or None if there is no such lesson.
+        """
+        if not lesson_id or "/" in lesson_id or "\\" in lesson_id or lesson_id.startswith("."):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            lesson, fingerprint = self._check_lesson(lesson_id, now)
+        if fingerprint is None:
+            return lesson
+        loaded = self._load_lesson(lesson_id, fingerprint)
+        with self._lock:
+            return self._store_lesson(lesson_id, loaded, now)
+
+    def catalog(self):
+        """
+        Return (lesson summaries sorted by id, etag).
+        """
+        with self._lock:
+            self._refresh_listing(time.monotonic())
+            if self._catalog is None:
+                lessons = [self._lessons[lesson_id].summary() for lesson_id in sorted(self._lessons)]
+                self._catalog = (lessons, make_etag("catalog", lessons))
+            return self._catalog
+
+    def quiz(self, lesson_id):
+        """
+        Return (quiz with audio references, etag), or (None, None) if the lesson has no quiz.
+        The quiz is shared between requests and must not be modified.
+        """
+        lesson = self.get(lesson_id)
+        if lesson is None or lesson.quiz is None:
+            return None, None
+        return lesson.quiz, lesson.quiz_etag
@@ -0,0 +1,288 @@
+"""
+Load generator for the API.
+
+By default it starts the API on fake Google backends (fake_backends.py) in a
+subprocess, drives one or more endpoints at a fixed concurrency and reports
+throughput, latency percentiles and the server's memory:
+
+    python loadtest.py --scenario chat_audio --concurrency 32 --requests 500
+    python loadtest.py --scenario mixed --gemini-latency lognormal:900:0.4
+    python loadtest.py --url http://localhost:8000 --scenario tts   # existing server
+
+Overload: push far more voice turns than the upstream limits allow and check
+that p99 stays bounded, the excess is shed with 429/503, and /tts stays fast:
+
+    python loadtest.py --scenario mixed --concurrency 128 --requests 2000 \
+        --env STT_CONCURRENCY=8 --env STT_QUEUE=16 --env GEMINI_CONCURRENCY=8 --env GEMINI_QUEUE=16 \
+        --env REQUEST_DEADLINE_SECONDS=5
+
+Scenarios: chat_audio, lesson_audio, objects_detect, tts, mixed.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+SCENARIOS = ('chat_audio', 'lesson_audio', 'objects_detect', 'tts')
+SAMPLE_TTS_TEXT = "বাংলাদেশের মুক্তিযুদ্ধ ১৯৭১ সালে শুরু হয়েছিল।"
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+
+def read_memory(pid):
+    """
+    Current and peak resident memory of a process in MB, from /proc (Linux only).
+    """
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    memory[line.split(':')[0]] = int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return {"rss_mb": round(memory.get("VmRSS", 0), 1), "peak_rss_mb": round(memory.get("VmHWM", 0), 1)}
+
+
+class MemorySampler(threading.Thread):
+    """
+    Polls a process's RSS while the load runs.
+    """
+
+    def __init__(self, pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.max_rss_mb = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            memory = read_memory(self.pid)
+            if memory:
+                self.max_rss_mb = max(self.max_rss_mb, memory["rss_mb"])
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RequestFactory:
+    """
+    Builds the HTTP request for one call of a scenario.
+    """
+
+    def __init__(self, base_url, audio_kb=32, image_path=None, audio_format='mp3', audio_delivery='url', distinct_tts=True):
+        self.base_url = base_url.rstrip('/')
+        self.audio = os.urandom(audio_kb * 1024)
+        self.image = Path(image_path).read_bytes() if image_path else None
+        self.audio_format = audio_format
+        self.audio_delivery = audio_delivery
+        self.distinct_tts = distinct_tts
+        self.topic = None
+
+    def prepare(self, session, scenarios):
+        if 'lesson_audio' in scenarios:
+            lessons = session.get(f"{self.base_url}/lessons", timeout=30).json()
+            if not lessons:
+                raise SystemExit("lesson_audio needs at least one lesson in lessons/")
+            self.topic = lessons[0]["id"]
+
+    def build(self, scenario, index):
+        form = {'language_code': 'bn-BD', 'audio_format': self.audio_format, 'audio_delivery': self.audio_delivery}
+        audio_file = ('audio.webm', self.audio, 'audio/webm')
+        if scenario == 'chat_audio':
+            return "POST", "/chat/audio", {"files": {'audio': audio_file}, "data": form}
+        if scenario == 'lesson_audio':
+            return "POST", "/lesson/audio", {"files": {'audio': audio_file}, "data": {**form, 'topic': self.topic}}
+        if scenario == 'objects_detect':
+            files = {'audio': audio_file, 'image': ('image.jpg', self.image, 'image/jpeg')}
+            return "POST", "/objects/detect", {"files": files, "data": form}
+        if scenario == 'tts':
+            # A distinct text per request keeps every call a TTS cache miss
+            text = f"{SAMPLE_TTS_TEXT} {index}" if self.distinct_tts else SAMPLE_TTS_TEXT
+            body = {'text': text, 'language_code': 'bn-BD', 'audio_format': self.audio_format, 'audio_delivery': 'binary'}
+            return "POST", "/tts", {"json": body}
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def run_load(factory, scenarios, concurrency, total_requests, timeout=120):
+    """
+    Send total_requests requests from concurrency workers, cycling through scenarios.
+
+    Returns:
+        dict: scenario -> list of (latency seconds, status code), and the wall time.
+    """
+    results = {scenario: [] for scenario in scenarios}
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def worker():
+        session = requests.Session()
+        session.headers["X-Session-Id"] = uuid.uuid4().hex
+        while True:
+            index = next(counter)
+            if index >= total_requests:
+                return
+            scenario = scenarios[index % len(scenarios)]
+            method, path, kwargs = factory.build(scenario, index)
+            start = time.perf_counter()
+            try:
+                status = session.request(method, factory.base_url + path, timeout=timeout, **kwargs).status_code
+            except requests.RequestException:
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                results[scenario].append((elapsed, status))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return results, time.perf_counter() - start
+
+
+def summarize(results, wall_time):
+    summary = {}
+    for scenario, samples in results.items():
+        latencies = [latency for latency, status in samples if status == 200]
+        answered = [latency for latency, status in samples if status is not None]
+        summary[scenario] = {
+            "requests": len(samples),
+            # Requests refused by admission control (queue full / deadline)
+            "shed": sum(1 for _, status in samples if status in (429, 503)),
+            "errors": sum(1 for _, status in samples if status not in (200, 429, 503)),
+            "throughput_rps": round(len(latencies) / wall_time, 2),
+            "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+            # Including the shed responses: what a client waits for an answer either way
+            "p99_all_ms": round(percentile(answered, 99) * 1000, 1) if answered else None,
+        }
+    return summary
+
+
+def start_fake_server(port, args):
+    command = [sys.executable, str(Path(__file__).parent / "fake_backends.py"), "--port", str(port)]
+    for flag in ("stt_latency", "gemini_latency", "tts_latency", "vision_latency", "reply_chars"):
+        value = getattr(args, flag)
+        if value is not None:
+            command += [f"--{flag.replace('_', '-')}", str(value)]
+    env = dict(os.environ, **dict(item.split('=', 1) for item in args.env or []))
+    server = subprocess.Popen(command, cwd=Path(__file__).parent, env=env)
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("Fake server exited during startup")
+        try:
+            requests.get(url + "/", timeout=1)
+            return server, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("Fake server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API (on fake backends by default).")
+    parser.add_argument("--scenario", choices=SCENARIOS + ('mixed',), default='chat_audio')
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    parser.add_argument("--url", help="test an already running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="server pid for memory stats when using --url")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--audio-kb", type=int, default=32, help="size of the uploaded audio clip")
+    parser.add_argument("--image", default=str(Path(__file__).parent / "bus.jpg"))
+    parser.add_argument("--audio-format", default='mp3')
+    parser.add_argument("--audio-delivery", default='url')
+    parser.add_argument("--same-tts-text", action="store_true", help="let /tts hit the TTS cache")
+    parser.add_argument("--stt-latency")
+    parser.add_argument("--gemini-latency")
+    parser.add_argument("--tts-latency")
+    parser.add_argument("--vision-latency")
+    parser.add_argument("--reply-chars", type=int)
+    parser.add_argument("--env", action="append", metavar="KEY=VALUE",
+                        help="environment for the fake server, e.g. STT_CONCURRENCY=8 (repeatable)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS if args.scenario == 'mixed' else (args.scenario,)
+    server = None
+    if args.url:
+        url, pid = args.url, args.pid
+    else:
+        server, url = start_fake_server(args.port, args)
+        pid = server.pid
+
+    try:
+        factory = RequestFactory(url, args.audio_kb, args.image, args.audio_format, args.audio_delivery,
+                                 distinct_tts=not args.same_tts_text)
+        factory.prepare(requests.Session(), scenarios)
+        if args.warmup:
+            run_load(factory, scenarios, min(args.concurrency, args.warmup), args.warmup)
+
+        memory_before = read_memory(pid) if pid else None
+        sampler = MemorySampler(pid) if pid else None
+        if sampler:
+            sampler.start()
+        results, wall_time = run_load(factory, scenarios, args.concurrency, args.requests)
+        if sampler:
+            sampler.stop()
+        memory_after = read_memory(pid) if pid else None
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "concurrency": args.concurrency,
+        "wall_time_s": round(wall_time, 2),
+        "throughput_rps": round(sum(len(r) for r in results.values()) / wall_time, 2),
+        "scenarios": summarize(results, wall_time),
+    }
+    if memory_before:
+        report["memory"] = {
+            "rss_before_mb": memory_before["rss_mb"],
+            "rss_after_mb": memory_after["rss_mb"] if memory_after else None,
+            "rss_max_sampled_mb": sampler.max_rss_mb,
+            "peak_rss_mb": memory_after["peak_rss_mb"] if memory_after else None,
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.requests} requests at concurrency {args.concurrency} in {report['wall_time_s']}s "
+          f"({report['throughput_rps']} req/s)")
+    print(f"{'scenario':16s} {'reqs':>6s} {'shed':>6s} {'errors':>6s} {'req/s':>8s} {'p50 ms':>9s} {'p95 ms':>9s} "
+          f"{'p99 ms':>9s} {'p99 all':>9s}")
+    for scenario, s in report["scenarios"].items():
+        print(f"{scenario:16s} {s['requests']:6d} {s['shed']:6d} {s['errors']:6d} {s['throughput_rps']:8.2f} "
+              f"{s['p50_ms'] or '-':>9} {s['p95_ms'] or '-':>9} {s['p99_ms'] or '-':>9} {s['p99_all_ms'] or '-':>9}")
+    if "memory" in report:
+        m = report["memory"]
+        print(f"server RSS: {m['rss_before_mb']} MB before, {m['rss_after_mb']} MB after, "
+              f"{m['rss_max_sampled_mb']} MB max sampled, {m['peak_rss_mb']} MB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Long-audio transcription: synchronous recognize() only accepts about a
+minute of audio, so longer recordings are split at pauses into bounded
+segments, transcribed concurrently and stitched back together in order.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from audio_frontend import decode_wav, decode_webm, encode_wav, ffmpeg_available, frame_levels, speech_segments, VAD_FRAME_MS
+
+# Longest segment sent in one recognize() call (Google's limit is 60 s)
+MAX_SEGMENT_SECONDS = float(os.environ.get("STT_MAX_SEGMENT_SECONDS", 50))
+# Segments transcribed at once for one recording
+SEGMENT_WORKERS = int(os.environ.get("STT_SEGMENT_WORKERS", 4))
+# Pauses at least this long may become segment boundaries
+MIN_PAUSE_MS = 300
+# A pause this long ends a sentence, even if STT didn't punctuate it
+SENTENCE_PAUSE_MS = 700
+# Kept around each segment so word edges aren't clipped
+SEGMENT_PAD_MS = 150
+
+SENTENCE_END = ('।', '.', '?', '!', '৷')
+
+
+def split_at_pauses(samples, rate, max_segment_seconds=MAX_SEGMENT_SECONDS, min_pause_ms=MIN_PAUSE_MS):
+    """
+    Split a recording into segments of at most max_segment_seconds, cutting in
+    the middle of pauses. Speech that runs longer than that without a pause is
+    cut at its quietest frame near the limit.
+
+    Returns:
+        list[tuple]: (start sample, end sample, pause ms after the segment) in
+                     order; pause is 0 where a segment was cut mid-speech and
+                     None after the last one. Empty if there is no speech.
+    """
+    speech = speech_segments(samples, rate, min_gap_ms=min_pause_ms, pad_ms=0)
+    if not speech:
+        return []
+    max_len = int(max_segment_seconds * rate)
+    pad = rate * SEGMENT_PAD_MS // 1000
+    frame = max(1, rate * VAD_FRAME_MS // 1000)
+
+    # Pieces of speech no longer than max_len (long runs are cut at their quietest frame)
+    pieces = []
+    for start, end in speech:
+        while end - start > max_len:
+            window_start = start + int(max_len * 0.7)
+            levels = frame_levels(samples[window_start:start + max_len], rate)
+            quietest = min(range(len(levels)), key=levels.__getitem__) if levels else 0
+            cut = window_start + quietest * frame + frame // 2
+            pieces.append((start, cut, 0))
+            start = cut
+        pieces.append((start, end, None))
+
+    # Pack consecutive pieces into segments, cutting in the middle of pauses
+    segments = []
+    seg_start, seg_end = pieces[0][0], pieces[0][1]
+    cut_pause = pieces[0][2]
+    for start, end, pause in pieces[1:]:
+        gap = 0 if cut_pause == 0 else start - seg_end
+        if end - seg_start + 2 * pad <= max_len:
+            seg_end, cut_pause = end, pause
+            continue
+        segments.append((seg_start, seg_end, gap * 1000 // rate))
+        seg_start, seg_end, cut_pause = start, end, pause
+    segments.append((seg_start, seg_end, None))
+
+    # Pad each segment into the neighbouring pause, without overlapping
+    padded = []
+    for index, (start, end, pause) in enumerate(segments):
+        lead = pad if index == 0 or segments[index - 1][2] else 0
+        tail = pad if pause is None or pause else 0
+        padded.append((max(0, start - lead), min(len(samples), end + tail), pause))
+    return padded
+
+
+def stitch_transcripts(parts, pauses, language_code='bn-BD'):
+    """
+    Join segment transcripts in order.
+
+    Each segment is punctuated on its own, so at a cut made mid-speech the
+    full stop STT adds to the first half is dropped, and after a long pause
+    a sentence end is added if STT left it out.
+    """
+    full_stop = '।' if language_code.startswith('bn') else '.'
+    text = ""
+    for part, pause in zip(parts, pauses):
+        part = (part or "").strip()
+        if not part:
+            continue
+        text = f"{text} {part}" if text else part
+        if pause == 0 and text.endswith(('।', '.', '৷')):
+            text = text[:-1]
+        elif pause is not None and pause >= SENTENCE_PAUSE_MS and not text.endswith(SENTENCE_END):
+            text += full_stop
+    return text.strip()
+
+
+def split_recording(data, encoding='LINEAR16', max_segment_seconds=MAX_SEGMENT_SECONDS):
+    """
+    Decode a recording and split it into WAV segments for recognize().
+
+    Returns:
+        tuple: (list of WAV bytes, list of pause ms after each, sample rate, duration ms)
+
+    Raises:
+        ValueError: If the recording can't be decoded (WebM needs ffmpeg).
+    """
+    if encoding == 'LINEAR16':
+        samples, rate = decode_wav(data)
+    elif ffmpeg_available():
+        samples, rate = decode_webm(data)
+    else:
+        raise ValueError("Splitting WebM/Opus audio needs ffmpeg")
+    segments = split_at_pauses(samples, rate, max_segment_seconds)
+    chunks = [encode_wav(samples[start:end], rate) for start, end, _ in segments]
+    return chunks, [pause for _, _, pause in segments], rate, len(samples) * 1000 // rate
+
+
+def transcribe_long(data, transcribe, encoding='LINEAR16', language_code='bn-BD',
+                    max_segment_seconds=MAX_SEGMENT_SECONDS, max_workers=SEGMENT_WORKERS):
+    """
+    Transcribe a recording of any length with transcribe(segment bytes, rate=..,
+    encoding=.., language_code=..), e.g. GoogleSTT.runSTT_from_bytes, running at
+    most max_workers segments at once.
+
+    Returns:
+        tuple: (transcript, stats dict with segments, duration_ms)
+    """
+    chunks, pauses, rate, duration_ms = split_recording(data, encoding, max_segment_seconds)
+    if len(chunks) <= 1:
+        parts = [transcribe(chunk, rate=rate, encoding='LINEAR16', language_code=language_code) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)), thread_name_prefix="stt-segment") as pool:
+            parts = list(pool.map(
+                lambda chunk: transcribe(chunk, rate=rate, encoding='LINEAR16', language_code=language_code), chunks))
+    return stitch_transcripts(parts, pauses, language_code), {"segments": len(chunks), "duration_ms": duration_ms}
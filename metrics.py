@@ -0,0 +1,243 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+
+# Latency buckets (seconds) covering cache hits up to slow Gemini answers
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stage timings of the request being handled, for its Server-Timing header.
+# Holds a list shared with the worker threads the request's stages run in.
+_request_timings = ContextVar("request_timings", default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic counter with a fixed set of label names.
+    """
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with a fixed set of label names.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = _label_text(self.labelnames, key, [("le", bound)])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _label_text(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {total:.6f}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered in the Prometheus text format for /metrics.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "voice_stage_seconds", "Time spent in each pipeline stage.", ("stage", "language"))
+STAGE_QUEUE_SECONDS = registry.histogram(
+    "voice_stage_queue_seconds", "Time a blocking stage waited for a worker thread.", ("stage",))
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the end of the response.", ("endpoint", "method"))
+REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by endpoint and status.", ("endpoint", "method", "status"))
+REQUEST_BYTES = registry.counter(
+    "http_request_bytes_total", "Request body bytes received.", ("endpoint",))
+RESPONSE_BYTES = registry.counter(
+    "http_response_bytes_total", "Response body bytes sent.", ("endpoint",))
+UPSTREAM_BYTES = registry.counter(
+    "upstream_bytes_total", "Payload bytes sent to or received from upstream services.", ("stage", "direction"))
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+SINGLE_FLIGHT_CALLS = registry.counter(
+    "single_flight_calls_total",
+    "Coalesced calls: 'leader' made the upstream call, 'shared' reused a concurrent identical one (a saved call).",
+    ("group", "result"))
+ADMISSION_REJECTIONS = registry.counter(
+    "admission_rejections_total", "Upstream calls refused by admission control.", ("stage", "lane", "reason"))
+AUDIO_CLIPS = registry.counter(
+    "audio_clips_total", "Uploaded voice clips by front-end result (trimmed, untrimmed, no_speech).", ("result",))
+AUDIO_SECONDS = registry.counter(
+    "audio_seconds_total", "Seconds of decoded uploaded audio, as received and as sent to STT.", ("stage",))
+HISTORY_TOKENS = registry.histogram(
+    "chat_history_tokens", "Estimated tokens of chat history sent with the next turn.", ("mode",),
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000, 32000))
+HISTORY_COMPACTIONS = registry.counter(
+    "chat_history_compactions_total", "Chat histories whose older turns were folded into the rolling summary.", ("mode",))
+
+
+def language_label(language_code):
+    """
+    Low-cardinality language label: 'bn', 'en' or 'other'.
+    """
+    if not language_code:
+        return ""
+    prefix = language_code.split('-')[0]
+    return prefix if prefix in ('bn', 'en') else 'other'
+
+
+def record_stage(stage, seconds, language_code=None):
+    """
+    Record a stage duration in the stage histogram and the current request's Server-Timing.
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage, language=language_label(language_code))
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage, language_code=None):
+    """
+    Time a block of code as a pipeline stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, language_code)
+
+
+def server_timing_header(timings, total):
+    """
+    Server-Timing value with one entry per stage (repeated stages are summed).
+    """
+    durations = {}
+    for stage, seconds in list(timings):
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request, counts bytes in and out,
+    and adds a Server-Timing header with the stages that ran before the
+    response started (for streamed responses, only those before the first byte).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        state = {"status": 500, "bytes_in": 0, "bytes_out": 0}
+
+        async def receive_counted():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["bytes_in"] += len(message.get("body", b""))
+            return message
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            elif message["type"] == "http.response.body":
+                state["bytes_out"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counted, send_timed)
+        finally:
+            _request_timings.reset(token)
+            # Label by route handler, not by path, so ids in URLs don't blow up cardinality
+            endpoint = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            method = scope.get("method", "")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=method)
+            REQUESTS.inc(endpoint=endpoint, method=method, status=str(state["status"]))
+            REQUEST_BYTES.inc(state["bytes_in"], endpoint=endpoint)
+            RESPONSE_BYTES.inc(state["bytes_out"], endpoint=endpoint)
@@ -0,0 +1,240 @@
+import asyncio
+import io
+import os
+import re
+import threading
+import time
+
+from metrics import record_stage
+from stages import get_executor
+
+# COCO class names (the YOLO defaults) in Bangla, for grounding and fast answers
+LABELS_BN = {
+    'person': 'মানুষ', 'bicycle': 'সাইকেল', 'car': 'গাড়ি', 'motorcycle': 'মোটরসাইকেল',
+    'airplane': 'উড়োজাহাজ', 'bus': 'বাস', 'train': 'ট্রেন', 'truck': 'ট্রাক', 'boat': 'নৌকা',
+    'traffic light': 'ট্রাফিক লাইট', 'fire hydrant': 'ফায়ার হাইড্রেন্ট', 'stop sign': 'থামার চিহ্ন',
+    'parking meter': 'পার্কিং মিটার', 'bench': 'বেঞ্চ', 'bird': 'পাখি', 'cat': 'বিড়াল',
+    'dog': 'কুকুর', 'horse': 'ঘোড়া', 'sheep': 'ভেড়া', 'cow': 'গরু', 'elephant': 'হাতি',
+    'bear': 'ভালুক', 'zebra': 'জেব্রা', 'giraffe': 'জিরাফ', 'backpack': 'ব্যাকপ্যাক',
+    'umbrella': 'ছাতা', 'handbag': 'হ্যান্ডব্যাগ', 'tie': 'টাই', 'suitcase': 'স্যুটকেস',
+    'frisbee': 'ফ্রিসবি', 'skis': 'স্কি', 'snowboard': 'স্নোবোর্ড', 'sports ball': 'বল',
+    'kite': 'ঘুড়ি', 'baseball bat': 'বেসবল ব্যাট', 'baseball glove': 'বেসবল গ্লাভস',
+    'skateboard': 'স্কেটবোর্ড', 'surfboard': 'সার্ফবোর্ড', 'tennis racket': 'টেনিস র‍্যাকেট',
+    'bottle': 'বোতল', 'wine glass': 'কাচের গ্লাস', 'cup': 'কাপ', 'fork': 'কাঁটাচামচ',
+    'knife': 'ছুরি', 'spoon': 'চামচ', 'bowl': 'বাটি', 'banana': 'কলা', 'apple': 'আপেল',
+    'sandwich': 'স্যান্ডউইচ', 'orange': 'কমলা', 'broccoli': 'ব্রকলি', 'carrot': 'গাজর',
+    'hot dog': 'হট ডগ', 'pizza': 'পিৎজা', 'donut': 'ডোনাট', 'cake': 'কেক', 'chair': 'চেয়ার',
+    'couch': 'সোফা', 'potted plant': 'টবের গাছ', 'bed': 'বিছানা', 'dining table': 'খাবার টেবিল',
+    'toilet': 'টয়লেট', 'tv': 'টিভি', 'laptop': 'ল্যাপটপ', 'mouse': 'মাউস', 'remote': 'রিমোট',
+    'keyboard': 'কিবোর্ড', 'cell phone': 'মোবাইল ফোন', 'microwave': 'মাইক্রোওয়েভ',
+    'oven': 'ওভেন', 'toaster': 'টোস্টার', 'sink': 'সিঙ্ক', 'refrigerator': 'ফ্রিজ', 'book': 'বই',
+    'clock': 'ঘড়ি', 'vase': 'ফুলদানি', 'scissors': 'কাঁচি', 'teddy bear': 'টেডি বিয়ার',
+    'hair drier': 'হেয়ার ড্রায়ার', 'toothbrush': 'টুথব্রাশ',
+}
+
+# "What is this?" style questions that the detections alone can answer
+SIMPLE_QUESTION_EN = re.compile(
+    r"(what('s| is) (this|that|it)|what (object|thing) is (this|that)|what am i (holding|showing( you)?))"
+)
+SIMPLE_QUESTION_BN = re.compile(
+    r"((এটা|এটি|এইটা|ওটা|ওটি)\s*(কী|কি)(\s*(জিনিস|বস্তু))?|(কী|কি)\s*(এটা|এটি|এইটা))"
+)
+
+# Only answer locally when the detector is this sure about the main object
+FAST_PATH_CONFIDENCE = float(os.environ.get("DETECTOR_FAST_PATH_CONFIDENCE", 0.6))
+
+
+class ObjectDetector:
+    """
+    In-process YOLO detector running on CPU. The model is loaded once and
+    shared; calls are serialized through a single lock because the
+    ultralytics predictor is not thread-safe.
+    """
+
+    def __init__(self, model_path="yolov8n.pt", min_confidence=0.35, image_size=640):
+        self.model_path = model_path
+        self.min_confidence = min_confidence
+        self.image_size = image_size
+        self.model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load the model and run one dummy inference so the first request is not slow.
+        """
+        with self._lock:
+            if self.model is not None:
+                return self.model
+            from ultralytics import YOLO
+            from PIL import Image
+
+            start = time.perf_counter()
+            model = YOLO(self.model_path)
+            model.predict(Image.new('RGB', (self.image_size, self.image_size)), imgsz=self.image_size,
+                          device='cpu', verbose=False)
+            self.model = model
+            print(f"Object detector {self.model_path} loaded in {time.perf_counter() - start:.1f}s")
+            return model
+
+    def detect_batch(self, images):
+        """
+        Detect objects in several decoded PIL images with one forward pass.
+
+        Returns:
+            list[list[dict]]: Per image, detections sorted by confidence:
+                              {"label", "label_bn", "confidence", "box": [x1, y1, x2, y2]}.
+        """
+        model = self.load()
+        with self._lock:
+            results = model.predict(images, imgsz=self.image_size, conf=self.min_confidence,
+                                    device='cpu', verbose=False)
+
+        batch = []
+        for result in results:
+            detections = []
+            for box, cls, conf in zip(result.boxes.xyxy.tolist(), result.boxes.cls.tolist(), result.boxes.conf.tolist()):
+                label = result.names[int(cls)]
+                detections.append({
+                    "label": label,
+                    "label_bn": LABELS_BN.get(label, label),
+                    "confidence": round(float(conf), 3),
+                    "box": [round(v, 1) for v in box],
+                })
+            detections.sort(key=lambda d: d["confidence"], reverse=True)
+            batch.append(detections)
+        return batch
+
+    def detect(self, image_bytes):
+        return self.detect_batch([decode_image(image_bytes)])[0]
+
+
+def decode_image(image_bytes):
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_bytes))
+    return image.convert('RGB')
+
+
+class DetectionBatcher:
+    """
+    Collects images from concurrent requests for up to max_wait seconds (or
+    max_batch images) and runs them through the detector as one batch, which
+    is much cheaper per image on CPU than one forward pass per request.
+    """
+
+    def __init__(self, detector, max_batch=8, max_wait=0.02):
+        self.detector = detector
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = None
+        self._worker = None
+
+    async def detect(self, image_bytes):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._run())
+        future = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+        await self._queue.put((image_bytes, future))
+        try:
+            return await future
+        finally:
+            record_stage('detect', time.perf_counter() - start)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                results = await loop.run_in_executor(get_executor('vision'), self._detect, [item[0] for item in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), detections in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(detections, Exception):
+                    future.set_exception(detections)
+                else:
+                    future.set_result(detections)
+
+    def _detect(self, images_bytes):
+        """
+        Decode each image and detect objects in the ones that decoded. An image
+        that fails to decode gets its exception in place of detections, so it
+        fails only its own request rather than the whole batch.
+        """
+        # Decode in the worker thread too, so the event loop never touches pixels
+        results = [None] * len(images_bytes)
+        decoded = []
+        for i, image_bytes in enumerate(images_bytes):
+            try:
+                decoded.append((i, decode_image(image_bytes)))
+            except Exception as e:
+                results[i] = e
+        if decoded:
+            detections = self.detector.detect_batch([image for _, image in decoded])
+            for (i, _), image_detections in zip(decoded, detections):
+                results[i] = image_detections
+        return results
+
+
+def format_grounding(detections, lang_key='bn', limit=10):
+    """
+    Describe the detections as a short text hint for Gemini.
+    """
+    if not detections:
+        return None
+    items = []
+    for d in detections[:limit]:
+        label = d["label_bn"] if lang_key == 'bn' else d["label"]
+        items.append(f"{label} ({d['confidence']:.2f}, box {d['box']})")
+    if lang_key == 'bn':
+        return "স্থানীয় অবজেক্ট ডিটেক্টর ছবিতে যা খুঁজে পেয়েছে: " + ", ".join(items)
+    return "A local object detector found these objects in the image: " + ", ".join(items)
+
+
+def answer_from_detections(question, detections, lang_key='bn'):
+    """
+    Answer a plain "what is this?" question from the detections, or return None
+    if the question needs the LLM (anything more specific, or an unsure detection).
+    """
+    if not detections or detections[0]["confidence"] < FAST_PATH_CONFIDENCE:
+        return None
+    normalized = re.sub(r'[?।!.,]', ' ', question.lower())
+    normalized = re.sub(r'\s+', ' ', normalized).strip()
+
+    top = detections[0]
+    if lang_key == 'bn':
+        if not SIMPLE_QUESTION_BN.fullmatch(normalized):
+            return None
+        counter = "একজন" if top["label"] == 'person' else "একটি"
+        return f"এটি {counter} {top['label_bn']}।"
+
+    if not SIMPLE_QUESTION_EN.fullmatch(normalized):
+        return None
+    article = "an" if top["label"][0] in "aeiou" else "a"
+    return f"This is {article} {top['label']}."
+
+
+detector = ObjectDetector(
+    model_path=os.environ.get("OBJECT_DETECTOR_MODEL", "yolov8n.pt"),
+    min_confidence=float(os.environ.get("DETECTOR_MIN_CONFIDENCE", 0.35)),
+)
+detection_batcher = DetectionBatcher(
+    detector,
+    max_batch=int(os.environ.get("DETECTOR_MAX_BATCH", 8)),
+    max_wait=float(os.environ.get("DETECTOR_MAX_WAIT_MS", 20)) / 1000,
+)
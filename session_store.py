@@ -0,0 +1,233 @@
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import time
+
+
+class SessionStore:
+    """
+    Bounded, thread-safe store of live chat sessions.
+
+    Sessions are kept in least-recently-used order and evicted when they have
+    been idle longer than idle_ttl seconds, when there are more than
+    max_sessions of them, or when their estimated total size exceeds
+    max_bytes. on_evict(key, session, reason) is called for every eviction.
+    """
+
+    def __init__(self, max_sessions=5000, idle_ttl=1800, max_bytes=256 * 1024 * 1024,
+                 sizeof=None, on_evict=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda session: 0)
+        self.on_evict = on_evict
+
+        # key -> [session, last_used, size]
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"expired": 0, "capacity": 0, "memory": 0}
+
+    def get(self, key):
+        """
+        Return the live session for key (refreshing its idle timer), or None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None or now - entry[1] > self.idle_ttl:
+                self.misses += 1
+                evicted = self._expire(now)
+                session = None
+            else:
+                entry[1] = now
+                self._sessions.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        self._notify(evicted)
+        return session
+
+    def put(self, key, session):
+        """
+        Store a session, evicting others if a limit is exceeded.
+        """
+        now = time.monotonic()
+        size = self.sizeof(session)
+        with self._lock:
+            old = self._sessions.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._sessions[key] = [session, now, size]
+            self._bytes += size
+            evicted = self._expire(now) + self._enforce_limits()
+        self._notify(evicted)
+
+    def touch(self, key):
+        """
+        Re-measure a session after its history grew, and enforce the memory budget.
+        """
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                return
+            size = self.sizeof(entry[0])
+            self._bytes += size - entry[2]
+            entry[2] = size
+            evicted = self._enforce_limits()
+        self._notify(evicted)
+
+    def pop(self, key):
+        """
+        Remove and return a session (no eviction callback), or None.
+        """
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+            if entry is None:
+                return None
+            self._bytes -= entry[2]
+            return entry[0]
+
+    def _expire(self, now):
+        # Caller holds the lock. Oldest entries are at the front, so stop at the first live one.
+        evicted = []
+        while self._sessions:
+            key, entry = next(iter(self._sessions.items()))
+            if now - entry[1] <= self.idle_ttl:
+                break
+            self._drop(key, "expired", evicted)
+        return evicted
+
+    def _enforce_limits(self):
+        # Caller holds the lock. Never evict the most recently used session.
+        evicted = []
+        while len(self._sessions) > self.max_sessions:
+            self._drop(next(iter(self._sessions)), "capacity", evicted)
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            self._drop(next(iter(self._sessions)), "memory", evicted)
+        return evicted
+
+    def _drop(self, key, reason, evicted):
+        entry = self._sessions.pop(key)
+        self._bytes -= entry[2]
+        self.evictions[reason] += 1
+        evicted.append((key, entry[0], reason))
+
+    def _notify(self, evicted):
+        # Outside the lock, so a slow hook can't stall other requests
+        if self.on_evict is None:
+            return
+        for key, session, reason in evicted:
+            try:
+                self.on_evict(key, session, reason)
+            except Exception as e:
+                print(f"Session eviction hook failed: {e}")
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        """
+        Live session count, estimated size and eviction counters.
+        """
+        with self._lock:
+            return {
+                "live_sessions": len(self._sessions),
+                "estimated_bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": dict(self.evictions),
+            }
+
+
+class SQLiteSessionBackend:
+    """
+    Shared chat-session backend in a local SQLite database (WAL mode).
+
+    Stores each conversation's lesson context and serialized history
+    ([{"role": ..., "parts": [text, ...]}, ...]) so that any uvicorn worker, or
+    any host sharing the file, can restore it. Rows idle longer than idle_ttl
+    are purged as new ones are written.
+    """
+
+    def __init__(self, path, idle_ttl=1800):
+        self.path = str(path)
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                " key TEXT PRIMARY KEY, context TEXT, history TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chat_sessions_updated ON chat_sessions (updated)")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between threads, so keep one per worker thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key, ensure_ascii=False)
+
+    def load(self, key):
+        """
+        Return (context, history) for a live session, or None.
+        """
+        row = self._connect().execute(
+            "SELECT context, history FROM chat_sessions WHERE key = ? AND updated > ?",
+            (self._key(key), time.time() - self.idle_ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def create(self, key, context=None):
+        """
+        Start an empty session, replacing any previous one under key.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_sessions (key, context, history, updated) VALUES (?, ?, '[]', ?)",
+                (self._key(key), context, time.time())
+            )
+
+    def save_history(self, key, history):
+        """
+        Store the history after a turn, keeping the session's context.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO chat_sessions (key, context, history, updated) VALUES (?, NULL, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET history = excluded.history, updated = excluded.updated",
+                (self._key(key), json.dumps(history, ensure_ascii=False), now)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                conn.execute("DELETE FROM chat_sessions WHERE updated < ?", (now - self.idle_ttl,))
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chat_sessions WHERE key = ?", (self._key(key),))
+
+
+def create_session_backend(name, path=None, idle_ttl=1800):
+    """
+    Build the shared session backend named by SESSION_BACKEND.
+    'memory' (the default) returns None: sessions live only in this process.
+    """
+    if name in (None, "", "memory"):
+        return None
+    if name == "sqlite":
+        return SQLiteSessionBackend(path or "chat_sessions.db", idle_ttl=idle_ttl)
+    raise ValueError(f"Unknown session backend: {name}")
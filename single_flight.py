@@ -0,0 +1,95 @@
+import asyncio
+import threading
+
+from metrics import SINGLE_FLIGHT_CALLS
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is running,
+    other threads asking for the same key wait for it and share its result
+    (or exception) instead of making their own upstream call.
+
+    Nothing is kept once the call returns; caching is up to the caller.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Return func(*args, **kwargs), running it only once for all concurrent callers with this key.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SINGLE_FLIGHT_CALLS.inc(group=self.name, result='shared')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLE_FLIGHT_CALLS.inc(group=self.name, result='leader')
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on the event loop: concurrent callers with the
+    same key await one shared task instead of each taking a worker thread.
+
+    The task is shielded, so a caller that is cancelled (e.g. a client that
+    disconnected) doesn't cancel the call the others are waiting for.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._tasks = {}
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Return await func(*args, **kwargs), awaiting it only once for all concurrent callers with this key.
+        """
+        task = self._tasks.get(key)
+        if task is not None:
+            SINGLE_FLIGHT_CALLS.inc(group=self.name, result='shared')
+        else:
+            SINGLE_FLIGHT_CALLS.inc(group=self.name, result='leader')
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        self._tasks.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller was cancelled
+
+    def in_flight(self):
+        return len(self._tasks)
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import re
+import time
+
+# Sentence boundaries: the Bangla dari (।) and double dari (॥) end a sentence
+# even without a following space; . ! ? only when followed by whitespace so
+# that numbers like 3.14 stay whole. Blank lines always split.
+SENTENCE_BOUNDARY = re.compile(r'(?<=[।॥])\s*|(?<=[.!?])\s+|\n+')
+
+# Very short fragments ("হ্যাঁ।", "Yes.") are merged into the next one so the
+# client doesn't get a stutter of tiny clips.
+MIN_SEGMENT_CHARS = 20
+
+
+def split_sentences(text, min_chars=MIN_SEGMENT_CHARS):
+    """
+    Split cleaned text into speakable segments on Bangla and English sentence boundaries.
+
+    Args:
+        text (str): Text with markdown already stripped.
+        min_chars (int): Segments shorter than this are merged with the next one.
+
+    Returns:
+        list[str]: Segments in reading order.
+    """
+    segments = []
+    pending = ""
+    for part in SENTENCE_BOUNDARY.split(text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_chars:
+            segments.append(pending)
+            pending = ""
+
+    if pending:
+        if segments:
+            segments[-1] = f"{segments[-1]} {pending}"
+        else:
+            segments.append(pending)
+    return segments
+
+
+async def synthesize_in_order(segments, synthesize):
+    """
+    Synthesize all segments concurrently but yield them strictly in order.
+
+    Args:
+        segments (list[str]): Output of split_sentences.
+        synthesize (callable): async fn(text) -> audio bytes.
+
+    Yields:
+        tuple: (index, segment_text, audio_bytes)
+    """
+    tasks = [asyncio.ensure_future(synthesize(segment)) for segment in segments]
+    try:
+        for index, (segment, task) in enumerate(zip(segments, tasks)):
+            yield index, segment, await task
+    finally:
+        # Client went away or a segment failed: don't leave orphaned work queued
+        for task in tasks:
+            task.cancel()
+
+
+def sse_event(data, event=None):
+    """
+    Format one Server-Sent Events message.
+    """
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class StreamTimer:
+    """
+    Tracks time-to-first-audio separately from total time for a streamed answer.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_audio = None
+
+    def mark_audio(self):
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter()
+
+    def summary(self):
+        end = time.perf_counter()
+        return {
+            "time_to_first_audio_ms": round((self.first_audio - self.start) * 1000, 1) if self.first_audio else None,
+            "total_ms": round((end - self.start) * 1000, 1),
+        }
@@ -0,0 +1,295 @@
+import os
+import re
+
+from metrics import timed
+
+# Line-level markdown, matched against a line after its inline markup is removed:
+# a heading, then a bullet, then a number (each optional, stripped in that order)
+LINE_MARKERS = re.compile(r'(?:#{1,6}\s+(?=.))?(?P<list>(?:\s*[-*+]\s+)?(?:\s*\d+\.\s+)?)')
+MARKERS_AFTER_STAR_BULLET = re.compile(r'(?:#{1,6}\s+(?=.))?(?P<list>(?:\s*\d+\.\s+)?)')
+HORIZONTAL_RULE = re.compile(r'[-*]{3,}')
+# A "* " bullet is recognized on the raw line, before '*' is read as emphasis
+STAR_BULLET = re.compile(r'[ \t]*\*[ \t]+')
+STAR_BULLET_PENDING = re.compile(r'[ \t]*(\*[ \t]*)?')
+# While a line's cleaned text is only this, its list/heading marker isn't known yet
+PREFIX_PENDING = re.compile(r'[\s#*+\-.\d]*')
+PLAIN = re.compile(r'[^*_`\[]+')
+SPECIAL = re.compile(r'[*_`\[]')
+
+BANGLA_CHARACTERS = str.maketrans('0123456789|', '০১২৩৪৫৬৭৮৯।')
+# Thousands separators (1,000 and the Indian 1,00,000) are the commas followed by
+# exactly 2 or 3 digits; commas between single digits separate a list (১,২,৩)
+BANGLA_NORMALIZE = re.compile(r'(?<=\d),(?=\d{2,3}(?!\d))|\s*%|([।!?])\1+|\.{2,}|…|।(?=[^\s।])')
+# Trailing characters that a following chunk could still change the normalization of
+BANGLA_TAIL = re.compile(r'[\d,.।|!?…%\s]*$')
+
+
+def _bangla_replacement(match):
+    text = match.group()
+    if text == ',':
+        return ''
+    if text.endswith('%'):
+        return ' শতাংশ'
+    if match.group(1):
+        return match.group(1)
+    if text == '।':
+        return '। '
+    return '।'
+
+
+def normalize_bangla(text):
+    """
+    Make Bangla text read naturally by TTS: ASCII digits become Bangla digits,
+    thousands separators are dropped, % is spoken as শতাংশ, | is read as a dari
+    and repeated or ellipsis punctuation is collapsed.
+    """
+    return BANGLA_NORMALIZE.sub(_bangla_replacement, text.translate(BANGLA_CHARACTERS))
+
+
+class SpeechSanitizer:
+    """
+    Incremental markdown-to-speech cleaner.
+
+    Feed it the model's text as it arrives; each feed() returns the cleaned
+    text that is final so far, and flush() returns the rest. Markup split
+    across chunks (e.g. '**bo' + 'ld**') is held back until it can be
+    resolved, so no marker characters ever reach TTS. The concatenated output
+    matches the old regex strip_markdown on ordinary responses, in one pass
+    over the text.
+    """
+
+    def __init__(self, normalize_bangla=False):
+        self.normalize_bangla = normalize_bangla
+        self._raw = ""
+        self._in_code = False
+        self._started = False
+        self._held = ""
+        self._blanks = []
+        self._norm_pending = ""
+        self._new_line()
+
+    def _new_line(self):
+        self._at_line_start = True
+        self._star_bullet = False
+        self._decided = False
+        self._head = ""
+        self._line_ws = ""
+        self._has_content = False
+        self._hr = False
+        self._line_closed = False
+
+    def feed(self, chunk):
+        self._raw += chunk
+        return self._process(final=False)
+
+    def flush(self):
+        out = self._process(final=True)
+        if not self._line_closed and (not self._at_line_start or self._head):
+            out += self._line_text("", line_done=True)
+        self._new_line()
+        if self._norm_pending:
+            out += normalize_bangla(self._norm_pending).rstrip()
+            self._norm_pending = ""
+        return out
+
+    def _process(self, final):
+        raw = self._raw
+        n = len(raw)
+        pos = 0
+        out = []
+        while pos < n:
+            if self._in_code:
+                end = raw.find('```', pos)
+                if end == -1:
+                    # Keep the last two characters: they may be the start of the closing fence
+                    pos = n if final else max(pos, n - 2)
+                    break
+                pos = end + 3
+                self._in_code = False
+                continue
+
+            newline = raw.find('\n', pos)
+            line_done = newline != -1 or final
+            segment = raw[pos:] if newline == -1 else raw[pos:newline]
+
+            if self._at_line_start:
+                if not line_done and STAR_BULLET_PENDING.fullmatch(segment):
+                    break
+                match = STAR_BULLET.match(segment)
+                if match and (line_done or match.end() < len(segment)):
+                    self._star_bullet = True
+                    segment = segment[match.end():]
+                    pos += match.end()
+                self._at_line_start = False
+
+            if SPECIAL.search(segment):
+                text, consumed, fence = self._inline(segment, line_done)
+            else:
+                text, consumed, fence = segment, len(segment), False
+            pos += consumed
+            if fence:
+                out.append(self._line_text(text, line_done=False))
+                pos += 3
+                self._in_code = True
+                continue
+            if consumed < len(segment):
+                # Waiting for the rest of a span that was split across chunks
+                out.append(self._line_text(text, line_done=False))
+                break
+            out.append(self._line_text(text, line_done=line_done))
+            if newline == -1:
+                break
+            pos += 1
+            self._new_line()
+        self._raw = raw[pos:]
+        return "".join(out)
+
+    def _inline(self, s, final, nested=False):
+        """
+        Remove inline markup from one line. Returns (text, characters consumed,
+        whether a code fence starts at the stop position).
+        """
+        out = []
+        i = 0
+        n = len(s)
+        while i < n:
+            c = s[i]
+            if c == '[':
+                close = s.find(']', i + 1)
+                if close == -1 or close + 1 >= n:
+                    if not final:
+                        break
+                elif close > i + 1 and s[close + 1] == '(':
+                    end = s.find(')', close + 2)
+                    if end == -1 and not final:
+                        break
+                    if end > close + 2:
+                        out.append(self._inline(s[i + 1:close], True, True)[0])
+                        i = end + 1
+                        continue
+                out.append(c)
+                i += 1
+                continue
+
+            if c not in '*_`':
+                match = PLAIN.match(s, i)
+                out.append(match.group())
+                i = match.end()
+                continue
+
+            if c == '`':
+                if s.startswith('```', i):
+                    if not nested:
+                        return "".join(out), i, True
+                    end = s.find('```', i + 3)
+                    if end != -1:
+                        i = end + 3
+                        continue
+                    out.append('```')
+                    i += 3
+                    continue
+                if not final and s[i:] in ('`', '``'):
+                    break
+            elif s.startswith(c * 2, i):
+                close = s.find(c, i + 2)
+                if not final and (close == -1 or close == n - 1):
+                    break
+                if close > i + 2 and s.startswith(c * 2, close):
+                    out.append(self._inline(s[i + 2:close], True, True)[0])
+                    i = close + 2
+                    continue
+
+            close = s.find(c, i + 1)
+            if close == -1 and not final:
+                break
+            if close > i + 1:
+                out.append(self._inline(s[i + 1:close], True, True)[0])
+                i = close + 1
+                continue
+            out.append(c)
+            i += 1
+        return "".join(out), i, False
+
+    def _line_text(self, text, line_done):
+        """
+        Strip the line's heading/list marker once it is known, then emit.
+        """
+        if not self._decided:
+            self._head += text
+            if not line_done and PREFIX_PENDING.fullmatch(self._head):
+                return ""
+            text = self._head
+            self._head = ""
+            self._decided = True
+
+            match = (MARKERS_AFTER_STAR_BULLET if self._star_bullet else LINE_MARKERS).match(text)
+            list_item = self._star_bullet or bool(match.group('list'))
+            text = text[match.end():]
+            if line_done and HORIZONTAL_RULE.fullmatch(text):
+                text = ""
+                self._hr = True
+            if list_item:
+                # List markers swallow the blank lines before them (but not a rule)
+                while self._blanks and self._blanks[-1] == 'blank':
+                    self._blanks.pop()
+
+        out = self._emit(text)
+        if line_done:
+            self._line_closed = True
+            if not self._has_content:
+                self._blanks.append('rule' if self._hr else 'blank')
+        return out
+
+    def _emit(self, text):
+        if not self._has_content:
+            stripped = text.lstrip()
+            self._line_ws += text[:len(text) - len(stripped)]
+            if not stripped:
+                return ""
+            text = stripped
+            prefix = ""
+            if self._started:
+                prefix = self._held + ("\n\n" if self._blanks else "\n") + self._line_ws
+            self._started = True
+            self._has_content = True
+            self._blanks = []
+            self._line_ws = ""
+        else:
+            if not text.strip():
+                self._held += text
+                return ""
+            prefix = self._held
+
+        body = text.rstrip()
+        self._held = text[len(body):]
+        return self._normalize(prefix + body)
+
+    def _normalize(self, text):
+        if not self.normalize_bangla:
+            return text
+        text = self._norm_pending + text
+        tail = BANGLA_TAIL.search(text).start()
+        self._norm_pending = text[tail:]
+        return normalize_bangla(text[:tail])
+
+
+# Bangla replies are normalized before TTS (Bangla digits, no thousands
+# separators, % as শতাংশ); the text shown to the user is left as is.
+NORMALIZE_BANGLA_SPEECH = os.environ.get("NORMALIZE_BANGLA_SPEECH", "1") == "1"
+
+
+def speakable(text, language_code):
+    if NORMALIZE_BANGLA_SPEECH and language_code.startswith('bn'):
+        return normalize_bangla(text)
+    return text
+
+
+def sanitize_for_speech(text, normalize_bangla=False):
+    """
+    Remove markdown formatting from a complete response for TTS.
+    """
+    if not text:
+        return text
+    with timed('sanitize'):
+        sanitizer = SpeechSanitizer(normalize_bangla=normalize_bangla)
+        return sanitizer.feed(text) + sanitizer.flush()
@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import Overloaded, acquire_upstream, current_deadline
+from metrics import STAGE_QUEUE_SECONDS, record_stage
+
+# Worker threads per upstream stage. The Google clients are blocking, so each
+# stage gets its own bounded pool: a slow Gemini call can then only hold up
+# other Gemini calls, never STT/TTS or the event loop itself.
+STAGE_WORKERS = {
+    'stt': int(os.environ.get("STT_WORKERS", 32)),
+    'gemini': int(os.environ.get("GEMINI_WORKERS", 32)),
+    'tts': int(os.environ.get("TTS_WORKERS", 32)),
+    # Lesson file loads (concurrent loads of one lesson share a single parse)
+    'lessons': int(os.environ.get("LESSON_WORKERS", 4)),
+    # Audio decode and silence trimming before STT
+    'audio': int(os.environ.get("AUDIO_WORKERS", 4)),
+    # Image decode/resize/encode before detection and upload
+    'image': int(os.environ.get("IMAGE_WORKERS", 4)),
+    # TTS cache disk reads for /audio links
+    'cache': int(os.environ.get("CACHE_WORKERS", 4)),
+    # Local CPU inference: batches are already parallel inside the model
+    'vision': int(os.environ.get("VISION_WORKERS", 1)),
+}
+
+_executors = {}
+
+
+def get_executor(stage):
+    """
+    Return the thread pool for an upstream stage, creating it on first use.
+    """
+    if stage not in STAGE_WORKERS:
+        raise ValueError(f"Unknown pipeline stage: {stage}")
+
+    executor = _executors.get(stage)
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=STAGE_WORKERS[stage],
+            thread_name_prefix=f"{stage}-worker"
+        )
+        _executors[stage] = executor
+    return executor
+
+
+async def run_stage(stage, func, *args, **kwargs):
+    """
+    Run a blocking upstream call in its stage pool without blocking the event loop.
+
+    Args:
+        stage (str): One of 'stt', 'gemini', 'tts', 'lessons', 'audio', 'image', 'cache' or 'vision'.
+        func (callable): The blocking function to call.
+        *args, **kwargs: Passed through to func.
+
+    Returns:
+        Whatever func returns.
+
+    The call is timed as the stage (including any wait for a free worker) and
+    runs in a copy of the caller's context, so timings recorded inside it end
+    up in the same request's Server-Timing header.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    submitted = time.perf_counter()
+    limiter = await acquire_upstream(stage)
+    started = time.perf_counter()
+
+    def call():
+        STAGE_QUEUE_SECONDS.observe(time.perf_counter() - submitted, stage=stage)
+        return context.run(func, *args, **kwargs)
+
+    future = loop.run_in_executor(get_executor(stage), call)
+    if limiter is not None:
+        # The slot is held until the worker is really done, even if the caller gave up
+        future.add_done_callback(lambda f: limiter.release(time.perf_counter() - started))
+    try:
+        deadline = current_deadline() if limiter is not None else None
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        # asyncio.wait leaves the call running if the caller is cancelled or times out
+        done, _ = await asyncio.wait({future}, timeout=timeout)
+        if not done:
+            future.add_done_callback(_ignore_result)
+            raise Overloaded(stage, 'deadline', limiter.retry_after())
+        return future.result()
+    finally:
+        record_stage(stage, time.perf_counter() - submitted, kwargs.get('language_code'))
+
+
+def _ignore_result(future):
+    if not future.cancelled():
+        future.exception()
+
+
+async def iterate_stage(stage, func, *args, **kwargs):
+    """
+    Drive a blocking generator in its stage pool and yield its items on the event loop.
+
+    The generator always runs to completion in the worker thread, even if the
+    consumer stops early, so side effects at its end (e.g. chat history updates)
+    still happen. Like run_stage, it raises Overloaded if the request's deadline
+    passes before the generator is done.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    finished = object()
+    context = contextvars.copy_context()
+    submitted = time.perf_counter()
+    limiter = await acquire_upstream(stage)
+    started = time.perf_counter()
+
+    def deliver(item, error=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            pass  # event loop already closed
+
+    def produce():
+        STAGE_QUEUE_SECONDS.observe(time.perf_counter() - submitted, stage=stage)
+        try:
+            for item in func(*args, **kwargs):
+                deliver(item)
+        except Exception as e:
+            deliver(finished, e)
+        else:
+            deliver(finished)
+        finally:
+            record_stage(stage, time.perf_counter() - submitted, kwargs.get('language_code'))
+            if limiter is not None:
+                try:
+                    loop.call_soon_threadsafe(limiter.release, time.perf_counter() - started)
+                except RuntimeError:
+                    pass  # event loop already closed
+
+    loop.run_in_executor(get_executor(stage), context.run, produce)
+    deadline = current_deadline() if limiter is not None else None
+    while True:
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            item, error = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            # The generator still runs to completion in its worker, as when the consumer stops early
+            raise Overloaded(stage, 'deadline', limiter.retry_after())
+        if item is finished:
+            if error is not None:
+                raise error
+            return
+        yield item
+
+
+def shutdown_executors(wait=True):
+    """
+    Shut down all stage pools (called on application shutdown).
+    """
+    for executor in _executors.values():
+        executor.shutdown(wait=wait)
+    _executors.clear()
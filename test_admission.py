@@ -0,0 +1,106 @@
+"""
+Tests for the upstream limiters in admission.py (no server needed):
+
+    python -m pytest -q test_admission.py
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from admission import Overloaded, UpstreamLimiter, lane_for_path
+
+
+def test_interactive_lane_is_served_before_voice():
+    async def scenario():
+        limiter = UpstreamLimiter('tts', limit=1, max_queue=8)
+        await limiter.acquire('voice')
+        order = []
+
+        async def call(lane, name):
+            await limiter.acquire(lane)
+            order.append(name)
+            limiter.release()
+
+        # Voice turns queue first, then an interactive call arrives
+        waiters = [asyncio.ensure_future(call('voice', f"voice{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        waiters.append(asyncio.ensure_future(call('interactive', "tts")))
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == {'interactive': 1, 'voice': 3}
+
+        limiter.release()
+        await asyncio.gather(*waiters)
+        assert order == ["tts", "voice0", "voice1", "voice2"]
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_and_deadline_are_shed():
+    async def scenario():
+        limiter = UpstreamLimiter('stt', limit=1, max_queue=1)
+        await limiter.acquire('voice')
+        queued = asyncio.ensure_future(limiter.acquire('voice'))
+        await asyncio.sleep(0)
+
+        # The voice queue is full, the interactive lane still has room
+        with pytest.raises(Overloaded) as full:
+            await limiter.acquire('voice')
+        assert (full.value.status_code, full.value.reason) == (429, 'queue_full')
+        assert full.value.retry_after >= 1
+
+        start = time.monotonic()
+        with pytest.raises(Overloaded) as late:
+            await limiter.acquire('interactive', deadline=time.monotonic() + 0.05)
+        assert late.value.status_code == 503
+        assert time.monotonic() - start < 1
+        assert limiter.stats()["queued"] == {'interactive': 0, 'voice': 1}
+
+        # The slot goes to the caller still waiting, not to the one that gave up
+        limiter.release()
+        await queued
+        assert limiter.active == 1 and limiter.rejected == 2
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_lanes_follow_paths():
+    assert lane_for_path("/tts") == 'interactive'
+    assert lane_for_path("/tts/stream") == 'interactive'
+    assert lane_for_path("/lessons") == 'interactive'
+    assert lane_for_path("/lesson/start") == 'interactive'
+    assert lane_for_path("/chat/audio") == 'voice'
+    assert lane_for_path("/lesson/audio") == 'voice'
+
+
+def test_streamed_call_is_shed_at_the_deadline(monkeypatch):
+    import admission
+    from stages import iterate_stage
+
+    limiter = UpstreamLimiter('gemini', limit=1, max_queue=1)
+    monkeypatch.setitem(admission.limiters, 'gemini', limiter)
+
+    def slow_tokens():
+        yield "first"
+        time.sleep(0.5)
+        yield "late"
+
+    async def scenario():
+        admission._deadline.set(time.monotonic() + 0.1)
+        tokens = []
+        start = time.monotonic()
+        with pytest.raises(Overloaded) as late:
+            async for token in iterate_stage('gemini', slow_tokens):
+                tokens.append(token)
+        assert (late.value.status_code, late.value.reason) == (503, 'deadline')
+        assert tokens == ["first"] and time.monotonic() - start < 0.4
+        # The slot is held until the generator has really finished
+        assert limiter.active == 1
+        await asyncio.sleep(0.6)
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+"""
+Tests for the audio front-end (silence trimming before STT). Clips are
+synthesized, so no recordings or ffmpeg are needed:
+
+    python -m pytest -q test_audio_frontend.py
+"""
+
+import math
+import random
+from array import array
+
+from audio_frontend import encode_wav, preprocess_audio, speech_segments
+
+RATE = 16000
+
+
+def noise(seconds, amplitude=30, rng=random.Random(0)):
+    return [int(rng.gauss(0, amplitude)) for _ in range(int(seconds * RATE))]
+
+
+def voice(seconds, amplitude=6000):
+    """A 220 Hz tone with some noise: loud enough to count as speech."""
+    return [int(amplitude * math.sin(2 * math.pi * 220 * i / RATE)) + n for i, n in enumerate(noise(seconds))]
+
+
+def test_silence_around_speech_is_trimmed():
+    clip = encode_wav(noise(1.5) + voice(1.0) + noise(0.2) + voice(0.8) + noise(2.0), RATE)
+    audio, encoding, rate, stats = preprocess_audio(clip, 'LINEAR16', 16000)
+
+    assert (encoding, rate, stats["has_speech"], stats["trimmed"]) == ('LINEAR16', RATE, True, True)
+    assert stats["duration_ms"] == 5500
+    # 2 s of speech (the short pause is kept) plus the padding on both sides
+    assert 2000 <= stats["sent_ms"] <= 2600
+    assert len(audio) < len(clip) / 2
+
+
+def test_clip_without_speech_is_rejected():
+    _, _, _, stats = preprocess_audio(encode_wav(noise(3.0), RATE), 'LINEAR16')
+    assert not stats["has_speech"]
+
+    _, _, _, stats = preprocess_audio(encode_wav([0] * RATE, RATE), 'LINEAR16')
+    assert not stats["has_speech"]
+
+
+def test_undecodable_clip_is_passed_through():
+    audio, encoding, rate, stats = preprocess_audio(b'not a wav file', 'LINEAR16', 16000)
+    assert (audio, encoding, rate) == (b'not a wav file', 'LINEAR16', 16000)
+    assert stats["has_speech"] and not stats["trimmed"]
+
+
+def test_speech_segments_split_at_long_pauses():
+    samples = array('h', noise(0.5) + voice(0.6) + noise(1.0) + voice(0.4) + noise(0.5))
+    segments = speech_segments(samples, RATE, pad_ms=0)
+
+    assert len(segments) == 2
+    assert abs(segments[0][0] / RATE - 0.5) < 0.05
+    assert abs(segments[1][1] / RATE - 2.5) < 0.05
@@ -0,0 +1,51 @@
+"""
+Tests for the token-budgeted chat history (chat_history.py):
+
+    python -m pytest -q test_chat_history.py
+"""
+
+from chat_history import (SUMMARY_MARKER, compact_history, count_tokens, history_tokens,
+                          split_summary)
+
+
+def turn(i):
+    return [
+        {"role": 'user', "parts": [f"প্রশ্ন {i}: সূর্য কেন এত উজ্জ্বল?"]},
+        {"role": 'model', "parts": [f"উত্তর {i}. সূর্য একটি নক্ষত্র। " + "এর কেন্দ্রে পারমাণবিক বিক্রিয়া চলে। " * 8]},
+    ]
+
+
+def test_token_estimate():
+    assert count_tokens("") == 0
+    assert count_tokens("The sun is a star.") == 6
+    assert count_tokens("১৯৭১") == 2
+    # Bangla needs more tokens per character than English
+    assert count_tokens("সূর্য একটি নক্ষত্র") > count_tokens("The sun is a star") > 0
+
+
+def test_history_stays_within_budget_over_a_long_session():
+    history = []
+    compactions = 0
+    for i in range(150):
+        history += turn(i)
+        compacted = compact_history(history, budget=1500)
+        if compacted is not None:
+            compactions += 1
+            history = compacted
+        assert history_tokens(history) <= 1500
+
+    # Compacting down to well under the budget means it isn't needed every turn
+    assert 5 < compactions < 75
+    summary, turns = split_summary(history)
+    assert history[0]["parts"][0].startswith(SUMMARY_MARKER)
+    assert [m["role"] for m in history] == ['user', 'model'] * len(history[::2])
+    # The newest turns are kept verbatim, the oldest folded turns were dropped from the summary
+    assert turns[-1] == turn(149)
+    assert "প্রশ্ন 148" not in summary and "প্রশ্ন 0:" not in summary
+    assert summary.splitlines()[-1].startswith("- User: প্রশ্ন")
+
+
+def test_short_history_is_left_alone():
+    history = turn(1) + turn(2)
+    assert compact_history(history, budget=5000) is None
+    assert compact_history(history, budget=0) is None
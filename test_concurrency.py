@@ -0,0 +1,325 @@
+"""
+Offline concurrency test for the voice pipeline.
+The Google backends are replaced with stubs that just sleep, so this runs
+without credentials or network access:
+
+    python -m pytest -q test_concurrency.py
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+import app as api
+
+STAGE_DELAY = 0.2   # seconds each stubbed upstream call takes
+CONCURRENT_TURNS = 24
+
+
+def fake_stt(audio_bytes, rate=None, encoding=None, language_code='bn-BD'):
+    time.sleep(STAGE_DELAY)
+    return "আমি বাংলায় কথা বলতে পারি।"
+
+
+def fake_send_message(user_msg, mode='chat', language_code='bn-BD', **kwargs):
+    time.sleep(STAGE_DELAY)
+    return f"**{user_msg}**"
+
+
+def fake_tts(text, output_file=None, language_code='bn-BD', return_bytes=False, **kwargs):
+    time.sleep(STAGE_DELAY)
+    return b"RIFF" + text.encode('utf-8')
+
+
+def test_concurrent_voice_turns(monkeypatch, install_fakes):
+    """N overlapping /chat/audio turns should finish in about the time of one."""
+    install_fakes()
+    monkeypatch.setattr(api, "runSTT_from_bytes", fake_stt)
+    monkeypatch.setattr(api, "send_message", fake_send_message)
+    monkeypatch.setattr(api, "runTTS", fake_tts)
+
+    with TestClient(api.app) as client:
+        def voice_turn(i):
+            return client.post(
+                "/chat/audio",
+                files={'audio': ('audio.webm', b'\x1a\x45\xdf\xa3', 'audio/webm')},
+                data={'language_code': 'bn-BD'}
+            )
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=CONCURRENT_TURNS) as pool:
+            responses = list(pool.map(voice_turn, range(CONCURRENT_TURNS)))
+        elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json()["assistant_text"] == "আমি বাংলায় কথা বলতে পারি।" for r in responses)
+
+    single_turn = 3 * STAGE_DELAY
+    print(f"{CONCURRENT_TURNS} concurrent turns took {elapsed:.2f}s (one turn ~{single_turn:.2f}s)")
+    # Serialized on the event loop this would take CONCURRENT_TURNS * single_turn.
+    assert elapsed < single_turn * 3
+
+
+def test_fake_backends_serve_load_test_endpoints(install_fakes):
+    """Every endpoint loadtest.py drives works end to end on the fake backends."""
+    fakes = install_fakes(stt_latency='0', gemini_latency='0', tts_latency='0', vision_latency='0')
+
+    audio = ('audio.webm', b'\x1a\x45\xdf\xa3', 'audio/webm')
+    image = ('bus.jpg', (Path(__file__).parent / "bus.jpg").read_bytes(), 'image/jpeg')
+    form = {'language_code': 'bn-BD', 'audio_format': 'mp3', 'audio_delivery': 'url'}
+
+    with TestClient(api.app) as client:
+        topic = client.get("/lessons").json()[0]["id"]
+        responses = [
+            client.post("/chat/audio", files={'audio': audio}, data=form),
+            client.post("/lesson/audio", files={'audio': audio}, data={**form, 'topic': topic}),
+            client.post("/objects/detect", files={'audio': audio, 'image': image}, data=form),
+            client.post("/tts", json={'text': "পরীক্ষা", 'audio_format': 'mp3', 'audio_delivery': 'binary'}),
+        ]
+        assert [r.status_code for r in responses] == [200, 200, 200, 200]
+        assert client.get(responses[0].json()["audio_url"]).status_code == 200
+
+    assert responses[2].json()["detections"][0]["label"] == "bus"
+    # The three replies are the same text, so TTS may be served from the cache
+    assert (fakes.calls['stt'], fakes.calls['gemini'], fakes.calls['vision']) == (3, 3, 1)
+
+
+def test_server_timing_and_metrics(install_fakes):
+    """Voice turns report their stages in Server-Timing and on /metrics."""
+    install_fakes(stt_latency='0', gemini_latency='0', tts_latency='0')
+
+    with TestClient(api.app) as client:
+        response = client.post(
+            "/chat/audio",
+            files={'audio': ('audio.webm', b'\x1a\x45\xdf\xa3', 'audio/webm')},
+            data={'language_code': 'bn-BD'}
+        )
+        metrics = client.get("/metrics").text
+
+    stages = [entry.split(';')[0] for entry in response.headers["server-timing"].split(', ')]
+    assert {'stt', 'gemini', 'sanitize', 'tts', 'base64', 'total'} <= set(stages)
+    assert 'voice_stage_seconds_count{stage="gemini",language="bn"}' in metrics
+    assert 'http_requests_total{endpoint="chat_with_audio",method="POST",status="200"}' in metrics
+
+
+def test_lesson_openers_are_generated_once(monkeypatch, install_fakes):
+    """Concurrent /lesson/start calls share one opener; each session is still seeded."""
+    monkeypatch.setattr(api, "lesson_openers", api.LessonOpenerCache())
+    fakes = install_fakes(gemini_latency='200', tts_latency='0')
+
+    with TestClient(api.app) as client:
+        topic = client.get("/lessons").json()[0]["id"]
+
+        def start(i):
+            return client.post("/lesson/start", json={'topic': topic, 'audio_format': 'mp3', 'audio_delivery': 'url'},
+                               headers={'X-Session-Id': f"learner-{i}"})
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(start, range(8)))
+
+    assert [r.status_code for r in responses] == [200] * 8
+    assert len({r.json()["assistant_text"] for r in responses}) == 1
+    assert (fakes.calls['gemini'], fakes.calls['seed']) == (1, 8)
+
+
+def test_readiness_waits_for_background_warm_up(monkeypatch):
+    """The app serves /healthz at once; /readyz turns 200 only when the warm-up is done."""
+    monkeypatch.setenv("WARM_UP_CLIENTS", "1")
+    monkeypatch.setenv("WARM_UP_BACKGROUND", "1")
+    monkeypatch.setattr(api, "OBJECT_DETECTOR_ENABLED", False)
+    monkeypatch.setattr(api, "warm_up_state", {"done": False, "components": {}})
+    released = threading.Event()
+    for name in ("warm_up_stt", "warm_up_tts", "warm_up_gemini"):
+        monkeypatch.setattr(api, name, lambda: released.wait(10))
+
+    with TestClient(api.app) as client:
+        assert client.get("/healthz").status_code == 200
+        assert client.get("/readyz").status_code == 503
+        released.set()
+        deadline = time.monotonic() + 5
+        while client.get("/readyz").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        ready = client.get("/readyz")
+
+    assert ready.status_code == 200
+    assert ready.json() == {"status": "ready", "components": {"stt": True, "tts": True, "gemini": True}}
+
+
+def test_silent_clip_never_reaches_stt(install_fakes):
+    """A clip with no speech is rejected by the audio front-end, without an STT call."""
+    from audio_frontend import encode_wav
+
+    fakes = install_fakes(stt_latency='0', gemini_latency='0', tts_latency='0')
+
+    silence = encode_wav([0] * 16000 * 3, 16000)
+    with TestClient(api.app) as client:
+        response = client.post("/chat/audio", files={'audio': ('audio.wav', silence, 'audio/wav')},
+                               data={'language_code': 'bn-BD'})
+
+    assert response.status_code != 200
+    assert "No speech detected" in response.json()["detail"]
+    assert fakes.calls['stt'] == 0 and fakes.calls['gemini'] == 0
+
+
+def test_identical_tts_requests_are_coalesced(install_fakes):
+    """100 clients asking /tts for the same quiz question at once cause one synthesis."""
+    fakes = install_fakes(tts_latency='300')
+
+    body = {'text': "প্রশ্ন ৩: পৃথিবী কোন গ্রহ?", 'audio_format': 'mp3', 'audio_delivery': 'binary'}
+    with TestClient(api.app) as client:
+        with ThreadPoolExecutor(max_workers=100) as pool:
+            responses = list(pool.map(lambda _: client.post("/tts", json=body), range(100)))
+        metrics = client.get("/metrics").text
+
+    assert [r.status_code for r in responses] == [200] * 100
+    assert fakes.calls['tts'] == 1
+    assert 'single_flight_calls_total{group="tts",result="shared"}' in metrics
+
+
+def test_overload_is_shed_and_tts_stays_fast(monkeypatch, install_fakes):
+    """Past the STT limit and queue, voice turns get 429 + Retry-After while /tts is still served."""
+    import admission
+
+    monkeypatch.setitem(admission.limiters, 'stt', admission.UpstreamLimiter('stt', limit=2, max_queue=2))
+    fakes = install_fakes(stt_latency='500', gemini_latency='0', tts_latency='0')
+
+    def voice_turn(i):
+        return client.post("/chat/audio", files={'audio': ('audio.webm', b'\x1a\x45\xdf\xa3', 'audio/webm')},
+                           data={'language_code': 'bn-BD'})
+
+    with TestClient(api.app) as client:
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            turns = [pool.submit(voice_turn, i) for i in range(12)]
+            time.sleep(0.2)
+            start = time.perf_counter()
+            tts = client.post("/tts", json={'text': "নমস্কার", 'audio_delivery': 'binary'})
+            tts_elapsed = time.perf_counter() - start
+            responses = [turn.result() for turn in turns]
+
+    statuses = [r.status_code for r in responses]
+    assert statuses.count(200) == 4 and statuses.count(429) == 8
+    assert all(int(r.headers["Retry-After"]) >= 1 for r in responses if r.status_code == 429)
+    assert tts.status_code == 200 and tts_elapsed < 0.5
+    assert fakes.calls['stt'] == 4
+
+
+def test_coalesced_and_cached_tts_requests_skip_admission(monkeypatch, install_fakes):
+    """Requests joining a synthesis or hitting the memory cache don't take a TTS slot."""
+    import admission
+
+    tts_limiter = admission.UpstreamLimiter('tts', limit=1, max_queue=0)
+    monkeypatch.setitem(admission.limiters, 'tts', tts_limiter)
+    fakes = install_fakes(tts_latency='300')
+
+    body = {'text': "প্রশ্ন ৪: চাঁদ কী?", 'audio_format': 'mp3', 'audio_delivery': 'binary'}
+    with TestClient(api.app) as client:
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            responses = list(pool.map(lambda _: client.post("/tts", json=body), range(20)))
+        cached = client.post("/tts", json=body)
+
+    assert [r.status_code for r in responses] == [200] * 20
+    assert cached.status_code == 200 and cached.content == responses[0].content
+    assert fakes.calls['tts'] == 1
+    assert tts_limiter.rejected == 0
+
+
+def voice_turn_messages(ws, chunks=(), end=True, chunk_interval=0.0):
+    ws.send_json({"type": "start", "mode": "chat", "language_code": "bn-BD", "audio_delivery": "url"})
+    for chunk in chunks:
+        ws.send_bytes(chunk)
+        time.sleep(chunk_interval)
+    if end:
+        ws.send_json({"type": "end"})
+    messages = []
+    while not messages or messages[-1]["type"] not in ("reply", "error"):
+        messages.append(ws.receive_json())
+    return messages
+
+
+def test_voice_websocket_turns_end_on_idle_and_max_length(monkeypatch, install_fakes):
+    """A /ws/voice utterance ends on "end", after an idle gap, or at the length limit, freeing its STT slot."""
+    import admission
+
+    monkeypatch.setattr(api, "VOICE_IDLE_TIMEOUT_SECONDS", 0.3)
+    monkeypatch.setattr(api, "VOICE_MAX_UTTERANCE_SECONDS", 1.0)
+    stt_limiter = admission.UpstreamLimiter('stt', limit=1, max_queue=0)
+    monkeypatch.setitem(admission.limiters, 'stt', stt_limiter)
+    fakes = install_fakes(stt_latency='0', gemini_latency='0', tts_latency='0')
+
+    with TestClient(api.app) as client:
+        with client.websocket_connect("/ws/voice") as ws:
+            ended = voice_turn_messages(ws, [b'\x1a\x45\xdf\xa3'] * 3)
+            start = time.perf_counter()
+            idle = voice_turn_messages(ws, [b'\x1a\x45\xdf\xa3'], end=False)
+            idle_elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            too_long = voice_turn_messages(ws, [b'\x1a\x45\xdf\xa3'] * 15, end=False, chunk_interval=0.1)
+            too_long_elapsed = time.perf_counter() - start
+            silent = voice_turn_messages(ws, end=False)
+
+    types = [m["type"] for m in ended]
+    assert types[0] == "interim" and types[-2:] == ["final", "reply"]
+    assert ended[-1]["user_text"] == ended[-2]["text"] and ended[-1]["audio_url"].startswith("/audio/")
+
+    assert {"type": "endpoint", "reason": "idle"} in idle and idle[-1]["type"] == "reply"
+    assert 0.3 <= idle_elapsed < 1.0
+    assert {"type": "endpoint", "reason": "max_length"} in too_long and too_long[-1]["type"] == "reply"
+    assert 1.0 <= too_long_elapsed < 2.0
+    assert silent[-2:] == [{"type": "final", "text": ""}, {"type": "error", "detail": "No speech detected"}]
+
+    assert fakes.calls['stt'] == 4 and fakes.calls['gemini'] == 3
+    assert stt_limiter.active == 0 and stt_limiter.rejected == 0
+
+
+def test_voice_websocket_rejects_bad_start_messages(install_fakes):
+    """An invalid start message gets an error frame; the socket stays open for the next turn."""
+    fakes = install_fakes(stt_latency='0', gemini_latency='0', tts_latency='0')
+
+    bad_starts = [
+        {"type": "start", "mode": "object_detection"},
+        {"type": "start", "language_code": "xx; DROP"},
+        {"type": "start", "language_code": None},
+        {"type": "start", "audio_format": "flac"},
+    ]
+    with TestClient(api.app) as client:
+        with client.websocket_connect("/ws/voice") as ws:
+            errors = []
+            for start in bad_starts:
+                ws.send_json(start)
+                errors.append(ws.receive_json())
+            ws.send_text("not json")
+            errors.append(ws.receive_json())
+
+            reply = voice_turn_messages(ws, [b'\x1a\x45\xdf\xa3'])
+
+    assert [e["type"] for e in errors] == ["error"] * 5
+    assert "Unsupported mode: object_detection" in errors[0]["detail"]
+    assert "Unsupported language_code" in errors[1]["detail"] and "Unsupported language_code" in errors[2]["detail"]
+    assert "Unsupported audio format: flac" in errors[3]["detail"]
+    assert reply[-1]["type"] == "reply"
+    assert fakes.calls['stt'] == 1
+
+
+def test_tts_shed_mid_stream_ends_with_an_error_event(monkeypatch, install_fakes):
+    """A sentence shed after the stream started is reported as an SSE error with retry_after and its index."""
+    import admission
+
+    monkeypatch.setitem(admission.limiters, 'tts', admission.UpstreamLimiter('tts', limit=1, max_queue=0))
+    fakes = install_fakes(tts_latency='200')
+
+    text = " ".join(f"This is sentence number {i} of a long answer that is read aloud." for i in range(3))
+    with TestClient(api.app) as client:
+        response = client.post("/tts/stream", json={'text': text, 'language_code': 'en-US'})
+
+    assert response.status_code == 200
+    events = [(block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+              for block in response.text.strip().split("\n\n")]
+    assert [name for name, _ in events] == ["audio", "error"]
+    assert events[0][1]["index"] == 0
+    error = events[1][1]
+    assert error["index"] == 1 and error["status"] == 429 and error["retry_after"] >= 1
+    assert fakes.calls['tts'] == 1
@@ -0,0 +1,170 @@
+"""
+Tests for the Gemini chat wrapper (Gemini.py) with a fake model in place of
+Vertex AI, so no credentials are needed:
+
+    python -m pytest -q test_gemini.py
+"""
+
+from collections import OrderedDict
+
+import pytest
+
+import Gemini
+from session_store import SessionStore
+
+pytest.importorskip("vertexai")
+
+
+class FinishChunk:
+    """The last streamed chunk has a finish reason but no text parts."""
+
+    @property
+    def text(self):
+        raise ValueError("no text parts")
+
+
+class TextChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeChat:
+    """Adds the turn to its history once the reply is complete, like ChatSession."""
+
+    def __init__(self, history=None):
+        self.history = list(history or [])
+
+    def reply_to(self, message):
+        return f"Reply {len(self.history) // 2 + 1} to: {message.splitlines()[-1]}"
+
+    def _record(self, message, reply):
+        from vertexai.generative_models import Content, Part
+        self.history += [
+            Content(role='user', parts=[Part.from_text(message)]),
+            Content(role='model', parts=[Part.from_text(reply)]),
+        ]
+
+    def send_message(self, message, stream=False):
+        reply = self.reply_to(message)
+        if not stream:
+            self._record(message, reply)
+            return TextChunk(reply)
+
+        def chunks():
+            words = reply.split(" ")
+            for i, word in enumerate(words):
+                yield TextChunk(word if i == 0 else " " + word)
+            yield FinishChunk()
+            self._record(message, reply)
+        return chunks()
+
+
+class FakeModel:
+    def __init__(self, model_name, system_instruction=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def start_chat(self, history=None):
+        return FakeChat(history)
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    monkeypatch.setattr(Gemini, "GenerativeModel", FakeModel)
+    monkeypatch.setattr(Gemini, "_models", OrderedDict())
+    monkeypatch.setattr(Gemini, "session_backend", None)
+    monkeypatch.setattr(Gemini, "chat_sessions", SessionStore(sizeof=Gemini.estimate_session_bytes))
+    return Gemini
+
+
+def test_streamed_reply_is_recorded_in_the_history(fake_gemini):
+    tokens = list(Gemini.send_message_stream("What is the Sun?", session_id='learner-1'))
+    assert tokens == ["Reply", " 1", " to:", " What", " is", " the", " Sun?"]
+
+    chat = Gemini.chat_sessions.get(Gemini.get_session_key('chat', 'bn-BD', session_id='learner-1'))
+    assert Gemini.serialize_history(chat.history) == [
+        {"role": 'user', "parts": ["What is the Sun?"]},
+        {"role": 'model', "parts": ["".join(tokens)]},
+    ]
+
+    # The next turn, streamed or not, continues the same conversation
+    assert Gemini.send_message("And the Moon?", session_id='learner-1') == "Reply 2 to: And the Moon?"
+    assert "".join(Gemini.send_message_stream("Thanks!", session_id='learner-1')) == "Reply 3 to: Thanks!"
+    history = Gemini.serialize_history(chat.history)
+    assert [m["role"] for m in history] == ['user', 'model'] * 3
+    assert history[-1]["parts"] == ["Reply 3 to: Thanks!"]
+
+
+def test_streamed_history_matches_the_blocking_call(fake_gemini):
+    grounding = "Relevant parts of the lesson:\nThe Sun is a star."
+    streamed = "".join(Gemini.send_message_stream("What is the Sun?", mode='lesson_delivery', topic='solar_system',
+                                                  session_id='streamed', grounding=grounding))
+    blocking = Gemini.send_message("What is the Sun?", mode='lesson_delivery', topic='solar_system',
+                                   session_id='blocking', grounding=grounding)
+    assert streamed == blocking
+
+    histories = [
+        Gemini.serialize_history(Gemini.chat_sessions.get(
+            Gemini.get_session_key('lesson_delivery', 'bn-BD', 'solar_system', session_id)).history)
+        for session_id in ('streamed', 'blocking')
+    ]
+    assert histories[0] == histories[1]
+    # Retrieved passages are sent with the turn but not kept in the history
+    assert histories[0][0] == {"role": 'user', "parts": ["What is the Sun?"]}
+
+
+def test_history_is_saved_only_once_the_stream_is_consumed(fake_gemini):
+    stream = Gemini.send_message_stream("What is the Sun?", session_id='learner-2')
+    assert next(stream) == "Reply"
+    chat = Gemini.chat_sessions.get(Gemini.get_session_key('chat', 'bn-BD', session_id='learner-2'))
+    assert chat.history == []
+
+    list(stream)
+    assert len(chat.history) == 2
+    assert Gemini.chat_sessions.stats()["estimated_bytes"] == Gemini.estimate_session_bytes(chat) > 0
+
+
+def test_model_is_chosen_per_mode(fake_gemini):
+    assert Gemini.get_model_name('object_detection') == "gemini-2.0-flash-exp"
+    for mode in ('chat', 'lesson_delivery'):
+        assert Gemini.get_model_name(mode) == "gemini-2.5-flash-lite"
+
+    assert Gemini.get_model('object_detection', 'en-US').model_name == "gemini-2.0-flash-exp"
+    chat = Gemini.get_model('chat', 'en-US')
+    assert chat.model_name == "gemini-2.5-flash-lite"
+    assert chat.system_instruction == Gemini.get_system_prompts()['chat']['en']
+
+
+def test_prepared_models_are_reused_per_settings(fake_gemini):
+    model = Gemini.get_model('lesson_delivery', 'bn-BD', 'sun', "The Sun is a star.")
+    assert Gemini.get_model('lesson_delivery', 'bn-BD', 'sun', "The Sun is a star.") is model
+    assert model.system_instruction.endswith("The Sun is a star.")
+
+    # A new lesson version, language or mode gets its own model
+    assert Gemini.get_model('lesson_delivery', 'bn-BD', 'sun', "The Sun is a big star.") is not model
+    assert Gemini.get_model('lesson_delivery', 'en-US', 'sun', "The Sun is a star.") is not model
+    assert Gemini.get_model('chat', 'bn-BD') is not model
+    assert len(Gemini._models) == 4
+
+
+def test_registry_is_bounded(fake_gemini, monkeypatch):
+    monkeypatch.setattr(Gemini, "MAX_CACHED_MODELS", 2)
+    first = Gemini.get_model('chat', 'bn-BD')
+    Gemini.get_model('chat', 'en-US')
+    assert Gemini.get_model('chat', 'bn-BD') is first  # now the most recently used
+    Gemini.get_model('object_detection', 'bn-BD')
+
+    assert len(Gemini._models) == 2
+    assert Gemini.get_model('chat', 'bn-BD') is first
+    assert Gemini.get_model('chat', 'en-US').system_instruction == Gemini.get_system_prompts()['chat']['en']
+    assert len(Gemini._models) == 2
+
+
+def test_prompt_falls_back_without_lesson_text(fake_gemini):
+    prompts = Gemini.get_system_prompts()['lesson_delivery']
+    # Without lesson text, known legacy topics get a topic line and others the plain prompt
+    assert Gemini.get_model('lesson_delivery', 'en-US', 'world-war-2').system_instruction == (
+        prompts['en'] + "\n\nYou are now teaching about World War 2.")
+    assert Gemini.get_model('lesson_delivery', 'bn-BD', 'unknown').system_instruction == prompts['bn']
+    # Any language other than English uses the Bangla prompt
+    assert Gemini.get_model('lesson_delivery', 'fr-FR', 'unknown').system_instruction == prompts['bn']
@@ -0,0 +1,77 @@
+"""
+Tests for the shared Google client registry (GoogleClients.ClientRegistry),
+with stub clients instead of real ones:
+
+    python -m pytest -q test_google_clients.py
+"""
+
+import pytest
+
+from GoogleClients import ClientRegistry
+
+google_exceptions = pytest.importorskip("google.api_core.exceptions")
+
+
+class StubTransport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class StubClient:
+    def __init__(self, number, fail_with=None):
+        self.number = number
+        self.fail_with = fail_with
+        self.transport = StubTransport()
+
+    def synthesize(self, text):
+        if self.fail_with is not None:
+            raise self.fail_with
+        return f"{text} from client {self.number}"
+
+
+def failing_once_factory(error):
+    built = []
+
+    def factory():
+        client = StubClient(len(built) + 1, fail_with=error if not built else None)
+        built.append(client)
+        return client
+
+    return factory, built
+
+
+def test_client_is_rebuilt_after_a_channel_error():
+    registry = ClientRegistry()
+    factory, built = failing_once_factory(google_exceptions.ServiceUnavailable("channel closed"))
+    registry.register('tts', factory)
+
+    assert registry.call('tts', lambda client: client.synthesize("hello")) == "hello from client 2"
+    assert len(built) == 2 and built[0].transport.closed
+    # The rebuilt client is kept for later calls
+    assert registry.get('tts') is built[1]
+    assert registry.call('tts', lambda client: client.synthesize("again")) == "again from client 2"
+    assert len(built) == 2
+
+
+def test_other_errors_keep_the_client():
+    registry = ClientRegistry()
+    factory, built = failing_once_factory(google_exceptions.InvalidArgument("bad voice"))
+    registry.register('tts', factory)
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        registry.call('tts', lambda client: client.synthesize("hello"))
+    assert len(built) == 1 and registry.get('tts') is built[0]
+    assert not built[0].transport.closed
+
+
+def test_failed_warm_up_drops_the_client():
+    registry = ClientRegistry()
+    factory, built = failing_once_factory(google_exceptions.Unauthenticated("no token"))
+    registry.register('tts', factory, warm_up=lambda client: client.synthesize("warm up"))
+
+    assert registry.warm_up('tts') is False
+    assert registry.warm_up('tts') is True
+    assert len(built) == 2 and registry.get('tts') is built[1]
@@ -0,0 +1,112 @@
+"""
+Tests for the image front-end (image_prep.py). Runs offline:
+
+    python -m pytest -q test_image_prep.py
+"""
+
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app as api
+from image_prep import normalize_image, sniff_image_type
+
+
+def encode(image, format, **kwargs):
+    out = io.BytesIO()
+    image.save(out, format=format, **kwargs)
+    return out.getvalue()
+
+
+def decode(data):
+    return Image.open(io.BytesIO(data))
+
+
+def test_exif_orientation_is_applied():
+    image = Image.new('RGB', (40, 20), (200, 30, 30))
+    exif = image.getexif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise to display
+    data = encode(image, 'JPEG', exif=exif.tobytes())
+
+    output, mime_type, stats = normalize_image(data)
+    assert mime_type == 'image/jpeg'
+    assert (stats["width"], stats["height"]) == (20, 40)
+    upright = decode(output)
+    assert upright.size == (20, 40)
+    assert upright.getexif().get(0x0112, 1) == 1
+
+
+def test_large_images_are_downscaled():
+    data = encode(Image.new('RGB', (3000, 1500), (10, 120, 200)), 'JPEG', quality=95)
+
+    output, _, stats = normalize_image(data, max_side=1024)
+    assert decode(output).size == (1024, 512)
+    assert (stats["width"], stats["height"]) == (1024, 512)
+    assert stats["bytes"] < stats["original_bytes"]
+
+
+def test_other_formats_are_reencoded_as_jpeg():
+    transparent = Image.new('RGBA', (64, 64), (0, 0, 0, 0))
+    output, mime_type, stats = normalize_image(encode(transparent, 'PNG'))
+    assert mime_type == 'image/jpeg' and stats["source_type"] == 'image/png'
+    flattened = decode(output)
+    assert flattened.format == 'JPEG' and flattened.mode == 'RGB'
+    # Transparent pixels are flattened onto white
+    assert flattened.getpixel((32, 32)) == (255, 255, 255)
+
+
+def test_small_upright_jpeg_is_kept_as_is():
+    noise = Image.effect_noise((100, 100), 64).convert('RGB')
+    data = encode(noise, 'JPEG', quality=50)
+    output, _, stats = normalize_image(data, quality=95)
+    assert output == data and stats["bytes"] == stats["original_bytes"]
+
+
+def test_undecodable_known_formats_pass_through():
+    heic = b'\x00\x00\x00\x18ftypheic\x00\x00\x00\x00mif1heic' + bytes(64)
+    assert sniff_image_type(heic) == 'image/heic'
+
+    output, mime_type, stats = normalize_image(heic)
+    assert output == heic and mime_type == 'image/heic'
+    assert stats["bytes"] == stats["original_bytes"] == len(heic)
+
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(ValueError):
+        normalize_image(b'%PDF-1.7 not an image')
+
+
+def test_object_detection_answers_400_for_non_images(install_fakes):
+    fakes = install_fakes(stt_latency='0', gemini_latency='0', tts_latency='0', vision_latency='0')
+
+    with TestClient(api.app) as client:
+        response = client.post("/objects/detect",
+                               files={'audio': ('audio.webm', b'\x1a\x45\xdf\xa3', 'audio/webm'),
+                                      'image': ('notes.pdf', b'%PDF-1.7 not an image', 'application/pdf')},
+                               data={'language_code': 'bn-BD'})
+
+    assert response.status_code == 400
+    assert "Unsupported image format" in response.json()["detail"]
+    assert fakes.calls['gemini'] == 0
+
+
+def test_stt_overload_is_not_masked_by_the_image_error(monkeypatch, install_fakes):
+    from admission import Overloaded
+
+    fakes = install_fakes(stt_latency='0', gemini_latency='0', tts_latency='0', vision_latency='0')
+
+    async def shed_transcription(audio_bytes, language_code, **kwargs):
+        raise Overloaded('stt', 'queue_full', 2)
+
+    monkeypatch.setattr(api, "transcribe_clip", shed_transcription)
+
+    with TestClient(api.app) as client:
+        response = client.post("/objects/detect",
+                               files={'audio': ('audio.webm', b'\x1a\x45\xdf\xa3', 'audio/webm'),
+                                      'image': ('notes.pdf', b'%PDF-1.7 not an image', 'application/pdf')},
+                               data={'language_code': 'bn-BD'})
+
+    assert response.status_code == 429 and response.headers["retry-after"] == "2"
+    assert fakes.calls['gemini'] == 0
@@ -0,0 +1,137 @@
+"""
+Tests for the lesson audio pre-rendering (lesson_audio.py), with a fake TTS:
+
+    python -m pytest -q test_lesson_audio.py
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import GoogleTTS
+from lesson_audio import AUDIO_DIR_NAME, asset_name, attach_quiz_audio, build_lesson, load_manifest
+
+QUIZ = [{
+    "question_en": "What is at the center of the Solar System?",
+    "question_bn": "সৌরজগতের মাঝখানে কী আছে?",
+    "options_en": ["Earth", "The Sun"],
+    "options_bn": ["পৃথিবী", "সূর্য"],
+    "correct_answer_en": "The Sun",
+    "correct_answer_bn": "সূর্য",
+}]
+
+
+def make_lesson(tmp_path, quiz=QUIZ):
+    folder = tmp_path / "solar_system"
+    folder.mkdir(exist_ok=True)
+    (folder / "metadata.json").write_text(json.dumps({"title_en": "The Solar System", "title_bn": "সৌরজগৎ"}),
+                                          encoding='utf-8')
+    (folder / "quiz.json").write_text(json.dumps(quiz, ensure_ascii=False), encoding='utf-8')
+    return folder
+
+
+def fake_tts(monkeypatch, fail=()):
+    spoken = []
+
+    def runTTS(text, return_bytes=False, language_code='bn-BD', use_cache=True, audio_encoding='LINEAR16', **kwargs):
+        assert not use_cache
+        if text in fail:
+            raise RuntimeError("TTS quota exceeded")
+        spoken.append((language_code, text))
+        return f"{language_code}:{audio_encoding}:{text}".encode('utf-8')
+
+    monkeypatch.setattr(GoogleTTS, "runTTS", runTTS)
+    return spoken
+
+
+def build(folder, force=False, audio_format='wav'):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        return build_lesson(folder, executor, force=force, audio_format=audio_format)
+
+
+def test_rebuild_only_synthesizes_changed_strings(monkeypatch, tmp_path):
+    spoken = fake_tts(monkeypatch)
+    folder = make_lesson(tmp_path)
+
+    # 2 titles + per language: question, 2 options (the answer is one of them)
+    assert build(folder) == (8, 0, 0, 0)
+    assert len(spoken) == 8
+    manifest = load_manifest(folder)
+    assert manifest["en:The Sun"] == asset_name("The Sun", 'en')
+    assert manifest["bn:সূর্য"] == asset_name("সূর্য", 'bn')
+    name = manifest["en:Earth"]
+    assert (folder / AUDIO_DIR_NAME / name).read_bytes() == b"en-US:LINEAR16:Earth"
+
+    # Nothing changed: every asset is reused and the manifest stays the same
+    spoken.clear()
+    assert build(folder) == (0, 8, 0, 0)
+    assert spoken == [] and load_manifest(folder) == manifest
+
+    # One option edited: only it is synthesized, and the old file is removed
+    edited = [dict(QUIZ[0], options_en=["Planet Earth", "The Sun"])]
+    make_lesson(tmp_path, edited)
+    assert build(folder) == (1, 7, 1, 0)
+    assert spoken == [('en-US', "Planet Earth")]
+    assert "en:Earth" not in load_manifest(folder)
+    assert not (folder / AUDIO_DIR_NAME / name).exists()
+
+    spoken.clear()
+    assert build(folder, force=True) == (8, 0, 0, 0)
+    assert len(spoken) == 8
+
+
+def test_quiz_gets_asset_urls_from_the_manifest(monkeypatch, tmp_path):
+    fake_tts(monkeypatch)
+    folder = make_lesson(tmp_path)
+    build(folder)
+
+    quiz = attach_quiz_audio(json.loads(json.dumps(QUIZ)), "solar_system", load_manifest(folder))
+    audio = quiz[0]["audio"]
+    assert audio["correct_answer_en"] == f"/lesson/solar_system/audio/{asset_name('The Sun', 'en')}"
+    assert audio["options_bn"] == [f"/lesson/solar_system/audio/{asset_name(option, 'bn')}"
+                                   for option in QUIZ[0]["options_bn"]]
+
+    # Strings without an asset fall back to None (the client then calls /tts)
+    unbuilt = attach_quiz_audio(json.loads(json.dumps(QUIZ)), "solar_system", {})
+    assert unbuilt[0]["audio"]["question_en"] is None
+
+
+def test_strings_are_spoken_like_live_replies(monkeypatch, tmp_path):
+    spoken = fake_tts(monkeypatch)
+    quiz = [dict(QUIZ[0], question_bn="**১,০০০** এর 50% কত?", options_bn=["500", "৫০০"],
+                 correct_answer_bn="৫০০")]
+    folder = make_lesson(tmp_path, quiz)
+
+    # Both options read "৫০০", so they share one asset
+    assert build(folder) == (7, 0, 0, 0)
+    assert ('bn-BD', "১০০০ এর ৫০ শতাংশ কত?") in spoken
+    manifest = load_manifest(folder)
+    assert manifest["bn:500"] == manifest["bn:৫০০"] == asset_name("৫০০", 'bn')
+
+
+def test_failed_strings_are_left_out_and_the_rest_is_written(monkeypatch, tmp_path):
+    spoken = fake_tts(monkeypatch, fail={"Earth"})
+    folder = make_lesson(tmp_path)
+    stale = folder / AUDIO_DIR_NAME / asset_name("Mars", 'en')
+    stale.parent.mkdir()
+    stale.write_bytes(b"old")
+
+    assert build(folder) == (7, 0, 1, 1)
+    assert len(spoken) == 7 and not stale.exists()
+    manifest = load_manifest(folder)
+    assert "en:Earth" not in manifest and len(manifest) == 7
+
+    # The next run retries only the failed string
+    spoken = fake_tts(monkeypatch)
+    assert build(folder) == (1, 7, 0, 0)
+    assert spoken == [('en-US', "Earth")]
+
+
+def test_assets_can_be_rendered_as_mp3(monkeypatch, tmp_path):
+    fake_tts(monkeypatch)
+    folder = make_lesson(tmp_path)
+    build(folder)
+
+    assert build(folder, audio_format='mp3') == (8, 0, 8, 0)
+    name = load_manifest(folder)["en:Earth"]
+    assert name == asset_name("Earth", 'en', 'mp3') and name.endswith(".mp3")
+    assert (folder / AUDIO_DIR_NAME / name).read_bytes() == b"en-US:MP3:Earth"
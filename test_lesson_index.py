@@ -0,0 +1,112 @@
+"""
+Tests for the lesson retrieval index (lesson_index.py):
+
+    python -m pytest -q test_lesson_index.py
+"""
+
+from pathlib import Path
+
+from lesson_index import (LessonIndex, format_passages, index_path, load_or_build, split_passages,
+                          tokenize)
+
+LESSON = Path(__file__).parent / "lessons" / "solar_system"
+
+
+def test_bangla_tokenization():
+    # Vowel signs and conjuncts stay inside words; inflections and digits are normalized
+    assert tokenize("সূর্যের আলো পৃথিবীতে আসে।") == ["সূর্য", "আলো", "পৃথিবী", "আসে"]
+    assert tokenize("১৯৭১ সালে") == tokenize("1971 সাল")
+    assert tokenize("গ্রহগুলো") == tokenize("গ্রহ")
+    assert tokenize("The Planets' orbits and bodies") == ["planet", "orbit", "body"]
+
+
+def test_short_bangla_words_stay_distinct():
+    # Stripping a suffix must not leave a stem that is another word
+    for word, other in (("মাটি", "মা"), ("আমরা", "আম"), ("বাটি", "বা"), ("কাকে", "কা")):
+        assert tokenize(word) != tokenize(other), word
+    assert tokenize("দেশের মানুষেরা") == tokenize("দেশ মানুষ")
+
+
+def test_search_finds_the_matching_passage(tmp_path):
+    text = (LESSON / "content_bn.txt").read_text(encoding='utf-8')
+    index, stats = load_or_build(tmp_path, 'bn', text)
+    assert stats["passages"] == len(split_passages(text)) == len(index)
+
+    results = index.search("বৃহস্পতি আর শনি কেমন গ্রহ?", k=2)
+    assert "বৃহস্পতি" in index.passage(results[0][0])
+    assert results[0][1] > results[1][1] > 0
+    assert index.search("কম্পিউটার", k=2) == []
+    assert format_passages(index, results, 'bn').startswith("পাঠের প্রাসঙ্গিক অংশ:")
+
+
+def test_index_is_persisted_and_rebuilt_incrementally(tmp_path):
+    text = (LESSON / "content_en.txt").read_text(encoding='utf-8')
+    index, stats = load_or_build(tmp_path, 'en', text)
+    assert stats["reused"] == 0
+    assert index_path(tmp_path, 'en').exists()
+
+    # Unchanged text: the file is just mapped again
+    reloaded, stats = load_or_build(tmp_path, 'en', text)
+    assert stats is None
+    assert reloaded.search("rings of Saturn") == index.search("rings of Saturn")
+
+    # One new paragraph: only it is tokenized
+    added = "Comets are icy bodies that grow bright tails of gas and dust when they pass close to the Sun."
+    index, stats = load_or_build(tmp_path, 'en', f"{text}\n\n{added}")
+    assert stats["reused"] == stats["passages"] - 1
+    best, _ = index.search("why do comets have tails", k=1)[0]
+    assert index.passage(best) == added
+    with LessonIndex(index_path(tmp_path, 'en')) as mapped:
+        assert mapped.passage_terms(best) == index.passage_terms(best)
+    index.close()
+    reloaded.close()
+
+
+def test_large_lessons_send_retrieved_passages(tmp_path):
+    from lesson_repository import LessonRepository
+
+    folder = tmp_path / "planets"
+    folder.mkdir()
+    (folder / "metadata.json").write_text('{"title_en": "Planets"}', encoding='utf-8')
+    paragraphs = [f"Planet number {i} has {i} moons and a day of {i * 3} hours. It was found by survey {i}." * 4
+                  for i in range(200)]
+    paragraphs[150] = "Saturn has the brightest rings made of ice and rock. " * 4
+    (folder / "content_en.txt").write_text("\n\n".join(paragraphs), encoding='utf-8')
+    (tmp_path / "small").mkdir()
+    (tmp_path / "small" / "metadata.json").write_text('{}', encoding='utf-8')
+    (tmp_path / "small" / "content_en.txt").write_text("A short lesson.", encoding='utf-8')
+
+    repository = LessonRepository(tmp_path)
+    lesson = repository.get("planets")
+    assert lesson.uses_retrieval('en')
+    context = lesson.prompt_context('en')
+    assert len(context) < 2500 and context.startswith("Planet number 0")
+    grounding = lesson.grounding('en', "What are Saturn's rings made of?")
+    assert grounding.startswith("Relevant parts of the lesson:") and "brightest rings" in grounding
+    assert index_path(folder, 'en').exists()
+
+    small = repository.get("small")
+    assert small.prompt_context('en') == "A short lesson."
+    assert small.grounding('en', "anything") is None
+
+
+def test_rebuild_closes_the_index_it_replaces(tmp_path, monkeypatch):
+    import lesson_index
+
+    opened = []
+    original_init = LessonIndex.__init__
+
+    def tracking_init(self, path):
+        original_init(self, path)
+        opened.append(self)
+
+    monkeypatch.setattr(lesson_index.LessonIndex, "__init__", tracking_init)
+    text = (LESSON / "content_en.txt").read_text(encoding='utf-8')
+    first, _ = load_or_build(tmp_path, 'en', text)
+    index, stats = load_or_build(tmp_path, 'en', text + "\n\nComets have tails of gas and dust.")
+
+    # The second call mapped the old file to reuse its passages, then closed it before replacing it
+    previous = opened[1]
+    assert stats["reused"] > 0 and previous._mmap.closed
+    assert not index._mmap.closed
+    assert index.search("comets tails")
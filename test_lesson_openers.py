@@ -0,0 +1,64 @@
+"""
+Tests for the lesson opener cache (lesson_openers.py):
+
+    python -m pytest -q test_lesson_openers.py
+"""
+
+import asyncio
+
+import pytest
+
+from lesson_openers import LessonOpenerCache
+
+
+def test_opener_is_cached_when_the_first_request_is_cancelled():
+    openers = LessonOpenerCache()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"text": "Welcome to the lesson.", "history": []}
+
+    async def scenario():
+        leader = asyncio.ensure_future(openers.get('sun', generate))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # e.g. the learner's connection dropped
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        await asyncio.sleep(0.1)
+        return await openers.get('sun', generate)
+
+    assert asyncio.run(scenario()) == {"text": "Welcome to the lesson.", "history": []}
+    assert len(calls) == 1 and len(openers) == 1
+
+
+def test_failed_generation_is_not_cached():
+    openers = LessonOpenerCache()
+
+    async def fail():
+        raise RuntimeError("Gemini failed")
+
+    async def succeed():
+        return {"text": "Welcome.", "history": []}
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await openers.get('sun', fail)
+        return await openers.get('sun', succeed)
+
+    assert asyncio.run(scenario())["text"] == "Welcome."
+    assert len(openers) == 1
+
+
+def test_oldest_openers_are_evicted():
+    openers = LessonOpenerCache(max_entries=2)
+
+    async def scenario():
+        for topic in ('sun', 'moon', 'earth'):
+            async def generate(topic=topic):
+                return {"text": topic, "history": []}
+            await openers.get(topic, generate)
+
+    asyncio.run(scenario())
+    assert list(openers._openers) == ['moon', 'earth']
@@ -0,0 +1,110 @@
+"""
+Tests for the lesson catalog (lesson_repository.py) and its ETag/304
+responses. Runs offline:
+
+    python -m pytest -q test_lesson_repository.py
+"""
+
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+import app as api
+from lesson_repository import LessonRepository
+
+QUIZ = [{
+    "question_en": "What is at the center of the Solar System?",
+    "options_en": ["Earth", "The Sun", "The Moon"],
+    "correct_answer_en": "The Sun",
+}]
+
+
+def write_lesson(lessons_dir, lesson_id, title, quiz=QUIZ):
+    folder = lessons_dir / lesson_id
+    folder.mkdir(exist_ok=True)
+    (folder / "metadata.json").write_text(json.dumps({"title_en": title}), encoding='utf-8')
+    (folder / "content_en.txt").write_text(f"A lesson about {title}.", encoding='utf-8')
+    (folder / "quiz.json").write_text(json.dumps(quiz), encoding='utf-8')
+    return folder
+
+
+def touch_later(path, seconds=10):
+    # Move the mtime forward so the change is seen even on coarse-grained filesystems
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10**9))
+
+
+def test_lessons_reload_only_when_their_files_change(tmp_path):
+    folder = write_lesson(tmp_path, "sun", "The Sun")
+    repository = LessonRepository(tmp_path, check_interval=0)
+
+    lesson = repository.get("sun")
+    assert lesson.title('en') == "The Sun"
+    assert repository.get("sun") is lesson
+    assert repository.reloads == 1
+
+    (folder / "metadata.json").write_text(json.dumps({"title_en": "Our Sun"}), encoding='utf-8')
+    touch_later(folder / "metadata.json")
+    reloaded = repository.get("sun")
+    assert reloaded is not lesson and reloaded.title('en') == "Our Sun"
+    assert repository.reloads == 2
+
+    (folder / "metadata.json").unlink()
+    assert repository.get("sun") is None
+
+
+def test_changes_wait_for_the_check_interval(tmp_path):
+    folder = write_lesson(tmp_path, "sun", "The Sun")
+    repository = LessonRepository(tmp_path, check_interval=3600)
+    lesson = repository.get("sun")
+
+    (folder / "metadata.json").write_text(json.dumps({"title_en": "Our Sun"}), encoding='utf-8')
+    touch_later(folder / "metadata.json")
+    assert repository.get("sun") is lesson
+
+
+def test_catalog_etag_follows_lesson_changes(tmp_path):
+    write_lesson(tmp_path, "sun", "The Sun")
+    repository = LessonRepository(tmp_path, check_interval=0)
+
+    lessons, etag = repository.catalog()
+    assert lessons == [{"id": "sun", "title_en": "The Sun", "title_bn": "sun"}]
+    assert repository.catalog() == (lessons, etag)
+
+    write_lesson(tmp_path, "moon", "The Moon")
+    touch_later(tmp_path)
+    lessons, new_etag = repository.catalog()
+    assert [lesson["id"] for lesson in lessons] == ["moon", "sun"]
+    assert new_etag != etag
+
+
+def test_lessons_and_quiz_answer_304_until_they_change(monkeypatch, tmp_path, install_fakes):
+    install_fakes()
+    lessons_dir = tmp_path / "lessons"
+    lessons_dir.mkdir()
+    folder = write_lesson(lessons_dir, "sun", "The Sun")
+    monkeypatch.setattr(api, "lessons", LessonRepository(lessons_dir, check_interval=0))
+
+    with TestClient(api.app) as client:
+        first = client.get("/lessons")
+        assert first.status_code == 200 and first.json()[0]["title_en"] == "The Sun"
+        etag = first.headers["etag"]
+        repeat = client.get("/lessons", headers={"If-None-Match": etag})
+        assert repeat.status_code == 304 and repeat.content == b""
+
+        quiz = client.get("/lesson/sun/quiz")
+        assert quiz.status_code == 200 and quiz.json()[0]["correct_answer_en"] == "The Sun"
+        quiz_etag = quiz.headers["etag"]
+        assert client.get("/lesson/sun/quiz", headers={"If-None-Match": quiz_etag}).status_code == 304
+
+        # A new version of the quiz gets a new ETag, so the old one no longer matches
+        quiz_changed = QUIZ + [{"question_en": "Which planet do we live on?", "options_en": ["Earth", "Mars"],
+                                "correct_answer_en": "Earth"}]
+        (folder / "quiz.json").write_text(json.dumps(quiz_changed), encoding='utf-8')
+        touch_later(folder / "quiz.json")
+        changed = client.get("/lesson/sun/quiz", headers={"If-None-Match": quiz_etag})
+        assert changed.status_code == 200 and len(changed.json()) == 2
+        assert changed.headers["etag"] != quiz_etag
+
+        assert client.get("/lesson/moon/quiz").status_code == 404
@@ -0,0 +1,53 @@
+"""
+Tests for long-audio transcription (split at pauses, transcribe concurrently,
+stitch in order). STT is replaced by a function that names each segment:
+
+    python -m pytest -q test_long_audio.py
+"""
+
+import hashlib
+import threading
+import time
+
+from audio_frontend import encode_wav
+from long_audio import split_recording, stitch_transcripts, transcribe_long
+from test_audio_frontend import RATE, noise, voice
+
+
+def test_long_recording_is_split_and_stitched_in_order():
+    # Nine 8 s sentences with short pauses: about 80 s, too long for one recognize()
+    samples = []
+    for _ in range(9):
+        samples += voice(8.0) + noise(0.5)
+    lock = threading.Lock()
+    state = {"active": 0, "max_active": 0, "calls": 0}
+
+    def fake_stt(chunk, rate, encoding, language_code):
+        with lock:
+            state["calls"] += 1
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+            index = state["calls"]
+        # Later segments finish first, so the order has to come from the stitching
+        time.sleep(0.05 / index)
+        with lock:
+            state["active"] -= 1
+        assert (rate, encoding) == (RATE, 'LINEAR16')
+        assert len(chunk) <= 31 * RATE * 2 + 44
+        return f"segment {hashlib.sha1(chunk).hexdigest()[:8]}।"
+
+    recording = encode_wav(samples, RATE)
+    text, stats = transcribe_long(recording, fake_stt, max_segment_seconds=30, max_workers=2)
+
+    chunks, _, _, _ = split_recording(recording, max_segment_seconds=30)
+    assert stats["segments"] == len(chunks) == 3
+    assert state["max_active"] == 2
+    assert text == " ".join(f"segment {hashlib.sha1(chunk).hexdigest()[:8]}।" for chunk in chunks)
+
+
+def test_stitching_keeps_punctuation_continuous():
+    parts = ["the sun is a.", "star", "it is hot", "and bright"]
+    # A cut mid-speech, then a long pause, then a short one
+    assert stitch_transcripts(parts, [0, 900, 350, None], 'en-US') == "the sun is a star. it is hot and bright"
+    assert stitch_transcripts(["সূর্য একটি", "তারা"], [1000, None], 'bn-BD') == "সূর্য একটি। তারা"
+    assert stitch_transcripts(["", "শেষ।"], [500, None]) == "শেষ।"
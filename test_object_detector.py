@@ -0,0 +1,59 @@
+"""
+Tests for the detection batcher (object_detector.py) with a stand-in for the
+YOLO model, so ultralytics isn't needed:
+
+    python -m pytest -q test_object_detector.py
+"""
+
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from object_detector import DetectionBatcher
+
+
+class FakeDetector:
+    """Reports each image's width as its only detection and records the batch sizes."""
+
+    def __init__(self):
+        self.batches = []
+
+    def detect_batch(self, images):
+        self.batches.append(len(images))
+        return [[{"label": 'width', "width": image.width}] for image in images]
+
+
+def jpeg(width):
+    out = io.BytesIO()
+    Image.new('RGB', (width, 10), (120, 40, 200)).save(out, format='JPEG')
+    return out.getvalue()
+
+
+def test_a_bad_image_fails_only_its_own_request():
+    detector = FakeDetector()
+    batcher = DetectionBatcher(detector, max_batch=8, max_wait=0.05)
+
+    async def detect_all():
+        return await asyncio.gather(batcher.detect(jpeg(32)), batcher.detect(b'not an image'),
+                                    batcher.detect(jpeg(64)), return_exceptions=True)
+
+    good, bad, other = asyncio.run(detect_all())
+    assert good == [{"label": 'width', "width": 32}]
+    assert other == [{"label": 'width', "width": 64}]
+    assert isinstance(bad, Exception)
+    # The images that decoded still went through the model as one batch
+    assert detector.batches == [2]
+
+
+def test_a_batch_with_no_decodable_images_skips_the_model():
+    detector = FakeDetector()
+    batcher = DetectionBatcher(detector, max_wait=0.01)
+
+    async def detect():
+        return await batcher.detect(b'not an image')
+
+    with pytest.raises(Exception):
+        asyncio.run(detect())
+    assert detector.batches == []
@@ -0,0 +1,96 @@
+"""
+Tests for the in-process session store (session_store.SessionStore), with a
+fake clock:
+
+    python -m pytest -q test_session_store.py
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import session_store
+from session_store import SessionStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(session_store, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def make_store(**kwargs):
+    evicted = []
+    store = SessionStore(on_evict=lambda key, session, reason: evicted.append((key, reason)), **kwargs)
+    return store, evicted
+
+
+def test_idle_sessions_expire(clock):
+    store, evicted = make_store(idle_ttl=60)
+    store.put('a', "session a")
+    store.put('b', "session b")
+
+    clock.now += 40
+    assert store.get('a') == "session a"  # refreshes a's idle timer
+    clock.now += 30
+    assert store.get('b') is None
+    assert store.get('a') == "session a"
+    assert evicted == [('b', 'expired')]
+    assert store.stats()["evictions"]["expired"] == 1
+    assert (store.hits, store.misses) == (2, 1)
+
+    clock.now += 61
+    store.put('c', "session c")
+    assert evicted == [('b', 'expired'), ('a', 'expired')]
+    assert len(store) == 1
+
+
+def test_least_recently_used_session_goes_first(clock):
+    store, evicted = make_store(max_sessions=2)
+    store.put('a', "session a")
+    store.put('b', "session b")
+    clock.now += 1
+    store.get('a')
+    store.put('c', "session c")
+
+    assert evicted == [('b', 'capacity')]
+    assert store.get('a') == "session a" and store.get('c') == "session c"
+    assert store.get('b') is None
+
+
+def test_memory_budget_evicts_oldest_but_never_the_newest(clock):
+    # Sessions here are lists of message texts, sized by their total length
+    store, evicted = make_store(max_bytes=100, sizeof=lambda messages: sum(map(len, messages)))
+    store.put('a', ["x" * 40])
+    store.put('b', ["y" * 40])
+    assert store.stats()["estimated_bytes"] == 80
+
+    # A session that grew is re-measured by touch()
+    session = ["z" * 30]
+    store.put('c', session)
+    assert evicted == [('a', 'memory')]
+    session.append("z" * 40)
+    store.touch('c')
+    assert evicted == [('a', 'memory'), ('b', 'memory')]
+    assert store.stats()["estimated_bytes"] == 70
+
+    # Over budget on its own, the most recent session still stays
+    store.put('d', ["w" * 500])
+    assert evicted[-1] == ('c', 'memory')
+    assert len(store) == 1 and store.stats()["estimated_bytes"] == 500
+
+
+def test_pop_skips_the_hook_and_hook_errors_are_contained(clock):
+    def failing_hook(key, session, reason):
+        raise RuntimeError("hook failed")
+
+    store = SessionStore(max_sessions=1, on_evict=failing_hook)
+    store.put('a', "session a")
+    assert store.pop('a') == "session a"
+    assert store.pop('a') is None
+
+    store.put('b', "session b")
+    store.put('c', "session c")  # the hook raises; the eviction still happens
+    assert store.get('b') is None and store.get('c') == "session c"
+    assert store.stats()["evictions"] == {"expired": 0, "capacity": 1, "memory": 0}
@@ -0,0 +1,75 @@
+"""
+Offline test for the shared (SQLite) session backend.
+Two separate worker processes take turns in the same conversation; Gemini is
+replaced by a fake model, so no credentials are needed:
+
+    python -m pytest -q test_sessions.py
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from types import SimpleNamespace
+
+
+class FakeChat:
+    def __init__(self, system_instruction, history=None):
+        self.system_instruction = system_instruction
+        self.history = list(history or [])
+
+    def send_message(self, user_msg):
+        from vertexai.generative_models import Content, Part
+
+        turn = len(self.history) // 2 + 1
+        has_context = "SUN-AT-CENTER" in self.system_instruction
+        reply = f"reply {turn} from {os.getpid()} context={has_context}"
+        self.history += [
+            Content(role="user", parts=[Part.from_text(user_msg)]),
+            Content(role="model", parts=[Part.from_text(reply)]),
+        ]
+        return SimpleNamespace(text=reply)
+
+
+class FakeModel:
+    def __init__(self, model_name, system_instruction=None):
+        self.system_instruction = system_instruction or ""
+
+    def start_chat(self, history=None):
+        return FakeChat(self.system_instruction, history)
+
+
+def worker_turn(user_msg, mode, topic=None, context=None, reset=False):
+    """Runs inside a worker process, like one uvicorn worker handling a request."""
+    import Gemini
+
+    Gemini.GenerativeModel = FakeModel
+    if reset:
+        Gemini.reset_chat_session(mode=mode, language_code='en-US', topic=topic, session_id='learner-1')
+    reply = Gemini.send_message(user_msg, mode=mode, language_code='en-US', topic=topic,
+                                context=context, session_id='learner-1')
+    return os.getpid(), reply
+
+
+def test_two_workers_share_one_conversation(tmp_path, monkeypatch):
+    monkeypatch.setenv("SESSION_BACKEND", "sqlite")
+    monkeypatch.setenv("SESSION_DB_PATH", str(tmp_path / "sessions.db"))
+
+    ctx = get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=ctx) as worker_a, ProcessPoolExecutor(1, mp_context=ctx) as worker_b:
+        workers = [worker_a, worker_b]
+        pids = set()
+        replies = []
+        for turn in range(4):
+            pid, reply = workers[turn % 2].submit(worker_turn, f"question {turn + 1}", 'chat').result()
+            pids.add(pid)
+            replies.append(reply)
+
+        # Lesson context given only on the first turn must survive the hop to the other worker
+        _, first = worker_a.submit(worker_turn, "start", 'lesson_delivery', 'solar_system',
+                                   "The SUN-AT-CENTER of the solar system.", True).result()
+        _, second = worker_b.submit(worker_turn, "continue", 'lesson_delivery', 'solar_system').result()
+
+    assert len(pids) == 2
+    assert [r.split(" from ")[0] for r in replies] == ["reply 1", "reply 2", "reply 3", "reply 4"]
+    assert first.startswith("reply 1") and first.endswith("context=True")
+    assert second.startswith("reply 2") and second.endswith("context=True")
@@ -0,0 +1,112 @@
+"""
+Tests for request coalescing: concurrent identical TTS requests and lesson
+loads share one upstream call. Runs offline:
+
+    python -m pytest -q test_single_flight.py
+"""
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from lesson_repository import LessonRepository
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def test_identical_concurrent_coroutines_make_one_call():
+    flights = AsyncSingleFlight('test')
+    calls = []
+
+    async def synthesize(text):
+        calls.append(text)
+        await asyncio.sleep(0.2)
+        return b"audio for " + text.encode('utf-8')
+
+    async def main():
+        requests = [flights.do('key', synthesize, "প্রশ্ন ১: সূর্য কী?") for _ in range(100)]
+        results = await asyncio.gather(*requests)
+        assert flights.in_flight() == 0
+        return results
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert set(results) == {"audio for প্রশ্ন ১: সূর্য কী?".encode('utf-8')}
+
+
+def test_cancelled_waiter_does_not_cancel_the_flight():
+    flights = AsyncSingleFlight('test')
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do('key', slow))
+        second = asyncio.ensure_future(flights.do('key', slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_errors_are_shared_and_not_remembered():
+    flights = SingleFlight('test')
+    release = threading.Event()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(flights.do, 'key', failing) for _ in range(5)]
+        while flights.in_flight() == 0:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result()
+
+    assert len(calls) == 1
+    assert flights.in_flight() == 0
+    assert flights.do('key', lambda: "recovered") == "recovered"
+
+
+def test_concurrent_lesson_loads_parse_once(monkeypatch, tmp_path):
+    folder = tmp_path / "sun"
+    folder.mkdir()
+    (folder / "metadata.json").write_text('{"title_en": "The Sun"}', encoding='utf-8')
+    quiz = [{
+        "question_en": "What is at the center of the Solar System?",
+        "options_en": ["Earth", "The Sun", "The Moon"],
+        "correct_answer_en": "The Sun",
+    }]
+    (folder / "quiz.json").write_text(json.dumps(quiz), encoding='utf-8')
+
+    import lesson_repository
+    parses = []
+    original = lesson_repository.Lesson.__init__
+
+    def slow_parse(self, *args):
+        parses.append(args[0])
+        time.sleep(0.2)
+        original(self, *args)
+
+    monkeypatch.setattr(lesson_repository.Lesson, "__init__", slow_parse)
+    repository = LessonRepository(tmp_path)
+
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        quizzes = list(pool.map(lambda _: repository.quiz("sun")[0], range(50)))
+
+    assert parses == ["sun"]
+    assert all(loaded is not None for loaded in quizzes)
+    assert all(loaded is quizzes[0] for loaded in quizzes)
+    assert [q["question_en"] for q in quizzes[0]] == ["What is at the center of the Solar System?"]
+    assert quizzes[0][0]["correct_answer_en"] == "The Sun"
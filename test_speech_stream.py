@@ -0,0 +1,93 @@
+"""
+Tests for sentence-by-sentence TTS of replies (speech_stream.py):
+
+    python -m pytest -q test_speech_stream.py
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from speech_stream import sse_event, split_sentences, synthesize_in_order
+
+
+def test_splits_on_bangla_and_english_boundaries():
+    text = "সূর্য একটি নক্ষত্র।পৃথিবী সূর্যের চারদিকে ঘোরে। The Moon orbits the Earth! Why is the sky blue?"
+    assert split_sentences(text, min_chars=10) == [
+        "সূর্য একটি নক্ষত্র।",
+        "পৃথিবী সূর্যের চারদিকে ঘোরে।",
+        "The Moon orbits the Earth!",
+        "Why is the sky blue?",
+    ]
+
+
+def test_numbers_stay_whole_and_blank_lines_split():
+    text = "Pi is about 3.14 and that is useful.\n\nA new paragraph starts here"
+    assert split_sentences(text) == ["Pi is about 3.14 and that is useful.", "A new paragraph starts here"]
+
+
+def test_short_fragments_are_merged():
+    assert split_sentences("হ্যাঁ। ঠিক বলেছ, সূর্য একটি নক্ষত্র। ভালো।") == [
+        "হ্যাঁ। ঠিক বলেছ, সূর্য একটি নক্ষত্র। ভালো।"
+    ]
+    assert split_sentences("Yes. The Sun is a star at the center. Good.") == [
+        "Yes. The Sun is a star at the center. Good."
+    ]
+    assert split_sentences("") == [] and split_sentences(None) == []
+
+
+def test_chunks_are_synthesized_concurrently_and_yielded_in_order():
+    segments = [f"Sentence number {i} of the reply." for i in range(5)]
+    finished = []
+
+    async def synthesize(segment):
+        index = segments.index(segment)
+        # Later sentences finish first
+        await asyncio.sleep(0.05 * (len(segments) - index))
+        finished.append(index)
+        return segment.encode('utf-8')
+
+    async def collect():
+        return [item async for item in synthesize_in_order(segments, synthesize)]
+
+    start = time.perf_counter()
+    results = asyncio.run(collect())
+    elapsed = time.perf_counter() - start
+
+    assert [index for index, _, _ in results] == [0, 1, 2, 3, 4]
+    assert [(text, audio) for _, text, audio in results] == [(s, s.encode('utf-8')) for s in segments]
+    assert finished == [4, 3, 2, 1, 0]
+    assert elapsed < 0.4  # about the slowest segment, not the sum of all five
+
+
+def test_a_failed_chunk_cancels_the_rest():
+    segments = ["first sentence here.", "second sentence fails.", "third sentence waits."]
+    cancelled = []
+
+    async def synthesize(segment):
+        if segment.startswith("second"):
+            raise RuntimeError("TTS failed")
+        try:
+            await asyncio.sleep(0.01 if segment.startswith("first") else 5)
+        except asyncio.CancelledError:
+            cancelled.append(segment)
+            raise
+        return b"audio"
+
+    async def collect():
+        received = []
+        with pytest.raises(RuntimeError):
+            async for index, _, _ in synthesize_in_order(segments, synthesize):
+                received.append(index)
+        await asyncio.sleep(0)
+        return received
+
+    assert asyncio.run(collect()) == [0]
+    assert cancelled == ["third sentence waits."]
+
+
+def test_sse_event_format():
+    assert sse_event({"text": "নমস্কার"}, event="token") == 'event: token\ndata: {"text": "নমস্কার"}\n\n'
+    assert json.loads(sse_event({"index": 1})[len("data: "):]) == {"index": 1}
@@ -0,0 +1,119 @@
+"""
+Golden tests for the markdown-to-speech sanitizer:
+
+    python -m pytest -q test_speech_text.py
+
+legacy_strip_markdown is the regex version it replaced; the sanitizer must
+give the same output on the corpus, whether fed whole or in chunks.
+"""
+
+import re
+
+import pytest
+
+from speech_text import SpeechSanitizer, sanitize_for_speech, normalize_bangla
+
+
+def legacy_strip_markdown(text):
+    """Remove markdown formatting from text for TTS."""
+    if not text: return text
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    text = re.sub(r'\*([^*]+)\*', r'\1', text)
+    text = re.sub(r'__([^_]+)__', r'\1', text)
+    text = re.sub(r'_([^_]+)_', r'\1', text)
+    text = re.sub(r'```[\s\S]*?```', '', text)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
+    text = re.sub(r'^#{1,6}\s+(.+)$', r'\1', text, flags=re.MULTILINE)
+    text = re.sub(r'^[\s]*[-*+]\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^[\s]*\d+\.\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^[-*]{3,}$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    text = text.strip()
+    return text
+
+
+GOLDEN_CORPUS = [
+    "**মুক্তিযুদ্ধ** ১৯৭১ সালে শুরু হয়েছিল।",
+    "## ভূমিকা\n\nবাংলাদেশের *স্বাধীনতা* একটি গুরুত্বপূর্ণ ঘটনা।",
+    "1. **প্রথম ধাপ:** পরিকল্পনা\n2. **দ্বিতীয় ধাপ:** বাস্তবায়ন",
+    "১. প্রথম\n২. দ্বিতীয়",
+    "**১. শিরোনাম**\nবিস্তারিত",
+    "- আপেল\n- কলা\n\n- কমলা",
+    "Here is code:\n```python\nprint('hi')\n```\nDone.",
+    "Use `print()` to output. See [docs](https://docs.python.org).",
+    "### Summary\n\n---\n\nThe war ended in **1945**.",
+    "Intro\n\n---\n- after rule",
+    "__Important__: read _carefully_.",
+    "Text with trailing spaces   \n\n\n\nNext paragraph",
+    "   \n\n  Leading whitespace and **bold**  \n\n",
+    "a\n  \n  indented",
+    "# Heading\nParagraph with a [link](http://example.com) and *emphasis*.\n\n+ plus item\n  - nested item",
+    "No markdown at all. Just a sentence! And another?",
+    "2024. A year line",
+    "**Bold at end",
+    "`` odd ticks",
+    "[not a link] and [x](",
+    "***\nx",
+    "",
+]
+
+# "* " bullets used to pair with asterisks on other lines, leaving stray
+# spaces (or asterisks) in front of items. They are now plain list markers.
+STAR_BULLETS = [
+    ("* প্রথম\n* দ্বিতীয়\n* তৃতীয়", "প্রথম\nদ্বিতীয়\nতৃতীয়"),
+    ("* **ক:** এক\n* **খ:** দুই", "ক: এক\nখ: দুই"),
+    ("Intro:\n\n* one *two* three\n* four", "Intro:\none two three\nfour"),
+]
+
+
+def feed_in_chunks(text, size, **kwargs):
+    sanitizer = SpeechSanitizer(**kwargs)
+    out = [sanitizer.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return "".join(out) + sanitizer.flush()
+
+
+@pytest.mark.parametrize("text", GOLDEN_CORPUS)
+def test_matches_legacy_output(text):
+    assert sanitize_for_speech(text) == legacy_strip_markdown(text)
+
+
+@pytest.mark.parametrize("text", GOLDEN_CORPUS + [text for text, _ in STAR_BULLETS])
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_chunked_matches_whole(text, size):
+    assert feed_in_chunks(text, size) == (sanitize_for_speech(text) or "")
+
+
+@pytest.mark.parametrize("text,expected", STAR_BULLETS)
+def test_star_bullets(text, expected):
+    assert sanitize_for_speech(text) == expected
+
+
+def test_bold_split_across_chunks():
+    sanitizer = SpeechSanitizer()
+    emitted = [sanitizer.feed(chunk) for chunk in ["এটি **গুরু", "ত্বপূর্ণ*", "* ঘটনা।"]]
+    emitted.append(sanitizer.flush())
+    assert all('*' not in part for part in emitted)
+    assert "".join(emitted) == "এটি গুরুত্বপূর্ণ ঘটনা।"
+    # Text before the open span is not held back
+    assert emitted[0] == "এটি"
+
+
+def test_normalize_bangla():
+    assert normalize_bangla("দাম 1,000 টাকা, ছাড় 50%!!") == "দাম ১০০০ টাকা, ছাড় ৫০ শতাংশ!"
+    assert normalize_bangla("শেষ|পরের।লাইন...") == "শেষ। পরের। লাইন।"
+
+
+def test_normalize_bangla_keeps_number_lists():
+    assert normalize_bangla("১,২,৩ এবং 4,5") == "১,২,৩ এবং ৪,৫"
+    assert normalize_bangla("জনসংখ্যা 1,00,000 জন, দাম 12,345") == "জনসংখ্যা ১০০০০০ জন, দাম ১২৩৪৫"
+    assert normalize_bangla("1,2345") == "১,২৩৪৫"
+    text = "সংখ্যা ১,২,৩ আর 1,000।"
+    assert feed_in_chunks(text, 1, normalize_bangla=True) == "সংখ্যা ১,২,৩ আর ১০০০।"
+
+
+def test_normalize_bangla_streaming():
+    text = "## দাম\n\n**1,000** টাকা, ছাড় 50 %।"
+    expected = sanitize_for_speech(text, normalize_bangla=True)
+    assert expected == "দাম\n\n১০০০ টাকা, ছাড় ৫০ শতাংশ।"
+    assert feed_in_chunks(text, 1, normalize_bangla=True) == expected
@@ -0,0 +1,63 @@
+"""
+Tests for the /tts endpoints with fake backends. Runs offline:
+
+    python -m pytest -q test_tts_api.py
+"""
+
+from fastapi.testclient import TestClient
+
+import app as api
+
+
+def test_unknown_audio_format_is_a_400(install_fakes):
+    fakes = install_fakes(tts_latency='0')
+
+    with TestClient(api.app) as client:
+        for delivery in ('base64', 'url', 'binary'):
+            response = client.post("/tts", json={'text': "নমস্কার", 'audio_format': 'flac', 'audio_delivery': delivery})
+            assert response.status_code == 400
+            assert "Unsupported audio format: flac" in response.json()["detail"]
+        assert client.post("/tts/stream", json={'text': "নমস্কার", 'audio_format': 'flac'}).status_code == 400
+
+    assert fakes.calls['tts'] == 0
+
+
+def test_every_delivery_speaks_the_normalized_text(monkeypatch, install_fakes):
+    fakes = install_fakes(tts_latency='0')
+    spoken = []
+
+    def synthesize(text, language_code, voice_name, audio_encoding):
+        spoken.append(text)
+        return b"audio for " + text.encode('utf-8')
+
+    monkeypatch.setattr(fakes, "synthesize", synthesize)
+
+    text = "দাম 1,000 টাকা, ছাড় 50%"
+    with TestClient(api.app) as client:
+        binary = client.post("/tts", json={'text': text, 'audio_format': 'mp3', 'audio_delivery': 'binary'})
+        url = client.post("/tts", json={'text': text, 'audio_format': 'mp3', 'audio_delivery': 'url'})
+        linked = client.get(url.json()["audio_url"])
+
+    assert spoken == ["দাম ১০০০ টাকা, ছাড় ৫০ শতাংশ"]
+    assert binary.content == linked.content == "audio for দাম ১০০০ টাকা, ছাড় ৫০ শতাংশ".encode('utf-8')
+
+
+def test_audio_links_serve_only_their_own_encoding(install_fakes):
+    install_fakes(tts_latency='0')
+
+    with TestClient(api.app) as client:
+        wav_url = client.post("/tts", json={'text': "নমস্কার", 'audio_format': 'wav', 'audio_delivery': 'url'}).json()["audio_url"]
+        assert wav_url.endswith(".wav")
+        wav = client.get(wav_url)
+        assert wav.status_code == 200 and wav.headers["content-type"] == 'audio/wav'
+
+        # The same clip with another extension is not served under the wrong MIME type
+        assert client.get(wav_url[:-len(".wav")] + ".mp3").status_code == 404
+
+        # Links keep working from the disk tier once the clip has left memory
+        api.tts_cache._memory.clear()
+        from_disk = client.get(wav_url)
+        assert from_disk.status_code == 200 and from_disk.content == wav.content
+        assert api.tts_cache.stats()["disk_hits"] == 1
+
+        assert client.get("/audio/" + "0" * 64 + ".wav").status_code == 404
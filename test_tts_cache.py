@@ -0,0 +1,89 @@
+"""
+Tests for the two-tier TTS cache (tts_cache.py) with small budgets:
+
+    python -m pytest -q test_tts_cache.py
+"""
+
+import os
+
+from tts_cache import TTSCache, make_key
+
+
+def key(i):
+    return make_key(f"sentence {i}", 'bn-BD')
+
+
+def set_age(cache, k, seconds_ago):
+    path = cache._path(k)
+    mtime = path.stat().st_mtime - seconds_ago
+    os.utime(path, (mtime, mtime))
+
+
+def test_keys_ignore_whitespace_and_unicode_form():
+    assert make_key("সূর্য  একটি\nনক্ষত্র ", 'bn-BD') == make_key("সূর্য একটি নক্ষত্র", 'bn-BD')
+    assert make_key("hello", 'en-US', audio_encoding='MP3') != make_key("hello", 'en-US')
+
+
+def test_memory_tier_is_lru_within_its_budget(tmp_path):
+    cache = TTSCache(tmp_path, max_memory_items=2, max_memory_bytes=250)
+    cache.put(key(1), b"1" * 100)
+    cache.put(key(2), b"2" * 100)
+    assert cache.get(key(1)) == b"1" * 100  # key(2) is now least recently used
+    cache.put(key(3), b"3" * 100)
+    assert cache.stats()["memory_items"] == 2 and cache.stats()["memory_bytes"] == 200
+    assert cache.get_memory(key(2)) is None
+    assert cache.get_memory(key(1)) is not None and cache.get_memory(key(3)) is not None
+
+    # Evicted from memory but still on disk: a disk hit that is promoted again
+    assert cache.get(key(2)) == b"2" * 100
+    assert cache.get_memory(key(2)) == b"2" * 100
+
+    # The byte budget applies too, and clips larger than it are never kept in memory
+    cache.put(key(4), b"4" * 200)
+    assert cache.stats()["memory_items"] == 1
+    cache.put(key(5), b"5" * 300)
+    assert cache.get_memory(key(5)) is None and cache.get(key(5)) == b"5" * 300
+
+
+def test_disk_tier_evicts_oldest_past_its_budget(tmp_path):
+    cache = TTSCache(tmp_path, max_memory_items=0, max_disk_bytes=1000)
+    for i in range(4):
+        cache.put(key(i), bytes([i]) * 200)
+        set_age(cache, key(i), 100 - i * 10)
+    # Reading a clip refreshes its age, so key(0) is now the newest
+    assert cache.get(key(0)) == bytes([0]) * 200
+
+    cache.put(key(4), b"4" * 200)
+    assert cache.stats()["disk_bytes"] == 1000 and cache.stats()["disk_evictions"] == 0
+    cache.put(key(5), b"5" * 200)
+
+    # Over 1000 bytes: evicted oldest-first down to 90% of the budget
+    stats = cache.stats()
+    assert stats["disk_evictions"] == 2 and stats["disk_bytes"] == 800
+    assert not cache._path(key(1)).exists() and not cache._path(key(2)).exists()
+    assert all(cache._path(key(i)).exists() for i in (0, 3, 4, 5))
+
+
+def test_disk_budget_counts_existing_files(tmp_path):
+    TTSCache(tmp_path).put(key(1), b"1" * 600)
+    reopened = TTSCache(tmp_path, max_memory_items=0, max_disk_bytes=1000)
+    reopened.put(key(2), b"2" * 600)
+    assert reopened.stats()["disk_evictions"] == 1
+    assert reopened.get(key(1)) is None and reopened.get(key(2)) == b"2" * 600
+
+
+def test_hit_and_miss_counters(tmp_path):
+    cache = TTSCache(tmp_path)
+    assert cache.get(key(1)) is None
+    cache.put(key(1), b"audio")
+    assert cache.get(key(1)) == b"audio"
+
+    cold = TTSCache(tmp_path)
+    assert cold.get(key(1)) == b"audio"
+    assert cold.get(key(1)) == b"audio"
+    assert cold.get(key(2)) is None
+
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 1
+    stats = cold.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 2 / 3
@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+
+def normalize_text(text):
+    """
+    Normalize text for cache lookups: Unicode NFC and collapsed whitespace,
+    so the same sentence typed or generated slightly differently shares an entry.
+    """
+    text = unicodedata.normalize('NFC', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def make_key(text, language_code, voice_name=None, audio_encoding='LINEAR16'):
+    """
+    Content address of a synthesized clip.
+    """
+    payload = json.dumps(
+        [normalize_text(text), language_code, voice_name or '', audio_encoding],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """
+    Two-tier cache of synthesized audio.
+
+    A size-bounded in-memory LRU sits in front of a directory of files named by
+    content hash. The disk tier is evicted oldest-first (by mtime, which is
+    refreshed on every hit) once it grows past its byte budget.
+    """
+
+    def __init__(self, cache_dir, max_memory_items=512, max_memory_bytes=64 * 1024 * 1024,
+                 max_disk_bytes=512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_memory_items = max_memory_items
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.audio"
+
+    def _scan_disk(self):
+        # Runs once, on the first write, to learn how much the disk tier already holds
+        total = 0
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob("*/*.audio"):
+                total += path.stat().st_size
+        self._disk_bytes = total
+
+    def _remember(self, key, data):
+        # Caller holds the lock
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        if len(data) > self.max_memory_bytes:
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while len(self._memory) > self.max_memory_items or self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get(self, key):
+        """
+        Return cached audio bytes for key, or None.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def get_memory(self, key):
+        """
+        Return audio bytes for key from the memory tier only, or None. Cheap
+        enough to call on the event loop: no file I/O and no miss is counted.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return data
+
+    def put(self, key, data):
+        """
+        Store audio bytes under key in both tiers.
+        """
+        with self._lock:
+            self._remember(key, data)
+            if self._disk_bytes is None:
+                self._scan_disk()
+
+        path = self._path(key)
+        if path.exists():
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write TTS cache entry: {e}")
+            return
+
+        with self._lock:
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Caller holds the lock. Evict down to 90% of the budget so we don't rescan on every write.
+        target = int(self.max_disk_bytes * 0.9)
+        entries = []
+        for path in self.cache_dir.glob("*/*.audio"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.disk_evictions += 1
+        self._disk_bytes = total
+
+    def stats(self):
+        """
+        Hit/miss counters and tier sizes.
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes or 0,
+                "disk_evictions": self.disk_evictions,
+            }
+
+
+tts_cache = TTSCache(
+    os.environ.get("TTS_CACHE_DIR", Path(__file__).parent / "tts_cache"),
+    max_memory_items=int(os.environ.get("TTS_CACHE_MEMORY_ITEMS", 512)),
+    max_memory_bytes=int(os.environ.get("TTS_CACHE_MEMORY_MB", 64)) * 1024 * 1024,
+    max_disk_bytes=int(os.environ.get("TTS_CACHE_DISK_MB", 512)) * 1024 * 1024,
+)